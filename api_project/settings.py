@@ -45,12 +45,17 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'books.metrics.MetricsMiddleware',
+    'books.concurrency.ConcurrencyLimitMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
+    'books.snapshots.SnapshotMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'books.profiling.ProfilingMiddleware',
+    'books.slow_queries.SlowQueryMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -130,6 +135,7 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # Django REST Framework settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
+        'books.authentication.SignedTokenAuthentication',
         'rest_framework.authentication.SessionAuthentication',
         'rest_framework.authentication.TokenAuthentication',
     ],
@@ -144,6 +150,114 @@ REST_FRAMEWORK = {
     ],
 }
 
+# Paginator counts above this many rows are estimated or served from cache
+# instead of running COUNT(*) (see books.pagination)
+BOOKS_COUNT_ESTIMATE_THRESHOLD = 10000
+BOOKS_COUNT_CACHE_TIMEOUT = 300
+
+# ?facets= on the book list (books.facets): cache timeout of each facet's
+# counts and how many authors the author facet lists
+BOOKS_FACET_CACHE_TIMEOUT = 300
+BOOKS_FACET_AUTHOR_LIMIT = 50
+
+# On-demand profiling (books.profiling.ProfilingMiddleware). Staff trigger it
+# with the X-Profile header or ?profile=summary|dump; a non-zero sample rate
+# also profiles that fraction of all requests and dumps them to the directory.
+BOOKS_PROFILE_DIR = None
+BOOKS_PROFILE_SAMPLE_RATE = 0.0
+
+# Per-route metrics exposed at /api/metrics/ (books.metrics). Each process
+# serves its own totals unless BOOKS_METRICS_DB names a SQLite file through
+# which workers share them, e.g. BASE_DIR / 'metrics.sqlite3'.
+BOOKS_METRICS_DB = None
+BOOKS_METRICS_FLUSH_INTERVAL = 5.0
+# Staff users can always read the metrics. Scrapers send
+# "Authorization: Bearer <BOOKS_METRICS_TOKEN>". The IP allowlist matches
+# REMOTE_ADDR, which is the proxy's address behind a reverse proxy, so it
+# is empty by default; only list addresses that reach the app directly.
+BOOKS_METRICS_TOKEN = None
+BOOKS_METRICS_ALLOWED_IPS = []
+
+# Log SQL statements slower than this many milliseconds, with their EXPLAIN
+# plan, to the SlowQuery table (books.slow_queries). None disables it.
+# Summarize with: python manage.py slow_queries
+BOOKS_SLOW_QUERY_MS = 200
+
+# Signed bearer tokens (books.authentication): lifetimes in seconds, and how
+# often each worker reloads the revocation denylist
+BOOKS_ACCESS_TOKEN_LIFETIME = 300
+BOOKS_REFRESH_TOKEN_LIFETIME = 3600
+BOOKS_DENYLIST_REFRESH_INTERVAL = 5.0
+
+# Build URL resolvers, serializers and filter sets when the wsgi/asgi
+# application loads (books.warmup); optionally skip that while migrations
+# are pending, at the cost of loading the migration graph on every start
+BOOKS_WARM_UP = True
+BOOKS_WARM_UP_CHECK_MIGRATIONS = False
+
+# Minimum edit-distance similarity (0-1) for ?fuzzy=true search matches
+BOOKS_FUZZY_MIN_SIMILARITY = 0.6
+
+# Seconds to cache per-author statistics (also dropped when the author's
+# books or their reviews change)
+BOOKS_AUTHOR_STATS_CACHE_TIMEOUT = 300
+
+# Single-flight coalescing of BookViewSet reads (books.coalescing). Results
+# are fresh for TTL seconds, then served stale for up to STALE_TTL more
+# while one request recomputes them. Workers on one host share results and
+# locks through files in BOOKS_COALESCE_DIR (default: <tmp>/books-coalesce-<uid>),
+# which must be private to the server's user (mode 0700).
+BOOKS_COALESCE = True
+BOOKS_COALESCE_TTL = 5
+BOOKS_COALESCE_STALE_TTL = 30
+BOOKS_COALESCE_WAIT = 10
+BOOKS_COALESCE_DIR = None
+
+# Adaptive per-process concurrency limits (books.concurrency). Each route
+# class starts at the given limit, which then adapts to observed latency;
+# requests still over the limit after the queue timeout get a 503.
+BOOKS_CONCURRENCY_LIMIT = True
+BOOKS_CONCURRENCY_LIMITS = {'cheap': 40, 'heavy': 8, 'write': 10}
+BOOKS_CONCURRENCY_MAX_LIMIT = 200
+BOOKS_CONCURRENCY_HEAVY_ROUTES = ['book-popular', 'book-trending', 'author-stats-list']
+BOOKS_CONCURRENCY_EXEMPT_ROUTES = ['metrics']
+BOOKS_CONCURRENCY_QUEUE_TIMEOUT = 0.1
+BOOKS_CONCURRENCY_RETRY_AFTER = 1
+
+# Default seconds of SQL time per API request (books.query_budget); viewsets
+# override it with query_budget / action_query_budgets. None disables it.
+BOOKS_QUERY_BUDGET = 2.0
+
+# Two-tier author/book cache used for author names and book titles in
+# responses (books.entity_cache): per-process L1 entries and TTL, and the
+# timeout of the shared Django cache tier
+BOOKS_ENTITY_L1_SIZE = 10000
+BOOKS_ENTITY_L1_TTL = 30
+BOOKS_ENTITY_CACHE_TIMEOUT = 300
+
+# Precompressed catalog snapshots (books.snapshots): rebuilt this many
+# seconds after a catalog write, for the first BOOKS_SNAPSHOT_MAX_PAGES
+# pages of each list, under each scheme://host clients use (a debounce of
+# None leaves rebuilds to a scheduled `manage.py build_snapshots`); a dir
+# of None stores them in <tmp>/books-snapshots-<uid> (must be mode 0700)
+BOOKS_SNAPSHOTS = True
+BOOKS_SNAPSHOT_DEBOUNCE = 30
+BOOKS_SNAPSHOT_MAX_PAGES = 50
+BOOKS_SNAPSHOT_ORIGINS = ['http://127.0.0.1:8000', 'http://localhost:8000']
+BOOKS_SNAPSHOT_DIR = None
+
+# Bulk review imports (books.review_import): background threads per web
+# process, rows per INSERT batch, rows accepted per job and per-row errors
+# kept on a job
+BOOKS_INGEST_WORKERS = 2
+BOOKS_INGEST_BATCH_SIZE = 500
+BOOKS_INGEST_MAX_ROWS = 100000
+BOOKS_INGEST_MAX_ERRORS = 1000
+
+# Seconds a successful POST is remembered under its Idempotency-Key header
+# (books.idempotency)
+BOOKS_IDEMPOTENCY_TTL = 86400
+
 # CORS settings (for frontend integration)
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:3000",
@@ -17,12 +17,15 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 from rest_framework.authtoken.views import obtain_auth_token
-from books.views import api_overview
+from books.views import api_overview, signed_token_obtain, signed_token_refresh, signed_token_revoke
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('books.urls')),
     path('api/auth/token/', obtain_auth_token, name='api_token_auth'),
+    path('api/auth/access/', signed_token_obtain, name='signed_token_obtain'),
+    path('api/auth/refresh/', signed_token_refresh, name='signed_token_refresh'),
+    path('api/auth/revoke/', signed_token_revoke, name='signed_token_revoke'),
     path('api-auth/', include('rest_framework.urls')),
     path('', api_overview, name='api-overview'),
 ]
@@ -9,8 +9,13 @@ https://docs.djangoproject.com/en/5.2/howto/deployment/wsgi/
 
 import os
 
+from django.conf import settings
 from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'api_project.settings')
 
 application = get_wsgi_application()
+
+if settings.BOOKS_WARM_UP:
+    from books.warmup import warm_up_on_startup
+    warm_up_on_startup()
@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+"""
+Compare request authentication throughput: DRF TokenAuthentication
+(database lookup per request) against books.authentication.SignedTokenAuthentication
+(HMAC verification in memory).
+
+Usage: python benchmarks/bench_auth.py [iterations]
+"""
+import os
+import sys
+import time
+
+# Add the project directory to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Set up Django
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'api_project.settings')
+import django
+django.setup()
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import RequestFactory
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from books.authentication import SignedTokenAuthentication, issue_token_pair
+
+
+def bench(authenticator, header, iterations):
+    request = RequestFactory().get('/api/books/', HTTP_AUTHORIZATION=header)
+    authenticator.authenticate(request)  # warm up (denylist refresh, connection)
+    queries = []
+    with connection.execute_wrapper(lambda execute, *args: queries.append(1) or execute(*args)):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            authenticator.authenticate(request)
+        elapsed = time.perf_counter() - start
+    return iterations / elapsed, len(queries) / iterations
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    user = User.objects.order_by('pk').first()
+    if user is None:
+        print("No users found. Run 'python manage.py populate_data' first.")
+        return
+
+    token, _ = Token.objects.get_or_create(user=user)
+    signed = issue_token_pair(user)['access']
+
+    results = [
+        ('TokenAuthentication', *bench(TokenAuthentication(), f'Token {token.key}', iterations)),
+        ('SignedTokenAuthentication', *bench(SignedTokenAuthentication(), f'Bearer {signed}', iterations)),
+    ]
+    print(f"{'Scheme':<28}{'auth/s':>12}{'queries/auth':>15}")
+    for name, rate, queries in results:
+        print(f"{name:<28}{rate:>12,.0f}{queries:>15.3f}")
+    print(f"Speed-up: {results[1][1] / results[0][1]:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
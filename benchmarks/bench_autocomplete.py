@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+"""
+Measure memory and lookup latency of the in-process autocomplete index
+(books.autocomplete.PrefixIndex) on synthetic titles. No database is used.
+
+Usage: python benchmarks/bench_autocomplete.py [books] [queries]
+"""
+import os
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+
+# Add the project directory to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Set up Django
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'api_project.settings')
+import django
+django.setup()
+
+from books.autocomplete import PrefixIndex
+
+WORDS = [
+    'the', 'of', 'and', 'night', 'river', 'shadow', 'garden', 'empire', 'silent', 'winter',
+    'house', 'secret', 'history', 'city', 'glass', 'dragon', 'ocean', 'letters', 'king', 'wind',
+    'stone', 'journey', 'midnight', 'fire', 'lost', 'children', 'summer', 'memory', 'road', 'star',
+]
+NAMES = ['Ada', 'Ben', 'Clara', 'David', 'Elena', 'Farid', 'Grace', 'Hiro', 'Ines', 'Jonah']
+SURNAMES = ['Adams', 'Brooks', 'Castillo', 'Dubois', 'Eriksen', 'Fischer', 'Garcia', 'Haddad', 'Ito', 'Jensen']
+
+
+def synthetic_rows(count, rng):
+    for book_id in range(1, count + 1):
+        title = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(2, 6))).title()
+        author = f'{rng.choice(NAMES)} {rng.choice(SURNAMES)} {book_id % 5000}'
+        yield book_id, f'{title} {book_id}', author, f'{9780000000000 + book_id}', rng.randint(0, 500)
+
+
+def main():
+    books = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    queries = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    rng = random.Random(42)
+
+    tracemalloc.start()
+    index = PrefixIndex()
+    start = time.perf_counter()
+    index.load(synthetic_rows(books, rng))
+    build_seconds = time.perf_counter() - start
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f'Books:        {books}')
+    print(f'Positions:    {len(index._starts)}')
+    print(f'Build time:   {build_seconds:.1f}s (slowed down by tracemalloc)')
+    print(f'Memory:       {current / 2**20:.1f} MiB resident, {peak / 2**20:.1f} MiB peak while building')
+
+    prefixes = [rng.choice(WORDS)[:rng.randint(1, 4)] for _ in range(queries // 2)]
+    prefixes += [f'{rng.choice(WORDS)} {rng.choice(WORDS)[:2]}' for _ in range(queries // 4)]
+    prefixes += [str(9780000000000 + rng.randint(1, books))[:rng.randint(5, 13)] for _ in range(queries // 4)]
+    rng.shuffle(prefixes)
+
+    for label, run in (('cold', prefixes), ('cached', prefixes)):
+        timings = []
+        for prefix in run:
+            start = time.perf_counter()
+            index.search(prefix, 10)
+            timings.append((time.perf_counter() - start) * 1000)
+        timings.sort()
+        print(
+            f'Lookup {label:6s}: median {statistics.median(timings):.3f} ms, '
+            f'p95 {timings[int(len(timings) * 0.95)]:.3f} ms, '
+            f'p99 {timings[int(len(timings) * 0.99)]:.3f} ms'
+        )
+
+
+if __name__ == '__main__':
+    main()
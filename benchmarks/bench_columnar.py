@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+"""
+Compare payload size and encode throughput of the columnar list format
+(books.renderers.ColumnarJSONRenderer) against DRF's JSONRenderer, on
+synthetic pages shaped like /api/books/ and /api/reviews/ results. No
+database is used.
+
+Usage: python benchmarks/bench_columnar.py [page size] [repeats]
+"""
+import gzip
+import json
+import os
+import random
+import sys
+import time
+
+# Add the project directory to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Set up Django
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'api_project.settings')
+import django
+django.setup()
+
+from rest_framework.renderers import JSONRenderer
+from books.models import Book
+from books.renderers import ColumnarJSONRenderer, decode_columnar
+
+GENRES = [genre for genre, _label in Book.GENRE_CHOICES]
+AUTHORS = [f'Author Number {n}' for n in range(40)]
+WORDS = ['night', 'river', 'shadow', 'garden', 'empire', 'silent', 'winter', 'house', 'secret', 'glass']
+
+
+def book_rows(count, rng):
+    return [{
+        'id': n,
+        'title': ' '.join(rng.choice(WORDS) for _ in range(3)).title(),
+        'author_name': rng.choice(AUTHORS),
+        'genre': rng.choice(GENRES),
+        'price': f'{rng.uniform(5, 60):.2f}',
+        'is_available': rng.random() < 0.8,
+        'average_rating': round(rng.uniform(1, 5), 1),
+        'publication_date': f'{rng.randint(1950, 2024)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}',
+    } for n in range(1, count + 1)]
+
+
+def review_rows(count, rng):
+    return [{
+        'id': n,
+        'book': rng.randint(1, 50),
+        'book_title': f'Book Title {rng.randint(1, 50)}',
+        'user': rng.randint(1, 20),
+        'user_username': f'reader{rng.randint(1, 20)}',
+        'rating': rng.randint(1, 5),
+        'comment': 'A fine read. ' * rng.randint(1, 4),
+        'created_at': '2024-05-01T12:00:00.000000Z',
+        'updated_at': '2024-05-01T12:00:00.000000Z',
+    } for n in range(1, count + 1)]
+
+
+def measure(renderer, page, repeats):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        body = renderer.render(page)
+    elapsed = time.perf_counter() - start
+    return body, repeats / elapsed
+
+
+def main():
+    page_size = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    rng = random.Random(42)
+
+    for label, rows in (('books', book_rows(page_size, rng)), ('reviews', review_rows(page_size, rng))):
+        page = {'count': page_size, 'next': None, 'previous': None, 'results': rows}
+        plain, plain_rate = measure(JSONRenderer(), page, repeats)
+        columnar, columnar_rate = measure(ColumnarJSONRenderer(), page, repeats)
+        assert decode_columnar(json.loads(columnar)['results']) == rows, 'decoder did not round-trip'
+
+        print(f'{label} ({page_size} rows per page)')
+        for name, body, rate in (('json', plain, plain_rate), ('columnar', columnar, columnar_rate)):
+            print(
+                f'  {name:9s} {len(body) / 1024:8.1f} KiB, {len(gzip.compress(body)) / 1024:7.1f} KiB gzipped, '
+                f'{rate:7.1f} pages/s'
+            )
+        print(f'  size ratio {len(columnar) / len(plain):.2f}, throughput ratio {columnar_rate / plain_rate:.2f}')
+
+
+if __name__ == '__main__':
+    main()
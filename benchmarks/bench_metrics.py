@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+"""
+Measure the per-request overhead of books.metrics.MetricsMiddleware.
+
+Runs the same requests through the Django test client with and without
+the middleware and prints the mean time per request for each.
+
+Usage: python benchmarks/bench_metrics.py [requests]
+"""
+import os
+import sys
+import time
+
+# Add the project directory to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Set up Django
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'api_project.settings')
+import django
+django.setup()
+
+from django.conf import settings
+from django.test import Client
+from django.test.utils import override_settings
+
+PATHS = ['/api/books/', '/api/books/popular/', '/api/authors/', '/api/overview/']
+
+
+def run(requests):
+    client = Client()
+    for path in PATHS:
+        client.get(path)  # warm up
+    start = time.perf_counter()
+    for i in range(requests):
+        client.get(PATHS[i % len(PATHS)])
+    return (time.perf_counter() - start) / requests * 1000
+
+
+def main():
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    without = [m for m in settings.MIDDLEWARE if m != 'books.metrics.MetricsMiddleware']
+
+    with override_settings(MIDDLEWARE=without, ALLOWED_HOSTS=['testserver']):
+        baseline = run(requests)
+    with override_settings(ALLOWED_HOSTS=['testserver']):
+        instrumented = run(requests)
+
+    print(f"Requests per run:      {requests}")
+    print(f"Without metrics:       {baseline:.3f} ms/request")
+    print(f"With metrics:          {instrumented:.3f} ms/request")
+    print(f"Overhead:              {instrumented - baseline:.3f} ms/request "
+          f"({(instrumented / baseline - 1) * 100:.1f}%)")
+
+
+if __name__ == '__main__':
+    main()
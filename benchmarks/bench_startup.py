@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+"""
+Measure worker startup: import time, warm-up time and time-to-first-response.
+
+Each run starts a fresh interpreter that loads the WSGI application and
+serves GET /api/books/ once, with and without books.warmup.warm_up().
+
+Usage: python benchmarks/bench_startup.py [runs]
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = r'''
+import json, sys, time
+started = time.perf_counter()
+sys.path.insert(0, PROJECT_DIR)
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'api_project.settings')
+from django.conf import settings
+from django.core.wsgi import get_wsgi_application
+application = get_wsgi_application()
+import api_project.urls
+imported = time.perf_counter()
+if WARM:
+    from books.warmup import warm_up
+    warm_up()
+warmed = time.perf_counter()
+
+hosts = [h for h in settings.ALLOWED_HOSTS if h and not h.startswith('.') and h != '*']
+environ = {
+    'REQUEST_METHOD': 'GET', 'PATH_INFO': '/api/books/', 'QUERY_STRING': '',
+    'SERVER_NAME': hosts[0] if hosts else '127.0.0.1', 'SERVER_PORT': '80',
+    'REMOTE_ADDR': '127.0.0.1', 'wsgi.url_scheme': 'http', 'wsgi.input': __import__('io').BytesIO(),
+    'wsgi.errors': sys.stderr, 'SERVER_PROTOCOL': 'HTTP/1.1',
+}
+status = []
+b''.join(application(environ, lambda s, h, *a: status.append(s)))
+done = time.perf_counter()
+print(json.dumps({
+    'status': status[0],
+    'import_ms': (imported - started) * 1000,
+    'warm_up_ms': (warmed - imported) * 1000,
+    'first_request_ms': (done - warmed) * 1000,
+    'time_to_first_response_ms': (done - started) * 1000,
+}))
+'''
+
+
+def run(warm):
+    code = f'import os\nPROJECT_DIR = {PROJECT_DIR!r}\nWARM = {warm}\n' + CHILD
+    out = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    keys = ['import_ms', 'warm_up_ms', 'first_request_ms', 'time_to_first_response_ms']
+    print(f"{'':<12}" + ''.join(f'{k:>28}' for k in keys))
+    for warm in (False, True):
+        results = [run(warm) for _ in range(runs)]
+        medians = [statistics.median(r[k] for r in results) for k in keys]
+        label = 'warm-up' if warm else 'cold'
+        print(f'{label:<12}' + ''.join(f'{m:>28.1f}' for m in medians) + f'   ({results[0]["status"]})')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,423 @@
+#!/usr/bin/env python
+"""
+Open-loop HTTP load generator for a running server (runserver, gunicorn,
+uvicorn, ...). It uses only the standard library: an asyncio HTTP/1.1
+client with a keep-alive connection pool.
+
+Virtual users arrive as a Poisson process at --rate sessions per second,
+whether or not earlier sessions have finished (open loop). A slow server
+therefore builds up concurrency instead of quietly lowering the offered
+load. Each session runs one scenario, picked by the --mix weights:
+
+  browse   anonymous: book list pages, book details, reviews, genres, authors
+  search   anonymous: autocomplete keystroke by keystroke, then a (fuzzy) search
+  review   token auth: read and PUT /api/books/{id}/my-review/
+  admin    token auth: read a book or author and PATCH it with the values read
+
+The review and admin scenarios write to the database. Reviews are
+upserted for the --users accounts, and admin edits write back the values
+they just read, so the catalog does not change.
+
+Latency is measured from the moment a request is due, including the wait
+for a free connection. Overload therefore shows up in the percentiles.
+The report lists requests, throughput, error rate and p50/p90/p95/p99/max
+latency per endpoint.
+
+Usage:
+  python manage.py runserver --noreload &
+  python benchmarks/load_test.py --rate 20 --duration 30
+  python benchmarks/load_test.py --mix browse=50,search=30,review=15,admin=5 \\
+      --admin admin:secret --json results.json
+"""
+import argparse
+import asyncio
+import json
+import math
+import random
+import sys
+import time
+from collections import Counter, defaultdict
+from urllib.parse import urlencode, urlsplit
+
+DEFAULT_USERS = 'john_doe:password123,jane_smith:password123,bob_johnson:password123'
+WORDS_FALLBACK = ['harry', 'orwell', 'history', 'murder', 'space']
+
+
+class HTTPClient:
+    """Minimal HTTP/1.1 client with a bounded pool of keep-alive connections"""
+
+    def __init__(self, base_url, max_connections, timeout):
+        parts = urlsplit(base_url)
+        self.host = parts.hostname
+        self.port = parts.port or (443 if parts.scheme == 'https' else 80)
+        self.ssl = parts.scheme == 'https' or None
+        self.netloc = parts.netloc
+        self.timeout = timeout
+        self._idle = []
+        self._slots = asyncio.Semaphore(max_connections)
+
+    async def request(self, method, path, body=None, headers=None):
+        """Return (status, headers, body bytes)"""
+        async with self._slots:
+            for attempt in (1, 2):
+                reused = bool(self._idle)
+                conn = self._idle.pop() if reused else await asyncio.wait_for(
+                    asyncio.open_connection(self.host, self.port, ssl=self.ssl), self.timeout)
+                try:
+                    status, response_headers, data, keep_alive = await asyncio.wait_for(
+                        self._exchange(conn, method, path, body, headers or {}), self.timeout)
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    conn[1].close()
+                    if reused and attempt == 1:
+                        # The server closed an idle keep-alive connection
+                        continue
+                    raise
+                except BaseException:
+                    conn[1].close()
+                    raise
+                if keep_alive:
+                    self._idle.append(conn)
+                else:
+                    conn[1].close()
+                return status, response_headers, data
+
+    async def _exchange(self, conn, method, path, body, headers):
+        reader, writer = conn
+        payload = json.dumps(body).encode() if body is not None else b''
+        lines = [
+            f'{method} {path} HTTP/1.1',
+            f'Host: {self.netloc}',
+            'Accept: application/json',
+            'User-Agent: books-load-test',
+        ]
+        if body is not None:
+            lines += ['Content-Type: application/json', f'Content-Length: {len(payload)}']
+        lines += [f'{name}: {value}' for name, value in headers.items()]
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + payload)
+        await writer.drain()
+
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionError('connection closed by server')
+        version, status = status_line.decode('latin-1').split(' ', 2)[:2]
+        response_headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            response_headers[name.strip().lower()] = value.strip()
+
+        keep_alive = version == 'HTTP/1.1' and response_headers.get('connection', '').lower() != 'close'
+        if method == 'HEAD' or status in ('204', '304'):
+            data = b''
+        elif response_headers.get('transfer-encoding', '').lower() == 'chunked':
+            chunks = []
+            while True:
+                size = int((await reader.readline()).split(b';')[0], 16)
+                if size == 0:
+                    await reader.readline()
+                    break
+                chunks.append(await reader.readexactly(size))
+                await reader.readline()
+            data = b''.join(chunks)
+        elif 'content-length' in response_headers:
+            data = await reader.readexactly(int(response_headers['content-length']))
+        else:
+            data = await reader.read()
+            keep_alive = False
+        return int(status), response_headers, data, keep_alive
+
+    def close(self):
+        for _reader, writer in self._idle:
+            writer.close()
+        self._idle = []
+
+
+class Stats:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(Counter)
+        self.sessions = Counter()
+        self.dropped = 0
+        self.recording = True
+
+    def record(self, label, latency, outcome, ok):
+        if not self.recording:
+            return
+        self.latencies[label].append(latency)
+        if not ok:
+            self.errors[label][outcome] += 1
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, math.ceil(fraction * len(sorted_values)) - 1)]
+
+
+class Session:
+    """One virtual user: runs a scenario and records every request"""
+
+    def __init__(self, runner, rng):
+        self.runner = runner
+        self.rng = rng
+
+    async def call(self, label, method, path, body=None, token=None, headers=None):
+        headers = dict(headers or {})
+        if token:
+            headers['Authorization'] = f'Token {token}'
+        started = time.perf_counter()
+        try:
+            status, _headers, data = await self.runner.client.request(method, path, body, headers)
+        except asyncio.TimeoutError:
+            self.runner.stats.record(label, time.perf_counter() - started, 'timeout', False)
+            return None, None
+        except (OSError, asyncio.IncompleteReadError, ValueError) as exc:
+            self.runner.stats.record(label, time.perf_counter() - started, type(exc).__name__, False)
+            return None, None
+        self.runner.stats.record(label, time.perf_counter() - started, str(status), status < 400)
+        try:
+            return status, json.loads(data) if data else None
+        except ValueError:
+            return status, None
+
+    async def think(self, mean=None):
+        await asyncio.sleep(self.rng.expovariate(1 / (mean or self.runner.args.think)))
+
+    def book(self):
+        return self.rng.choice(self.runner.books)
+
+    async def browse(self):
+        page = self.rng.randint(1, self.runner.args.pages)
+        _status, data = await self.call('GET /api/books/', 'GET', f'/api/books/?page={page}')
+        ids = [row['id'] for row in (data or {}).get('results', [])] or [self.book()['id']]
+        for _ in range(self.rng.randint(1, 3)):
+            await self.think()
+            book_id = self.rng.choice(ids)
+            await self.call('GET /api/books/{id}/', 'GET', f'/api/books/{book_id}/')
+            if self.rng.random() < 0.5:
+                await self.call('GET /api/books/{id}/reviews/', 'GET', f'/api/books/{book_id}/reviews/')
+        await self.think()
+        if self.rng.random() < 0.5:
+            genre = self.rng.choice(self.runner.genres)
+            await self.call('GET /api/books/by_genre/', 'GET', f'/api/books/by_genre/?genre={genre}')
+        else:
+            await self.call('GET /api/authors/', 'GET', f'/api/authors/?page={self.rng.randint(1, 2)}')
+
+    async def search(self):
+        words = [word for word in self.book()['title'].lower().split() if len(word) > 2]
+        word = self.rng.choice(words or WORDS_FALLBACK)
+        for length in range(1, min(len(word), 6) + 1):
+            query = urlencode({'q': word[:length]})
+            await self.call('GET /api/books/autocomplete/', 'GET', f'/api/books/autocomplete/?{query}')
+            # Typing speed: roughly 150 ms per keystroke
+            await self.think(0.15)
+        params = {'search': word}
+        if self.rng.random() < 0.3:
+            # A typo, searched with typo tolerance
+            position = self.rng.randrange(len(word))
+            params = {'search': word[:position] + word[position + 1:], 'fuzzy': 'true'}
+        await self.call('GET /api/books/?search=', 'GET', f'/api/books/?{urlencode(params)}')
+
+    async def review(self):
+        token = self.rng.choice(self.runner.tokens)
+        book_id = self.book()['id']
+        await self.call('GET /api/books/{id}/', 'GET', f'/api/books/{book_id}/')
+        await self.think()
+        await self.call(
+            'PUT /api/books/{id}/my-review/', 'PUT', f'/api/books/{book_id}/my-review/',
+            {'rating': self.rng.randint(1, 5), 'comment': 'Load test review'}, token=token,
+        )
+        await self.think()
+        await self.call('GET /api/reviews/?my_reviews=true', 'GET', '/api/reviews/?my_reviews=true', token=token)
+
+    async def admin(self):
+        token = self.runner.admin_token
+        book_id = self.book()['id']
+        _status, book = await self.call('GET /api/books/{id}/', 'GET', f'/api/books/{book_id}/', token=token)
+        if not book:
+            return
+        await self.think()
+        if self.rng.random() < 0.7:
+            await self.call('PATCH /api/books/{id}/', 'PATCH', f'/api/books/{book_id}/', {
+                'price': book['price'], 'is_available': book['is_available'],
+            }, token=token)
+            return
+        _status, author = await self.call(
+            'GET /api/authors/{id}/', 'GET', f"/api/authors/{book['author']}/", token=token)
+        if author:
+            await self.think()
+            await self.call('PATCH /api/authors/{id}/', 'PATCH', f"/api/authors/{book['author']}/",
+                            {'bio': author['bio']}, token=token)
+
+
+class Runner:
+
+    def __init__(self, args):
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.client = HTTPClient(args.url, args.connections, args.timeout)
+        self.stats = Stats()
+        self.books = []
+        self.genres = []
+        self.tokens = []
+        self.admin_token = None
+
+    async def login(self, credentials):
+        username, _, password = credentials.partition(':')
+        status, _headers, data = await self.client.request(
+            'POST', '/api/auth/token/', {'username': username, 'password': password})
+        if status != 200:
+            raise SystemExit(f'Login failed for {username!r} (HTTP {status}): {data[:200]!r}')
+        return json.loads(data)['token']
+
+    async def setup(self, mix):
+        for page in range(1, self.args.pages + 1):
+            status, _headers, data = await self.client.request('GET', f'/api/books/?page={page}')
+            if status != 200:
+                break
+            self.books += json.loads(data)['results']
+        if not self.books:
+            raise SystemExit(f'No books found at {self.args.url}/api/books/; is the server running with data?')
+        self.genres = sorted({book['genre'] for book in self.books})
+
+        if mix.get('review'):
+            self.tokens = [await self.login(credentials) for credentials in self.args.users.split(',')]
+        if mix.get('admin'):
+            if self.args.admin:
+                self.admin_token = await self.login(self.args.admin)
+            else:
+                print('No --admin credentials given; skipping the admin scenario', file=sys.stderr)
+                del mix['admin']
+
+    async def session(self, scenario):
+        self.stats.sessions[scenario] += 1
+        await getattr(Session(self, random.Random(self.rng.random())), scenario)()
+
+    async def run(self, mix):
+        await self.setup(mix)
+        if not mix:
+            raise SystemExit('No scenarios left to run')
+        names, weights = list(mix), list(mix.values())
+        loop = asyncio.get_running_loop()
+        tasks = set()
+
+        if self.args.warmup:
+            self.stats.recording = False
+        start = loop.time()
+        record_from = start + self.args.warmup
+        deadline = record_from + self.args.duration
+        next_arrival = start
+        while True:
+            next_arrival += self.rng.expovariate(self.args.rate)
+            if next_arrival >= deadline:
+                break
+            await asyncio.sleep(max(0.0, next_arrival - loop.time()))
+            if not self.stats.recording and loop.time() >= record_from:
+                self.stats.recording = True
+            if len(tasks) >= self.args.max_sessions:
+                self.stats.dropped += 1
+                continue
+            task = asyncio.create_task(self.session(self.rng.choices(names, weights)[0]))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        self.stats.recording = True
+        elapsed = loop.time() - record_from
+
+        # Let sessions in flight finish, but not forever
+        if tasks:
+            _done, pending = await asyncio.wait(tasks, timeout=self.args.timeout * 2)
+            for task in pending:
+                task.cancel()
+        self.client.close()
+        return elapsed
+
+
+def report(stats, elapsed, args, mix):
+    rows = []
+    for label in sorted(stats.latencies):
+        latencies = sorted(stats.latencies[label])
+        errors = sum(stats.errors[label].values())
+        rows.append({
+            'endpoint': label,
+            'requests': len(latencies),
+            'throughput': len(latencies) / elapsed,
+            'errors': errors,
+            'error_rate': errors / len(latencies),
+            'error_kinds': dict(stats.errors[label]),
+            **{f'p{q}_ms': percentile(latencies, q / 100) * 1000 for q in (50, 90, 95, 99)},
+            'max_ms': latencies[-1] * 1000,
+        })
+    requests = sum(row['requests'] for row in rows)
+    errors = sum(row['errors'] for row in rows)
+
+    print(f"\nTarget {args.rate:g} sessions/s for {args.duration:g}s, mix {mix}")
+    print(f"Sessions: {dict(stats.sessions)}, dropped at --max-sessions: {stats.dropped}")
+    print(f"Requests: {requests} ({requests / elapsed:.1f}/s), errors: {errors} "
+          f"({errors / requests:.2%})\n" if requests else 'No requests completed\n')
+    header = f"{'Endpoint':38s} {'Reqs':>7s} {'Req/s':>7s} {'Err%':>6s} " + ' '.join(
+        f'{name:>8s}' for name in ('p50 ms', 'p90 ms', 'p95 ms', 'p99 ms', 'max ms'))
+    print(header)
+    print('-' * len(header))
+    for row in rows:
+        print(
+            f"{row['endpoint']:38s} {row['requests']:7d} {row['throughput']:7.1f} {row['error_rate']:6.1%} "
+            + ' '.join(f'{row[key]:8.1f}' for key in ('p50_ms', 'p90_ms', 'p95_ms', 'p99_ms', 'max_ms'))
+        )
+    for row in rows:
+        if row['error_kinds']:
+            print(f"  {row['endpoint']}: {row['error_kinds']}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({
+                'target_rate': args.rate, 'duration': elapsed, 'mix': mix,
+                'sessions': dict(stats.sessions), 'dropped': stats.dropped,
+                'requests': requests, 'errors': errors, 'endpoints': rows,
+            }, f, indent=2)
+        print(f'\nWrote {args.json}')
+
+
+def parse_mix(value):
+    mix = {}
+    for part in value.split(','):
+        name, _, weight = part.partition('=')
+        if name not in ('browse', 'search', 'review', 'admin'):
+            raise argparse.ArgumentTypeError(f'unknown scenario {name!r}')
+        mix[name] = float(weight or 1)
+    return {name: weight for name, weight in mix.items() if weight > 0}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0],
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default='http://127.0.0.1:8000', help='server base URL')
+    parser.add_argument('--rate', type=float, default=10, help='session arrivals per second')
+    parser.add_argument('--duration', type=float, default=30, help='seconds of measured load')
+    parser.add_argument('--warmup', type=float, default=0, help='seconds of unmeasured load first')
+    parser.add_argument('--mix', type=parse_mix, default='browse=60,search=25,review=10,admin=5',
+                        help='scenario weights, e.g. browse=60,search=25,review=10,admin=5')
+    parser.add_argument('--think', type=float, default=1.0, help='mean think time between steps (s)')
+    parser.add_argument('--users', default=DEFAULT_USERS, help='user:password list for the review scenario')
+    parser.add_argument('--admin', help='user:password for the admin scenario')
+    parser.add_argument('--pages', type=int, default=5, help='book list pages to browse and sample from')
+    parser.add_argument('--connections', type=int, default=100, help='maximum open connections')
+    parser.add_argument('--max-sessions', type=int, default=2000,
+                        help='sessions in flight before new arrivals are dropped')
+    parser.add_argument('--timeout', type=float, default=10, help='per-request timeout (s)')
+    parser.add_argument('--seed', type=int, default=None, help='random seed for repeatable runs')
+    parser.add_argument('--json', help='also write the results to this JSON file')
+    args = parser.parse_args()
+
+    runner = Runner(args)
+    mix = dict(args.mix)
+    try:
+        elapsed = asyncio.run(runner.run(mix))
+    except KeyboardInterrupt:
+        return
+    report(runner.stats, elapsed, args, mix)
+
+
+if __name__ == '__main__':
+    main()
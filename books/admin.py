@@ -1,5 +1,21 @@
-from django.contrib import admin
+from decimal import Decimal
+
+from django import forms
+from django.contrib import admin, messages
+from django.contrib.admin.helpers import ActionForm
+from django.db.models import Case, F, Value, When
+from django.db.models.functions import Round
+from . import author_stats, entity_cache, snapshots
 from .models import Author, Book, Review
+from .pagination import EstimatedCountPaginator, invalidate_cached_counts
+
+
+class BookActionForm(ActionForm):
+    """Action form with an extra percentage field used by the reprice action"""
+    percent = forms.DecimalField(
+        required=False, max_digits=5, decimal_places=2,
+        help_text='Percentage change for "Reprice", e.g. 10 or -15'
+    )
 
 
 @admin.register(Author)
@@ -23,9 +39,15 @@ class AuthorAdmin(admin.ModelAdmin):
 class BookAdmin(admin.ModelAdmin):
     list_display = ['title', 'author', 'genre', 'price', 'is_available', 'publication_date']
     list_filter = ['genre', 'is_available', 'publication_date', 'created_at']
+    list_select_related = ['author']
     search_fields = ['title', 'author__name', 'isbn']
     readonly_fields = ['created_at', 'updated_at']
     list_editable = ['is_available', 'price']
+    autocomplete_fields = ['author']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    action_form = BookActionForm
+    actions = ['mark_available', 'mark_unavailable', 'toggle_availability', 'reprice']
     fieldsets = (
         (None, {
             'fields': ('title', 'author', 'isbn', 'genre')
@@ -39,13 +61,75 @@ class BookAdmin(admin.ModelAdmin):
         }),
     )
 
+    def get_queryset(self, request):
+        # Book.__str__ reads author.name (autocomplete results, review forms)
+        return super().get_queryset(request).select_related('author')
+
+    def forget_cached(self, queryset):
+        # update() skips signals; drop the rows from books.entity_cache and
+        # their authors' stats first, while a filtered changelist queryset
+        # still matches them
+        entity_cache.books.invalidate_many(queryset.values_list('pk', flat=True))
+        author_stats.invalidate(*set(queryset.values_list('author_id', flat=True)))
+
+    @admin.action(description='Mark selected books as available')
+    def mark_available(self, request, queryset):
+        self.forget_cached(queryset)
+        updated = queryset.update(is_available=True)
+        invalidate_cached_counts()
+        snapshots.catalog_changed()
+        self.message_user(request, f'{updated} book(s) marked as available.')
+
+    @admin.action(description='Mark selected books as unavailable')
+    def mark_unavailable(self, request, queryset):
+        self.forget_cached(queryset)
+        updated = queryset.update(is_available=False)
+        invalidate_cached_counts()
+        snapshots.catalog_changed()
+        self.message_user(request, f'{updated} book(s) marked as unavailable.')
+
+    @admin.action(description='Toggle availability of selected books')
+    def toggle_availability(self, request, queryset):
+        self.forget_cached(queryset)
+        updated = queryset.update(is_available=Case(
+            When(is_available=True, then=Value(False)),
+            default=Value(True),
+        ))
+        invalidate_cached_counts()
+        snapshots.catalog_changed()
+        self.message_user(request, f'Availability toggled for {updated} book(s).')
+
+    @admin.action(description='Reprice selected books by percentage')
+    def reprice(self, request, queryset):
+        try:
+            percent = BookActionForm.base_fields['percent'].clean(request.POST.get('percent'))
+        except forms.ValidationError:
+            percent = None
+        if percent is None:
+            self.message_user(request, 'Enter a valid percentage to reprice books.', messages.ERROR)
+            return
+        factor = Decimal('1') + percent / Decimal('100')
+        if factor <= 0:
+            self.message_user(request, 'Percentage must leave a positive price.', messages.ERROR)
+            return
+        self.forget_cached(queryset)
+        updated = queryset.update(price=Round(F('price') * factor, 2))
+        invalidate_cached_counts()
+        snapshots.catalog_changed()
+        self.message_user(request, f'{updated} book(s) repriced by {percent}%.')
+
 
 @admin.register(Review)
 class ReviewAdmin(admin.ModelAdmin):
     list_display = ['book', 'user', 'rating', 'created_at']
     list_filter = ['rating', 'created_at', 'book__genre']
+    list_select_related = ['book__author', 'user']
     search_fields = ['book__title', 'user__username', 'comment']
     readonly_fields = ['created_at', 'updated_at']
+    autocomplete_fields = ['book']
+    raw_id_fields = ['user']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     fieldsets = (
         (None, {
             'fields': ('book', 'user', 'rating', 'comment')
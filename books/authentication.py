@@ -0,0 +1,154 @@
+import secrets
+import threading
+import time
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core import signing
+from django.utils import timezone
+from django.utils.functional import SimpleLazyObject
+from rest_framework import exceptions
+from rest_framework.authentication import BaseAuthentication, get_authorization_header
+
+from .models import RevokedToken
+
+ACCESS_SALT = 'books.access-token'
+REFRESH_SALT = 'books.refresh-token'
+
+
+def access_token_lifetime():
+    return getattr(settings, 'BOOKS_ACCESS_TOKEN_LIFETIME', 300)
+
+
+def refresh_token_lifetime():
+    return getattr(settings, 'BOOKS_REFRESH_TOKEN_LIFETIME', 3600)
+
+
+def _sign(user, salt):
+    payload = {'u': user.pk, 's': int(user.is_staff), 'j': secrets.token_hex(8)}
+    return signing.TimestampSigner(salt=salt).sign_object(payload, compress=True)
+
+
+def issue_token_pair(user):
+    """Return a fresh signed access token and refresh token for a user"""
+    return {
+        'access': _sign(user, ACCESS_SALT),
+        'refresh': _sign(user, REFRESH_SALT),
+        'token_type': 'Bearer',
+        'expires_in': access_token_lifetime(),
+    }
+
+
+def decode_token(token, refresh=False):
+    """
+    Verify a signed token and return its payload.
+
+    Raises signing.BadSignature (or SignatureExpired) when the token is
+    invalid or too old, and AuthenticationFailed when it was revoked.
+    """
+    salt, max_age = (REFRESH_SALT, refresh_token_lifetime()) if refresh else (ACCESS_SALT, access_token_lifetime())
+    signer = signing.TimestampSigner(salt=salt)
+    payload = signer.unsign_object(token, max_age=max_age)
+    if denylist.is_revoked(payload['j']):
+        raise exceptions.AuthenticationFailed('Token has been revoked.')
+    payload['exp'] = _issued_at(signer, token) + max_age
+    return payload
+
+
+def _issued_at(signer, token):
+    value = token.rsplit(signer.sep, 1)[0]
+    return signing.b62_decode(value.rsplit(signer.sep, 1)[1])
+
+
+def revoke_token(payload):
+    """Deny a decoded token's id until it would have expired anyway"""
+    expires_at = datetime.fromtimestamp(payload['exp'], tz=dt_timezone.utc)
+    RevokedToken.objects.get_or_create(jti=payload['j'], defaults={'expires_at': expires_at})
+    denylist.add(payload['j'], payload['exp'])
+
+
+class Denylist:
+    """
+    Process-local set of revoked token ids.
+
+    Revocations are stored in RevokedToken; each process picks up new rows
+    at most every BOOKS_DENYLIST_REFRESH_INTERVAL seconds, so verifying a
+    token does not touch the database. Expired ids are pruned on refresh.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._revoked = {}
+        self._last_id = 0
+        self._next_refresh = 0.0
+
+    def add(self, jti, expires):
+        with self._lock:
+            self._revoked[jti] = expires
+
+    def is_revoked(self, jti):
+        if time.monotonic() >= self._next_refresh:
+            self.refresh()
+        return jti in self._revoked
+
+    def refresh(self):
+        interval = getattr(settings, 'BOOKS_DENYLIST_REFRESH_INTERVAL', 5.0)
+        rows = RevokedToken.objects.filter(
+            id__gt=self._last_id, expires_at__gt=timezone.now()
+        ).values_list('id', 'jti', 'expires_at')
+        now = time.time()
+        with self._lock:
+            for pk, jti, expires_at in rows:
+                self._revoked[jti] = expires_at.timestamp()
+                self._last_id = max(self._last_id, pk)
+            self._revoked = {j: exp for j, exp in self._revoked.items() if exp > now}
+            self._next_refresh = time.monotonic() + interval
+
+
+denylist = Denylist()
+
+
+class TokenUser(SimpleLazyObject):
+    """
+    Request user for signed tokens.
+
+    ``pk``, ``id``, ``is_staff`` and the authentication flags come from the
+    token itself; the User row is only loaded if a view reads anything else.
+    """
+    is_authenticated = True
+    is_anonymous = False
+
+    def __init__(self, user_id, is_staff):
+        super().__init__(lambda: User.objects.get(pk=user_id))
+        self.__dict__['pk'] = self.__dict__['id'] = user_id
+        self.__dict__['is_staff'] = is_staff
+
+
+class SignedTokenAuthentication(BaseAuthentication):
+    """
+    Authenticate ``Authorization: Bearer <token>`` headers.
+
+    Tokens are HMAC-signed with SECRET_KEY and verified in memory: no
+    database or cache lookup per request.
+    """
+    keyword = 'Bearer'
+
+    def authenticate(self, request):
+        auth = get_authorization_header(request).split()
+        if not auth or auth[0].lower() != self.keyword.lower().encode():
+            return None
+        if len(auth) != 2:
+            raise exceptions.AuthenticationFailed('Invalid bearer token header.')
+
+        try:
+            payload = decode_token(auth[1].decode())
+        except signing.SignatureExpired:
+            raise exceptions.AuthenticationFailed('Token has expired.')
+        except (signing.BadSignature, UnicodeError, KeyError, TypeError):
+            raise exceptions.AuthenticationFailed('Invalid token.')
+
+        return TokenUser(payload['u'], bool(payload['s'])), payload
+
+    def authenticate_header(self, request):
+        return self.keyword
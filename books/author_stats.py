@@ -0,0 +1,82 @@
+"""
+Per-author catalog statistics.
+
+Book count, price range and latest publication date come from a join of
+Author and Book; review totals and the average rating are read from the
+per-book rating histogram columns, so no Review rows are joined. Many
+authors are computed with one grouped query, and results are cached per
+author until one of their books or its reviews change (books.signals).
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, F, Max, Min, Sum
+from django.db.models.functions import Coalesce
+from .metrics import record_cache_lookup
+from .models import Author, Book
+
+
+def cache_key(author_id):
+    return f'books:author_stats:{author_id}'
+
+
+def _compute(author_ids):
+    rating_fields = [f'books__{field}' for field in Book.RATING_FIELDS]
+    reviews = sum((F(field) for field in rating_fields[1:]), F(rating_fields[0]))
+    stars = sum((F(field) * star for star, field in enumerate(rating_fields[1:], start=2)), F(rating_fields[0]))
+    rows = (
+        Author.objects.filter(pk__in=author_ids)
+        .values('pk')
+        .annotate(
+            books_count=Count('books'),
+            reviews_count=Coalesce(Sum(reviews), 0),
+            star_total=Coalesce(Sum(stars), 0),
+            min_price=Min('books__price'),
+            max_price=Max('books__price'),
+            latest_publication_date=Max('books__publication_date'),
+        )
+        .order_by()
+    )
+    stats = {}
+    for row in rows:
+        reviews_count = row['reviews_count']
+        stats[row['pk']] = {
+            'books_count': row['books_count'],
+            'reviews_count': reviews_count,
+            'average_rating': round(row['star_total'] / reviews_count, 2) if reviews_count else None,
+            'min_price': _price(row['min_price']),
+            'max_price': _price(row['max_price']),
+            'latest_publication_date': row['latest_publication_date'],
+        }
+    return stats
+
+
+def _price(value):
+    # Formatted like the DecimalField prices in the book serializers
+    return None if value is None else f'{value:.2f}'
+
+
+def get_stats(author_ids):
+    """Return {author_id: stats} for existing authors among ``author_ids``"""
+    keys = {cache_key(pk): pk for pk in author_ids}
+    found = cache.get_many(keys)
+    stats = {keys[key]: value for key, value in found.items()}
+    for pk in author_ids:
+        record_cache_lookup('author_stats', pk in stats)
+
+    missing = [pk for pk in author_ids if pk not in stats]
+    if missing:
+        computed = _compute(missing)
+        cache.set_many(
+            {cache_key(pk): value for pk, value in computed.items()},
+            getattr(settings, 'BOOKS_AUTHOR_STATS_CACHE_TIMEOUT', 300),
+        )
+        stats.update(computed)
+    return stats
+
+
+def invalidate(*author_ids):
+    cache.delete_many([cache_key(pk) for pk in author_ids if pk is not None])
+
+
+def invalidate_for_book(book_id):
+    invalidate(*Book.objects.filter(pk=book_id).values_list('author_id', flat=True))
@@ -0,0 +1,366 @@
+"""
+In-process typeahead index over book titles, author names and ISBNs.
+
+Each book is one entry whose text is ``"title\\x1fauthor name\\x1fisbn"``.
+Every word start in that text is encoded as ``entry << 10 | offset`` and
+kept in one array sorted by the case-folded text that follows it, so a
+prefix lookup is two binary searches plus a scan of the matching range.
+Matching books are ranked by popularity (number of reviews).
+
+Updates add the word starts of a changed book to a small sorted delta
+list that searches read alongside the main array; the delta is merged in
+once it holds DELTA_SIZE positions, so a write never shifts the whole
+array. They only drop the cached results the book was in or could enter.
+Replaced entries are compacted away by a rebuild in a background thread.
+
+The index is built once per process (at warm-up or on first use) and kept
+current by the Book/Author/Review signals in books.signals. Each write
+bumps a version stamp in the Django cache and stores the ids of the books
+it changed under that version. Other workers notice the new stamp, reload
+just those books (titles, authors and review counts) in a background
+thread, and only rebuild everything when the change lists are gone or too
+long.
+
+Memory (benchmarks/bench_autocomplete.py, 1M synthetic titles, 9M word
+starts): about 300 MiB per worker once built and a 600 MiB peak while
+building. A background rebuild keeps the old index serving meanwhile, so
+budget roughly 900 MiB per worker for that case.
+"""
+import heapq
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right, insort
+from itertools import chain
+
+from django.core.cache import cache
+from django.db import transaction
+
+SEPARATOR = '\x1f'
+OFFSET_BITS = 10
+OFFSET_MASK = (1 << OFFSET_BITS) - 1
+# Sort keys are compared on this many characters; longer queries are
+# checked against the full text of each candidate
+KEY_LENGTH = 24
+# Ranges wider than this are cached per query until the next update
+CACHE_RANGE = 2000
+CACHE_SIZE = 10000
+# Word starts of updated books kept outside the main array before a merge
+DELTA_SIZE = 4096
+VERSION_KEY = 'books:autocomplete_version'
+VERSION_CHECK_INTERVAL = 5.0
+# Book ids changed by each version, replayed by other workers; a worker
+# further behind than MAX_REPLAY versions (or more books) rebuilds
+CHANGES_KEY = 'books:autocomplete_changes:{}'
+CHANGES_TIMEOUT = 3600
+MAX_REPLAY = 1000
+
+
+def normalize(text):
+    return ' '.join(text.casefold().split())
+
+
+def _word_starts(text):
+    previous_alnum = False
+    for offset, char in enumerate(text[:OFFSET_MASK + 1]):
+        alnum = char.isalnum()
+        if alnum and not previous_alnum:
+            yield offset
+        previous_alnum = alnum
+
+
+class PrefixIndex:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reset()
+        self.version = None
+        self.built = False
+        self._next_version_check = 0.0
+        self._rebuilding = False
+
+    def _reset(self):
+        self._texts = []                 # entry -> "title\x1fauthor\x1fisbn"
+        self._book_ids = array('q')      # entry -> book id (-1 once replaced)
+        self._popularity = array('l')    # entry -> review count
+        self._starts = array('Q')        # sorted word-start positions
+        self._delta = []                 # sorted positions added since the last merge
+        self._entries = {}               # book id -> live entry
+        self._dead = 0
+        self._cache = {}
+
+    def _key(self, position, length=KEY_LENGTH):
+        text = self._texts[position >> OFFSET_BITS]
+        offset = position & OFFSET_MASK
+        return text[offset:offset + length].casefold()
+
+    # Building
+
+    def load(self, rows):
+        """
+        Replace the index contents with ``rows`` of
+        (book_id, title, author_name, isbn, popularity).
+        """
+        fresh = PrefixIndex()
+        buckets = {}
+        for book_id, title, author_name, isbn, popularity in rows:
+            entry = len(fresh._texts)
+            text = SEPARATOR.join((title, author_name or '', isbn))
+            fresh._texts.append(text)
+            fresh._entries[book_id] = entry
+            fresh._book_ids.append(book_id)
+            fresh._popularity.append(popularity)
+            for offset in _word_starts(text):
+                buckets.setdefault(text[offset].casefold(), []).append(entry << OFFSET_BITS | offset)
+
+        # Sorting one first-character bucket at a time keeps the temporary
+        # sort keys small even for millions of positions
+        for char in sorted(buckets):
+            positions = buckets.pop(char)
+            positions.sort(key=fresh._key)
+            fresh._starts.extend(positions)
+
+        with self._lock:
+            self._texts, self._book_ids = fresh._texts, fresh._book_ids
+            self._popularity, self._starts = fresh._popularity, fresh._starts
+            self._delta, self._entries = [], fresh._entries
+            self._dead = 0
+            self._cache = {}
+            self.built = True
+
+    def build(self):
+        """Load every book from the database"""
+        from .models import Book
+
+        version = cache.get(VERSION_KEY)
+        rows = (
+            (pk, title, author_name, isbn, sum(counts))
+            for pk, title, author_name, isbn, *counts in Book.objects.order_by().values_list(
+                'pk', 'title', 'author__name', 'isbn', *Book.RATING_FIELDS
+            ).iterator(chunk_size=5000)
+        )
+        self.load(rows)
+        self.version = version
+
+    def refresh(self, book_ids):
+        """Reload the given books from the database, removing the deleted ones"""
+        from .models import Book
+
+        rows = Book.objects.filter(pk__in=book_ids).order_by().values_list(
+            'pk', 'title', 'author__name', 'isbn', *Book.RATING_FIELDS
+        )
+        found = set()
+        for pk, title, author_name, isbn, *counts in rows:
+            self.upsert(pk, title, author_name, isbn, sum(counts))
+            found.add(pk)
+        for book_id in set(book_ids) - found:
+            self.remove(book_id)
+
+    def catch_up(self):
+        """Replay other processes' changes since this index's version, or rebuild"""
+        current, target = self.version or 0, cache.get(VERSION_KEY)
+        changes = {}
+        if target is not None and 0 < target - current <= MAX_REPLAY:
+            keys = [CHANGES_KEY.format(version) for version in range(current + 1, target + 1)]
+            changes = cache.get_many(keys)
+            if len(changes) < len(keys):
+                changes = {}
+        book_ids = set(chain.from_iterable(changes.values()))
+        if not changes or len(book_ids) > MAX_REPLAY:
+            self.build()
+            return
+        self.refresh(book_ids)
+        with self._lock:
+            if (self.version or 0) < target:
+                self.version = target
+
+    def ensure_current(self):
+        """Build on first use; catch up in the background when another process changed books"""
+        if not self.built:
+            with _build_lock:
+                if not self.built:
+                    self.build()
+            return
+        now = time.monotonic()
+        if now < self._next_version_check or self._rebuilding:
+            return
+        self._next_version_check = now + VERSION_CHECK_INTERVAL
+        if cache.get(VERSION_KEY) != self.version:
+            self._in_background(self.catch_up)
+
+    def _in_background(self, work):
+        """Run a catch-up or rebuild in a thread, one at a time, while lookups use the current index"""
+        with self._lock:
+            if self._rebuilding:
+                return
+            self._rebuilding = True
+        threading.Thread(target=self._background, args=(work,), daemon=True).start()
+
+    def _background(self, work):
+        from django.db import connection
+        try:
+            work()
+        finally:
+            self._rebuilding = False
+            # Check again soon for changes made while this ran
+            self._next_version_check = 0.0
+            connection.close()
+
+    # Searching
+
+    def search(self, query, limit=10):
+        """Return up to ``limit`` (book_id, title, author_name, isbn, popularity) matches"""
+        query = normalize(query)
+        if not query:
+            return []
+        cached = self._cache.get((query, limit))
+        if cached is not None:
+            return cached
+
+        key = query[:KEY_LENGTH]
+        matches = 0
+        positions = []
+        for starts in (self._starts, self._delta):
+            lo = bisect_left(starts, key, key=lambda p: self._key(p, len(key)))
+            hi = bisect_right(starts, key, lo=lo, key=lambda p: self._key(p, len(key)))
+            matches += hi - lo
+            positions.append(starts[lo:hi])
+
+        entries = set()
+        for position in chain(*positions):
+            entry = position >> OFFSET_BITS
+            if self._book_ids[entry] < 0:
+                continue
+            if len(query) > KEY_LENGTH:
+                offset = position & OFFSET_MASK
+                if not normalize(self._texts[entry][offset:]).startswith(query):
+                    continue
+            entries.add(entry)
+
+        best = heapq.nlargest(limit, entries, key=self._popularity.__getitem__)
+        results = []
+        for entry in best:
+            title, author_name, isbn = self._texts[entry].split(SEPARATOR)
+            results.append((self._book_ids[entry], title, author_name, isbn, self._popularity[entry]))
+
+        if matches > CACHE_RANGE:
+            if len(self._cache) >= CACHE_SIZE:
+                self._cache = {}
+            self._cache[(query, limit)] = results
+        return results
+
+    # Incremental updates (called from signals in the writing process)
+
+    def _find(self, book_id):
+        return self._entries.get(book_id)
+
+    def _forget_cached(self, book_id, text=None, popularity=0):
+        """Drop the cached results that contain the book or that ``text`` could now enter"""
+        if not self._cache:
+            return
+        suffixes = [normalize(text[offset:]) for offset in _word_starts(text)] if text else []
+        for cache_key, results in list(self._cache.items()):
+            query, limit = cache_key
+            if any(result[0] == book_id for result in results) or (
+                (len(results) < limit or popularity >= results[-1][4])
+                and any(suffix.startswith(query) for suffix in suffixes)
+            ):
+                self._cache.pop(cache_key, None)
+
+    def _merge_delta(self):
+        """Move the delta positions into the main array with one pass over it"""
+        starts, merged, previous = self._starts, array('Q'), 0
+        for position in self._delta:
+            index = bisect_right(starts, self._key(position), lo=previous, key=self._key)
+            merged.extend(starts[previous:index])
+            merged.append(position)
+            previous = index
+        merged.extend(starts[previous:])
+        self._starts, self._delta = merged, []
+
+    def upsert(self, book_id, title, author_name, isbn, popularity=None):
+        if not self.built:
+            return
+        with self._lock:
+            old = self._find(book_id)
+            if old is not None:
+                if popularity is None:
+                    popularity = self._popularity[old]
+                self._book_ids[old] = -1
+                self._dead += 1
+            popularity = popularity or 0
+            entry = len(self._texts)
+            text = SEPARATOR.join((title, author_name or '', isbn))
+            self._texts.append(text)
+            self._entries[book_id] = entry
+            self._book_ids.append(book_id)
+            self._popularity.append(popularity)
+            for offset in _word_starts(text):
+                insort(self._delta, entry << OFFSET_BITS | offset, key=self._key)
+            if len(self._delta) >= DELTA_SIZE:
+                self._merge_delta()
+            self._forget_cached(book_id, text, popularity)
+        self._compact_if_needed()
+
+    def remove(self, book_id):
+        if not self.built:
+            return
+        with self._lock:
+            entry = self._entries.pop(book_id, None)
+            if entry is not None:
+                self._book_ids[entry] = -1
+                self._dead += 1
+                self._forget_cached(book_id)
+        self._compact_if_needed()
+
+    def add_popularity(self, book_id, delta):
+        if not self.built:
+            return
+        entry = self._find(book_id)
+        if entry is not None:
+            self._popularity[entry] = max(self._popularity[entry] + delta, 0)
+            self._forget_cached(book_id, self._texts[entry], self._popularity[entry])
+
+    def _compact_if_needed(self):
+        """Drop replaced entries, once they make up a quarter of the index, with a background rebuild"""
+        if self._dead * 4 > len(self._texts):
+            # Writes made while it runs leave the version behind, so the
+            # next lookup catches up on them
+            self._in_background(self.build)
+
+    def mark_changed(self, book_ids=None):
+        """
+        Tell other processes that ``book_ids`` (None: any book) changed,
+        once the current transaction commits so they read the new rows.
+        """
+        book_ids = None if book_ids is None else list(book_ids)
+        transaction.on_commit(lambda: self._publish(book_ids))
+
+    def _publish(self, book_ids):
+        """
+        Bump the stamp and store the changed ids under the new version. This
+        process is current only if no other process changed books since it
+        built: then the stamp moved from its version straight to the next
+        one. Otherwise its version is left behind so ensure_current() catches
+        up on the next lookup.
+        """
+        while True:
+            try:
+                version = cache.incr(VERSION_KEY)
+                break
+            except ValueError:
+                # add() so that only one of several first writers starts at 1
+                if cache.add(VERSION_KEY, 1, None):
+                    version = 1
+                    break
+        if book_ids is not None and len(book_ids) <= MAX_REPLAY:
+            cache.set(CHANGES_KEY.format(version), book_ids, CHANGES_TIMEOUT)
+        with self._lock:
+            if version == (self.version or 0) + 1:
+                self.version = version
+            else:
+                self._next_version_check = 0.0
+
+
+_build_lock = threading.Lock()
+index = PrefixIndex()
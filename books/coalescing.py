@@ -0,0 +1,277 @@
+"""
+Single-flight coalescing for expensive read actions.
+
+Identical GET requests (same user, host, path, query parameters and
+negotiated media type) share one computation; browsable API (HTML) pages
+are never coalesced:
+
+* within a process, the first thread computes and the others wait on an
+  Event for its result;
+* across worker processes on the same host, the computing thread also
+  holds an fcntl lock on one of a fixed set of lock files, and results
+  are written to a file store that every worker reads.
+
+A stored result is fresh for BOOKS_COALESCE_TTL seconds and is then served
+stale for up to BOOKS_COALESCE_STALE_TTL more seconds while a single
+request recomputes it (stale-while-revalidate). Keys include the catalog
+version from books.pagination, so writes start a new generation of
+results. Only 200 responses are stored.
+
+Stored results are JSON files (the rendered body base64-encoded) in a
+private directory (books.tempdirs): BOOKS_COALESCE_DIR, by default
+``<tmp>/books-coalesce-<uid>``. If that directory is not private, reads
+are served uncoalesced and the problem is logged.
+"""
+import base64
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.http import HttpResponse
+from .metrics import record_cache_lookup
+from .pagination import COUNT_VERSION_KEY
+from .tempdirs import private_dir
+
+try:
+    import fcntl
+except ImportError:  # Windows: coalesce within each process only
+    fcntl = None
+
+LOCK_STRIPES = 256
+PRUNE_INTERVAL = 60.0
+
+logger = logging.getLogger('books.coalescing')
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+class ResultStore:
+    """Results shared by all workers on the host, one JSON file per key"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._next_prune = 0.0
+
+    def _path(self, digest):
+        return os.path.join(self.directory, f'{digest}.result')
+
+    def read(self, digest):
+        try:
+            with open(self._path(digest), 'rb') as f:
+                entry = json.load(f)
+            entry['content'] = base64.b64decode(entry['content'])
+            stale_until = entry['stale_until']
+        except (OSError, ValueError, TypeError, KeyError):
+            return None
+        return entry if stale_until > time.time() else None
+
+    def write(self, digest, entry):
+        # Write then rename so readers never see a partial file
+        path = self._path(digest)
+        temp = f'{path}.{os.getpid()}.{threading.get_ident()}'
+        with open(temp, 'w') as f:
+            json.dump({**entry, 'content': base64.b64encode(entry['content']).decode('ascii')}, f)
+        os.replace(temp, path)
+        self.prune_if_due()
+
+    def prune_if_due(self):
+        now = time.time()
+        if now < self._next_prune:
+            return
+        self._next_prune = now + PRUNE_INTERVAL
+        for name in os.listdir(self.directory):
+            if name.endswith('.result') and self.read(name[:-len('.result')]) is None:
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except OSError:
+                    pass
+
+
+class SingleFlight:
+    """Run one computation per key at a time across threads and processes"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._inflight = {}
+
+    def _lock_file(self, digest):
+        stripe = int(digest[:8], 16) % LOCK_STRIPES
+        return open(os.path.join(self.directory, f'{stripe}.lock'), 'a')
+
+    def _acquire_process_lock(self, digest, wait):
+        """Return an open, flock-ed file, or None if it could not be locked in ``wait`` seconds"""
+        if fcntl is None:
+            return open(os.devnull)
+        handle = self._lock_file(digest)
+        deadline = time.monotonic() + wait
+        while True:
+            try:
+                fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return handle
+            except BlockingIOError:
+                if time.monotonic() >= deadline:
+                    handle.close()
+                    return None
+                time.sleep(0.01)
+
+    def try_lead(self, digest):
+        """Claim ``digest`` without waiting; returns a release callable or None"""
+        with self._lock:
+            if digest in self._inflight:
+                return None
+            self._inflight[digest] = threading.Event()
+        handle = self._acquire_process_lock(digest, 0)
+        if handle is None:
+            self._finish(digest, None)
+            return None
+        return lambda: self._finish(digest, handle)
+
+    def lead_or_wait(self, digest, wait):
+        """
+        Return a release callable when this thread should compute, or None
+        after another thread of this process has finished computing.
+        """
+        with self._lock:
+            event = self._inflight.get(digest)
+            if event is None:
+                self._inflight[digest] = threading.Event()
+        if event is not None:
+            event.wait(wait)
+            return None
+        handle = self._acquire_process_lock(digest, wait)
+        return lambda: self._finish(digest, handle)
+
+    def _finish(self, digest, handle):
+        if handle is not None:
+            handle.close()  # closing releases the flock
+        with self._lock:
+            event = self._inflight.pop(digest, None)
+        if event is not None:
+            event.set()
+
+
+_state = {}
+_state_lock = threading.Lock()
+
+
+def _components():
+    """The result store and single-flight lock, or (None, None) when the directory is not private"""
+    configured = _setting('BOOKS_COALESCE_DIR', None)
+    with _state_lock:
+        if _state.get('configured', ()) != configured:
+            try:
+                directory = private_dir(configured, 'books-coalesce')
+            except ImproperlyConfigured:
+                logger.exception('Request coalescing is off')
+                _state.update(configured=configured, store=None, flight=None)
+            else:
+                _state.update(configured=configured, store=ResultStore(directory), flight=SingleFlight(directory))
+    return _state['store'], _state['flight']
+
+
+def request_digest(request, ignored_params=('profile',)):
+    params = sorted((k, v) for k, values in request.query_params.lists() if k not in ignored_params for v in values)
+    key = '|'.join([
+        str(cache.get(COUNT_VERSION_KEY, 0)),
+        # Responses may depend on the user (e.g. permissions), so never share across users
+        str(request.user.pk),
+        request.accepted_media_type or '',
+        request.get_host(),
+        request.path,
+        urlencode(params),
+    ])
+    return hashlib.md5(key.encode()).hexdigest()
+
+
+def _replay(entry, outcome):
+    response = HttpResponse(entry['content'], status=entry['status'])
+    for name, value in entry['headers']:
+        response[name] = value
+    response['X-Coalesce'] = outcome
+    return response
+
+
+class CoalescedReadsMixin:
+    """
+    ViewSet mixin that coalesces GET requests for the actions listed in
+    ``coalesce_actions``. Authentication, permissions and content
+    negotiation still run for every request; only the handler is shared.
+    Internal callers that need a fresh result set ``request.coalesce = False``.
+    """
+    coalesce_actions = []
+
+    def dispatch(self, request, *args, **kwargs):
+        # self.action is only set once DRF initializes the request
+        action = self.action_map.get(request.method.lower())
+        if (request.method == 'GET' and action in self.coalesce_actions and _setting('BOOKS_COALESCE', True)
+                and getattr(request, 'coalesce', True)):
+            self.get = self._coalesced(self.get)
+        return super().dispatch(request, *args, **kwargs)
+
+    def _coalesced(self, handler):
+        def coalesced_handler(request, *args, **kwargs):
+            if request.accepted_renderer.media_type == 'text/html':
+                # The browsable API embeds the user and a CSRF token; render it live
+                return handler(request, *args, **kwargs)
+            store, flight = _components()
+            if store is None:
+                return handler(request, *args, **kwargs)
+            digest = request_digest(request)
+
+            def compute():
+                response = self.finalize_response(request, handler(request, *args, **kwargs), *args, **kwargs)
+                response.render()
+                if response.status_code == 200:
+                    now = time.time()
+                    fresh_until = now + _setting('BOOKS_COALESCE_TTL', 5)
+                    store.write(digest, {
+                        'fresh_until': fresh_until,
+                        'stale_until': fresh_until + _setting('BOOKS_COALESCE_STALE_TTL', 30),
+                        'status': response.status_code,
+                        'headers': [(name, value) for name, value in response.items() if name != 'Content-Length'],
+                        'content': response.content,
+                    })
+                response['X-Coalesce'] = 'computed'
+                return response
+
+            entry = store.read(digest)
+            if entry is not None:
+                record_cache_lookup('coalesce', True)
+                if time.time() < entry['fresh_until']:
+                    return _replay(entry, 'hit')
+                release = flight.try_lead(digest)
+                if release is None:
+                    return _replay(entry, 'stale')
+                try:
+                    return compute()
+                finally:
+                    release()
+
+            record_cache_lookup('coalesce', False)
+            wait = _setting('BOOKS_COALESCE_WAIT', 10)
+            release = flight.lead_or_wait(digest, wait)
+            if release is None:
+                entry = store.read(digest)
+                if entry is not None:
+                    return _replay(entry, 'shared')
+                return compute()
+            try:
+                # Another process may have finished while this one waited for the lock
+                entry = store.read(digest)
+                if entry is not None and time.time() < entry['fresh_until']:
+                    return _replay(entry, 'shared')
+                return compute()
+            finally:
+                release()
+
+        return coalesced_handler
@@ -0,0 +1,162 @@
+"""
+Adaptive concurrency limits and load shedding.
+
+Requests are grouped into route classes (cheap reads, heavy reads,
+writes), each with its own cap on in-flight requests. The cap is learned
+from latency with a gradient rule in the style of Netflix's
+concurrency-limits Gradient2:
+
+    gradient  = clamp(tolerance * long_rtt / short_rtt, 0.5, 1.0)
+    new_limit = limit * gradient + sqrt(limit)
+
+long_rtt is a slow moving average of latency and short_rtt the mean of
+the latest window of samples. While latency stays near its long-term
+average the limit keeps growing by sqrt(limit). When the database slows
+down and latency rises, the limit shrinks towards what the backend can
+serve. A request over the limit waits up to BOOKS_CONCURRENCY_QUEUE_TIMEOUT
+for a slot. After that it is shed with a 503 and Retry-After, so admitted
+requests keep their normal latency.
+
+Limits are per process and nothing is shared between workers: with N
+worker processes up to N times each limit can be in flight in total, so
+size BOOKS_CONCURRENCY_LIMITS (and the database's connection limit) per
+worker. Within a worker they bound the requests its threads or event loop
+let reach the database at once. A single-threaded worker never has more
+than one request in flight and gets nothing from them.
+"""
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.http import JsonResponse
+from rest_framework.permissions import SAFE_METHODS
+from .metrics import registry
+
+CHEAP, HEAVY, WRITE = 'cheap', 'heavy', 'write'
+WINDOW = 10
+LONG_RTT_SAMPLES = 500
+TOLERANCE = 1.5
+SMOOTHING = 0.2
+
+
+class AdaptiveLimiter:
+
+    def __init__(self, initial_limit, min_limit=1, max_limit=1000):
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.inflight = 0
+        self.waiting = 0
+        self.long_rtt = None
+        self._window = []
+        self._condition = threading.Condition()
+
+    def acquire(self, timeout):
+        """Take a slot, waiting up to ``timeout`` seconds; False if the request should be shed"""
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            if self.inflight >= int(self.limit):
+                # Queue at most one limit's worth of requests
+                if self.waiting >= int(self.limit):
+                    return False
+                self.waiting += 1
+                try:
+                    while self.inflight >= int(self.limit):
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            return False
+                        self._condition.wait(remaining)
+                finally:
+                    self.waiting -= 1
+            self.inflight += 1
+            return True
+
+    def release(self, rtt=None):
+        """Free a slot; ``rtt`` is the request latency to learn from, None to skip it"""
+        with self._condition:
+            inflight = self.inflight
+            self.inflight -= 1
+            if rtt is not None:
+                self._window.append(rtt)
+                if len(self._window) >= WINDOW:
+                    self._update(sum(self._window) / len(self._window), inflight)
+                    self._window = []
+            # One waiter per free slot: a grown limit can free several
+            self._condition.notify(max(int(self.limit) - self.inflight, 0))
+
+    def _update(self, short_rtt, inflight):
+        if self.long_rtt is None:
+            self.long_rtt = short_rtt
+        else:
+            self.long_rtt += (short_rtt - self.long_rtt) / LONG_RTT_SAMPLES
+        # After an overload, let the long-term average recover quickly
+        if self.long_rtt / short_rtt > 2:
+            self.long_rtt *= 0.95
+
+        gradient = max(0.5, min(1.0, TOLERANCE * self.long_rtt / short_rtt))
+        # Do not grow a limit the traffic is not using
+        if gradient == 1.0 and inflight < self.limit / 2:
+            return
+        new_limit = self.limit * gradient + math.sqrt(self.limit)
+        new_limit = self.limit * (1 - SMOOTHING) + new_limit * SMOOTHING
+        self.limit = max(self.min_limit, min(self.max_limit, new_limit))
+
+
+def classify(request, match):
+    """Route class of a resolved request"""
+    if request.method not in SAFE_METHODS:
+        return WRITE
+    heavy = getattr(settings, 'BOOKS_CONCURRENCY_HEAVY_ROUTES', [])
+    if match.url_name in heavy or 'search' in request.GET:
+        return HEAVY
+    return CHEAP
+
+
+class ConcurrencyLimitMiddleware:
+    """
+    Cap in-flight requests per route class and shed the excess with 503.
+
+    Route classes and their starting limits come from
+    BOOKS_CONCURRENCY_LIMITS; url names in BOOKS_CONCURRENCY_EXEMPT_ROUTES
+    (such as the metrics endpoint) are never limited.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = getattr(settings, 'BOOKS_CONCURRENCY_LIMIT', True)
+        self.queue_timeout = getattr(settings, 'BOOKS_CONCURRENCY_QUEUE_TIMEOUT', 0.1)
+        self.retry_after = getattr(settings, 'BOOKS_CONCURRENCY_RETRY_AFTER', 1)
+        self.exempt = set(getattr(settings, 'BOOKS_CONCURRENCY_EXEMPT_ROUTES', ['metrics']))
+        max_limit = getattr(settings, 'BOOKS_CONCURRENCY_MAX_LIMIT', 200)
+        self.limiters = {
+            route_class: AdaptiveLimiter(initial, max_limit=max_limit)
+            for route_class, initial in getattr(
+                settings, 'BOOKS_CONCURRENCY_LIMITS', {CHEAP: 40, HEAVY: 8, WRITE: 10}
+            ).items()
+        }
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        limiter, started = getattr(request, '_concurrency_slot', (None, None))
+        if limiter is not None:
+            # Server errors say nothing about capacity; do not learn from them
+            ok = response.status_code < 500
+            limiter.release(time.perf_counter() - started if ok else None)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        match = request.resolver_match
+        if not self.enabled or match.url_name in self.exempt:
+            return None
+        route_class = classify(request, match)
+        limiter = self.limiters.get(route_class)
+        if limiter is None:
+            return None
+        if not limiter.acquire(self.queue_timeout):
+            registry.inc('books_shed_requests_total', {'route_class': route_class})
+            response = JsonResponse({'error': 'Server is busy, please retry shortly'}, status=503)
+            response['Retry-After'] = str(self.retry_after)
+            return response
+        request._concurrency_slot = (limiter, time.perf_counter())
+        return None
@@ -0,0 +1,143 @@
+"""
+Two-tier object cache for hot, read-mostly rows (authors and books).
+
+L1 is a per-process LRU dict with a TTL; L2 is the shared Django cache.
+Lookups go L1 -> L2 -> database and fill the tiers on the way back, and
+many ids are resolved with one get_many and one query.
+
+Writes delete the row from both tiers in the writing process and bump a
+per-model version stamp in the Django cache. Other workers read the stamp
+at most every VERSION_CHECK_INTERVAL seconds and clear their L1 when it
+changed, so they serve a stale row for at most that long.
+
+Hit and miss counts per tier are exported as
+``books_cache_requests_total{cache="author_l1"|"author_l2"|...}``.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from .metrics import record_cache_lookup
+from .models import Author, Book
+
+VERSION_CHECK_INTERVAL = 1.0
+
+
+class TwoTierCache:
+
+    def __init__(self, model, name):
+        self.model = model
+        self.name = name
+        self.version_key = f'books:entity_version:{name}'
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()   # pk -> (expires_at, instance)
+        self._version = None
+        self._next_version_check = 0.0
+        self.counts = {'l1_hits': 0, 'l1_misses': 0, 'l2_hits': 0, 'l2_misses': 0}
+
+    def _key(self, pk):
+        return f'books:entity:{self.name}:{pk}'
+
+    def _check_version(self, now):
+        if now < self._next_version_check:
+            return
+        self._next_version_check = now + VERSION_CHECK_INTERVAL
+        version = cache.get(self.version_key)
+        if version != self._version:
+            with self._lock:
+                self._entries.clear()
+            self._version = version
+
+    def _count(self, tier, hits, misses):
+        self.counts[f'{tier}_hits'] += hits
+        self.counts[f'{tier}_misses'] += misses
+        for hit, count in ((True, hits), (False, misses)):
+            if count:
+                record_cache_lookup(f'{self.name}_{tier}', hit, count)
+
+    def get(self, pk):
+        return self.get_many([pk]).get(pk)
+
+    def get_many(self, pks):
+        """Return {pk: instance} for the existing rows among ``pks``"""
+        now = time.monotonic()
+        self._check_version(now)
+        found, missing = {}, []
+        with self._lock:
+            for pk in set(pks):
+                entry = self._entries.get(pk)
+                if entry is not None and entry[0] > now:
+                    self._entries.move_to_end(pk)
+                    found[pk] = entry[1]
+                else:
+                    missing.append(pk)
+        self._count('l1', len(found), len(missing))
+        if not missing:
+            return found
+
+        shared = {
+            instance.pk: instance
+            for instance in cache.get_many([self._key(pk) for pk in missing]).values()
+        }
+        self._count('l2', len(shared), len(missing) - len(shared))
+        loaded = self.model.objects.in_bulk([pk for pk in missing if pk not in shared])
+        if loaded:
+            cache.set_many(
+                {self._key(pk): instance for pk, instance in loaded.items()},
+                getattr(settings, 'BOOKS_ENTITY_CACHE_TIMEOUT', 300),
+            )
+
+        fetched = {**shared, **loaded}
+        expires_at = now + getattr(settings, 'BOOKS_ENTITY_L1_TTL', 30)
+        max_entries = getattr(settings, 'BOOKS_ENTITY_L1_SIZE', 10000)
+        with self._lock:
+            for pk, instance in fetched.items():
+                self._entries[pk] = (expires_at, instance)
+                self._entries.move_to_end(pk)
+            while len(self._entries) > max_entries:
+                self._entries.popitem(last=False)
+        found.update(fetched)
+        return found
+
+    def invalidate_many(self, pks):
+        pks = list(pks)
+        with self._lock:
+            for pk in pks:
+                self._entries.pop(pk, None)
+        cache.delete_many([self._key(pk) for pk in pks])
+        while True:
+            try:
+                version = cache.incr(self.version_key)
+                break
+            except ValueError:
+                # add() so that only one of several first writers starts at 1
+                if cache.add(self.version_key, 1, None):
+                    version = 1
+                    break
+        if version != (self._version or 0) + 1:
+            # Another process wrote since this one last checked the stamp;
+            # its rows may still be in L1
+            with self._lock:
+                self._entries.clear()
+        self._version = version
+
+    def invalidate(self, pk):
+        self.invalidate_many([pk])
+
+    def stats(self):
+        """Hits, misses and hit ratio per tier in this process"""
+        result = {}
+        for tier in ('l1', 'l2'):
+            hits, misses = self.counts[f'{tier}_hits'], self.counts[f'{tier}_misses']
+            result[tier] = {
+                'hits': hits,
+                'misses': misses,
+                'hit_ratio': round(hits / (hits + misses), 4) if hits + misses else None,
+            }
+        return result
+
+
+authors = TwoTierCache(Author, 'author')
+books = TwoTierCache(Book, 'book')
@@ -0,0 +1,139 @@
+"""
+Facet counts for the book list (``?facets=genre,is_available,author``).
+
+Each facet is one grouped COUNT over the books matching the request's
+search and filters, except the facet's own filter: with ``?genre=fiction``
+the genre facet still counts every genre, so a sidebar can show what
+selecting another one would return.
+
+Results are cached per facet under the request's filter and search
+parameters (minus the facet's own), and catalog writes start a new
+generation through the paginator count version (books.pagination). The
+cache is checked before any filter runs. On a miss the filter backends,
+including fuzzy search, run once for a base queryset without the faceted
+parameters. Each missing facet then applies only the other facets'
+filters to it.
+"""
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count
+from django.http import QueryDict
+from . import entity_cache
+from .metrics import record_cache_lookup
+from .models import Book
+from .pagination import COUNT_VERSION_KEY
+
+# facet name -> (grouped field, query parameters that filter on it)
+FACETS = {
+    'genre': ('genre', ('genre',)),
+    'is_available': ('is_available', ('is_available',)),
+    'author': ('author', ('author',)),
+}
+
+
+class _FacetRequest:
+    """The request as seen by filter backends, with some query parameters removed"""
+
+    def __init__(self, request, dropped):
+        self._request = request
+        self.query_params = request.query_params.copy()
+        for name in dropped:
+            self.query_params.pop(name, None)
+
+    def __getattr__(self, name):
+        return getattr(self._request, name)
+
+
+def parse(value):
+    """Split ``?facets=`` into known facet names; raises ValueError for unknown ones"""
+    names = [name.strip() for name in value.split(',') if name.strip()]
+    unknown = [name for name in names if name not in FACETS]
+    if unknown:
+        raise ValueError(f"Unknown facet(s): {', '.join(unknown)}. Choose from {', '.join(FACETS)}")
+    return list(dict.fromkeys(names))
+
+
+def _filter_params(view, request):
+    """The request's filter and search parameters, {name: sorted values}"""
+    names = set(view.filterset_class.base_filters)
+    for backend in view.filter_backends:
+        names.update(filter(None, (getattr(backend, 'search_param', None), getattr(backend, 'fuzzy_param', None))))
+    return {name: sorted(request.query_params.getlist(name)) for name in sorted(names) if name in request.query_params}
+
+
+def _cache_key(version, facet, params):
+    own = FACETS[facet][1]
+    relevant = [(name, values) for name, values in params.items() if name not in own]
+    signature = hashlib.md5(json.dumps(relevant).encode()).hexdigest()
+    return f'books:facets:{version}:{facet}:{signature}'
+
+
+def _base_queryset(view, request):
+    """The view's queryset under every filter backend, without the faceted parameters"""
+    facet_request = _FacetRequest(request, [name for _field, params in FACETS.values() for name in params])
+    queryset = view.get_queryset()
+    for backend in view.filter_backends:
+        queryset = backend().filter_queryset(facet_request, queryset, view)
+    return queryset
+
+
+def _count(view, request, base, facet):
+    """{value: count} of one facet, with the other facets' filters applied to ``base``"""
+    field, own = FACETS[facet]
+    data = QueryDict(mutable=True)
+    for _field, params in FACETS.values():
+        for name in params:
+            if name not in own and name in request.query_params:
+                data.setlist(name, request.query_params.getlist(name))
+    queryset = view.filterset_class(data, queryset=base, request=request).qs if data else base
+    # Group over a pk subquery so the ordering and annotations of search
+    # apply per book, not per group
+    return dict(
+        Book.objects.filter(pk__in=queryset.order_by().values('pk'))
+        .values_list(field)
+        .annotate(count=Count('pk'))
+        .order_by()
+    )
+
+
+def _present(facet, counts):
+    if facet == 'genre':
+        return [
+            {'value': genre, 'label': label, 'count': counts.get(genre, 0)}
+            for genre, label in Book.GENRE_CHOICES
+        ]
+    if facet == 'is_available':
+        return [{'value': value, 'count': counts.get(value, 0)} for value in (True, False)]
+    # author: the largest groups first, named from the entity cache
+    top = sorted(counts.items(), key=lambda item: (-item[1], item[0]))
+    top = top[:getattr(settings, 'BOOKS_FACET_AUTHOR_LIMIT', 50)]
+    authors = entity_cache.authors.get_many([author_id for author_id, _count in top])
+    return [
+        {'value': author_id, 'label': authors[author_id].name if author_id in authors else None, 'count': count}
+        for author_id, count in top
+    ]
+
+
+def facet_counts(view, request, facets):
+    """Return {facet: [{'value', 'label'?, 'count'}, ...]} for the view's current filters"""
+    params = _filter_params(view, request)
+    version = cache.get(COUNT_VERSION_KEY, 0)
+    keys = {facet: _cache_key(version, facet, params) for facet in facets}
+    cached = cache.get_many(list(keys.values()))
+
+    results, computed, base = {}, {}, None
+    for facet in facets:
+        counts = cached.get(keys[facet])
+        record_cache_lookup('facets', counts is not None)
+        if counts is None:
+            if base is None:
+                base = _base_queryset(view, request)
+            counts = _count(view, request, base, facet)
+            computed[keys[facet]] = counts
+        results[facet] = _present(facet, counts)
+    if computed:
+        cache.set_many(computed, getattr(settings, 'BOOKS_FACET_CACHE_TIMEOUT', 300))
+    return results
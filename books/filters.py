@@ -0,0 +1,70 @@
+import django_filters
+from django.db.models import Case, IntegerField, When
+from rest_framework import filters
+from . import fuzzy
+from .models import Book, Review
+
+
+class BookFilter(django_filters.FilterSet):
+    """
+    Book list filters.
+
+    ``genre`` accepts several values (``?genre=fiction&genre=mystery``);
+    price, publication date, pages and average rating take min/max bounds.
+    The rating bounds compare the stored, indexed ``Book.average_rating``.
+    """
+    genre = django_filters.MultipleChoiceFilter(choices=Book.GENRE_CHOICES)
+    min_price = django_filters.NumberFilter(field_name='price', lookup_expr='gte')
+    max_price = django_filters.NumberFilter(field_name='price', lookup_expr='lte')
+    published_after = django_filters.DateFilter(field_name='publication_date', lookup_expr='gte')
+    published_before = django_filters.DateFilter(field_name='publication_date', lookup_expr='lte')
+    min_pages = django_filters.NumberFilter(field_name='pages', lookup_expr='gte')
+    max_pages = django_filters.NumberFilter(field_name='pages', lookup_expr='lte')
+    min_rating = django_filters.NumberFilter(field_name='average_rating', lookup_expr='gte',
+                                             label='Minimum average rating')
+    max_rating = django_filters.NumberFilter(field_name='average_rating', lookup_expr='lte',
+                                             label='Maximum average rating')
+
+    class Meta:
+        model = Book
+        fields = ['genre', 'author', 'is_available']
+
+
+class ReviewFilter(django_filters.FilterSet):
+    """Review list filters with rating and creation date ranges"""
+    min_rating = django_filters.NumberFilter(field_name='rating', lookup_expr='gte')
+    max_rating = django_filters.NumberFilter(field_name='rating', lookup_expr='lte')
+    created_after = django_filters.DateTimeFilter(field_name='created_at', lookup_expr='gte')
+    created_before = django_filters.DateTimeFilter(field_name='created_at', lookup_expr='lte')
+
+    class Meta:
+        model = Review
+        fields = ['book', 'rating']
+
+
+class FuzzySearchFilter(filters.SearchFilter):
+    """
+    SearchFilter with a typo-tolerant mode.
+
+    ``?search=asimv&fuzzy=true`` matches through the trigram index in
+    books.fuzzy instead of ``search_fields`` and orders results by
+    similarity, best first. Without ``fuzzy`` it behaves like SearchFilter.
+    Place it after OrderingFilter so the similarity order is kept.
+    """
+    fuzzy_param = 'fuzzy'
+
+    def filter_queryset(self, request, queryset, view):
+        if request.query_params.get(self.fuzzy_param, '').lower() not in ('1', 'true', 'yes'):
+            return super().filter_queryset(request, queryset, view)
+        query = ' '.join(self.get_search_terms(request))
+        if not query:
+            return queryset
+
+        scores = fuzzy.search_catalog(queryset.model, query)
+        if not scores:
+            return queryset.none()
+        ranked = sorted(scores, key=lambda pk: -scores[pk])
+        return queryset.filter(pk__in=ranked).order_by(
+            Case(*[When(pk=pk, then=rank) for rank, pk in enumerate(ranked)], output_field=IntegerField()),
+            'pk',
+        )
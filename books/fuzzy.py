@@ -0,0 +1,166 @@
+"""
+Typo-tolerant search over author names and book titles.
+
+Names and titles are normalized (case-folded, accents and punctuation
+removed) and split into padded trigrams, as PostgreSQL's pg_trgm does:
+"asimov" -> "  a", " as", "asi", "sim", "imo", "mov", "ov ". The trigrams
+are stored in AuthorTrigram/BookTrigram, indexed by trigram, and kept in
+sync by the signals in books.signals.
+
+A search looks up only the posting lists of the query's trigrams, keeps
+the rows sharing the most trigrams as candidates, and reranks those with
+an edit-distance similarity, so misspellings such as "Agatah Cristie" or
+"Asimv" still find their match without scanning the tables.
+"""
+import unicodedata
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
+from .models import Author, AuthorTrigram, Book, BookTrigram
+
+# How many rows sharing the most trigrams are reranked by edit distance
+CANDIDATES = 200
+
+
+def normalize(text):
+    """Case-fold, strip accents and reduce punctuation to single spaces"""
+    decomposed = unicodedata.normalize('NFKD', text.casefold())
+    kept = ''.join(c if c.isalnum() else ' ' for c in decomposed if not unicodedata.combining(c))
+    return ' '.join(kept.split())
+
+
+def trigrams(text):
+    grams = set()
+    for word in normalize(text).split():
+        padded = f'  {word} '
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def edit_distance(a, b):
+    """Levenshtein distance between two strings"""
+    if len(a) < len(b):
+        a, b = b, a
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, start=1):
+        current = [i]
+        for j, cb in enumerate(b, start=1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        previous = current
+    return previous[-1]
+
+
+def similarity(query, text):
+    """
+    Edit-distance similarity (0-1) between a normalized query and the
+    closest run of the same number of words in ``text``, so "asimv" scores
+    against "asimov" rather than the whole "isaac asimov".
+    """
+    words = normalize(text).split()
+    size = len(query.split())
+    windows = [' '.join(words[i:i + size]) for i in range(max(len(words) - size + 1, 1))]
+    return max(
+        1 - edit_distance(query, window) / max(len(query), len(window), 1)
+        for window in windows
+    )
+
+
+def min_similarity():
+    return getattr(settings, 'BOOKS_FUZZY_MIN_SIMILARITY', 0.6)
+
+
+def _candidates(trigram_model, field, query_grams):
+    # Rows must share at least a third of the query's trigrams
+    return (
+        trigram_model.objects.filter(trigram__in=query_grams)
+        .values(field)
+        .annotate(hits=Count('id'))
+        .filter(hits__gte=max(len(query_grams) // 3, 1))
+        .order_by('-hits')
+        .values_list(field, flat=True)[:CANDIDATES]
+    )
+
+
+def search_authors(query):
+    """Return [(author_id, score)] best first for authors whose name is close to ``query``"""
+    return _search(Author, AuthorTrigram, 'author_id', 'name', query)
+
+
+def search_books(query):
+    """Return [(book_id, score)] best first for books whose title is close to ``query``"""
+    return _search(Book, BookTrigram, 'book_id', 'title', query)
+
+
+def search_catalog(model, query):
+    """
+    Return {pk: score} for fuzzy matches of ``query`` on Author or Book.
+    Books match on their title or on their author's name.
+    """
+    if model is Author:
+        return dict(search_authors(query))
+    scores = dict(search_books(query))
+    authors = dict(search_authors(query))
+    if authors:
+        for pk, author_id in Book.objects.filter(author_id__in=authors).values_list(
+                'pk', 'author_id')[:CANDIDATES]:
+            scores[pk] = max(scores.get(pk, 0), authors[author_id])
+    return scores
+
+
+def _search(model, trigram_model, field, text_field, query):
+    query = normalize(query)
+    query_grams = trigrams(query)
+    if not query_grams:
+        return []
+    ids = list(_candidates(trigram_model, field, query_grams))
+    threshold = min_similarity()
+    scored = []
+    for pk, text in model.objects.filter(pk__in=ids).values_list('pk', text_field):
+        score = similarity(query, text)
+        if score >= threshold:
+            scored.append((pk, score))
+    scored.sort(key=lambda item: -item[1])
+    return scored
+
+
+# Keeping the index in sync
+
+def _index(trigram_model, field, objects):
+    """Replace the trigram rows of ``objects`` ((pk, text) pairs)"""
+    objects = dict(objects)
+    rows = [
+        trigram_model(**{field: pk, 'trigram': gram})
+        for pk, text in objects.items()
+        for gram in trigrams(text)
+    ]
+    with transaction.atomic():
+        trigram_model.objects.filter(**{f'{field}__in': list(objects)}).delete()
+        trigram_model.objects.bulk_create(rows, batch_size=1000)
+
+
+def index_authors(authors):
+    """Reindex (pk, name) pairs"""
+    _index(AuthorTrigram, 'author_id', authors)
+
+
+def index_books(books):
+    """Reindex (pk, title) pairs"""
+    _index(BookTrigram, 'book_id', books)
+
+
+def rebuild(batch_size=1000):
+    """Rebuild both trigram tables from scratch; returns (authors, books) indexed"""
+    counts = []
+    for model, trigram_model, field, text_field in (
+            (Author, AuthorTrigram, 'author_id', 'name'),
+            (Book, BookTrigram, 'book_id', 'title')):
+        trigram_model.objects.all().delete()
+        total, last_pk = 0, 0
+        while chunk := list(model.objects.filter(pk__gt=last_pk).order_by('pk').values_list(
+                'pk', text_field)[:batch_size]):
+            _index(trigram_model, field, chunk)
+            total += len(chunk)
+            last_pk = chunk[-1][0]
+        counts.append(total)
+    return tuple(counts)
@@ -0,0 +1,82 @@
+"""
+Idempotency-Key support for POST requests.
+
+A client that may retry a POST sends a unique ``Idempotency-Key`` header.
+The first request with a key runs normally and a successful response is
+stored in the Django cache for BOOKS_IDEMPOTENCY_TTL seconds, per user and
+endpoint. A retry with the same key and body gets the stored response
+with ``Idempotent-Replayed: true`` instead of creating a second object.
+The same key with a different body is rejected with 422, and a retry that
+arrives while the first request is still running gets 409.
+
+Failed requests (4xx/5xx) are not stored, so the key can be retried. Across
+worker processes this needs a shared cache backend.
+"""
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework.response import Response
+
+HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+# How long a request may hold its key before a retry can take it over
+IN_PROGRESS_TIMEOUT = 60
+
+
+def _cache_key(request, key):
+    digest = hashlib.md5(key.encode()).hexdigest()
+    return f'books:idempotency:{request.user.pk}:{request.path}:{digest}'
+
+
+def _fingerprint(request):
+    body = json.dumps(request.data, sort_keys=True, default=str)
+    return hashlib.md5(body.encode()).hexdigest()
+
+
+class IdempotentCreateMixin:
+    """ViewSet mixin making ``create`` honour the Idempotency-Key header"""
+
+    def _stored_response(self, stored, fingerprint):
+        if stored['fingerprint'] != fingerprint:
+            return Response({'error': f'{HEADER} was already used with a different request body'},
+                          status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+        if stored['status'] is None:
+            return Response({'error': f'A request with this {HEADER} is still being processed'},
+                          status=status.HTTP_409_CONFLICT)
+        return Response(stored['data'], status=stored['status'], headers={'Idempotent-Replayed': 'true'})
+
+    def create(self, request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if key is None:
+            return super().create(request, *args, **kwargs)
+        if not key or len(key) > MAX_KEY_LENGTH:
+            return Response({'error': f'{HEADER} must be 1 to {MAX_KEY_LENGTH} characters'},
+                          status=status.HTTP_400_BAD_REQUEST)
+
+        cache_key = _cache_key(request, key)
+        fingerprint = _fingerprint(request)
+        # add() is atomic: only one of several concurrent retries claims the key
+        pending = {'fingerprint': fingerprint, 'status': None}
+        while not cache.add(cache_key, pending, IN_PROGRESS_TIMEOUT):
+            stored = cache.get(cache_key)
+            if stored is not None:
+                return self._stored_response(stored, fingerprint)
+            # The entry expired between add() and get(); try to claim it again
+
+        try:
+            response = super().create(request, *args, **kwargs)
+        except Exception:
+            cache.delete(cache_key)
+            raise
+        if status.is_success(response.status_code):
+            cache.set(cache_key, {
+                'fingerprint': fingerprint,
+                'status': response.status_code,
+                'data': response.data,
+            }, getattr(settings, 'BOOKS_IDEMPOTENCY_TTL', 86400))
+        else:
+            cache.delete(cache_key)
+        return response
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from books.similarity import build
+
+
+class Command(BaseCommand):
+    help = 'Build or incrementally refresh the "readers also liked" neighbours from reviews'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='Rebuild from all reviews instead of only new ones')
+        parser.add_argument('--top-k', type=int, default=10, help='Neighbours stored per book')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Reviews read per batch')
+        parser.add_argument('--max-user-reviews', type=int, default=500,
+                            help='Ignore users with more reviews than this (bots, bulk importers)')
+
+    def handle(self, *args, **options):
+        result = build(
+            full=options['full'],
+            top_k=options['top_k'],
+            batch_size=options['batch_size'],
+            max_user_reviews=options['max_user_reviews'],
+        )
+        kind = 'Full rebuild' if result.full_rebuild else 'Incremental update'
+        self.stdout.write(self.style.SUCCESS(
+            f'{kind} complete: {result.books_updated} book(s) refreshed, '
+            f'reviews processed up to id {result.last_review_id}.'
+        ))
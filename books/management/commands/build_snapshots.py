@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from books.snapshots import rebuild, snapshot_dir
+
+
+class Command(BaseCommand):
+    help = 'Render the anonymous catalog pages to precompressed snapshot files served by SnapshotMiddleware'
+
+    def handle(self, *args, **options):
+        files = rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Wrote {files} snapshot file(s) to {snapshot_dir()}.'))
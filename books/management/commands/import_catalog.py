@@ -0,0 +1,180 @@
+import csv
+import json
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError, transaction
+from rest_framework import serializers
+from books import author_stats, entity_cache, fuzzy, snapshots
+from books.autocomplete import index as autocomplete_index
+from books.models import Author, Book
+from books.pagination import invalidate_cached_counts
+from books.serializers import BookSerializer
+
+BOOK_FIELDS = [
+    'title', 'isbn', 'publication_date', 'pages', 'genre',
+    'description', 'price', 'is_available',
+]
+
+
+class BookImportSerializer(BookSerializer):
+    """
+    BookSerializer rules for feed rows.
+
+    The author is given by email/name instead of a primary key, and ISBN
+    uniqueness is not checked row by row because books are upserted on it.
+    """
+    author_name = serializers.CharField(max_length=100, required=False, allow_blank=True)
+    author_email = serializers.EmailField()
+
+    class Meta(BookSerializer.Meta):
+        fields = BOOK_FIELDS + ['author_name', 'author_email']
+        extra_kwargs = {'isbn': {'validators': []}}
+
+
+class Command(BaseCommand):
+    help = 'Stream a CSV or JSONL book feed into the catalog, upserting books on ISBN'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV or JSONL file with one book per row')
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help='Input format (default: from file extension)')
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Rows per transaction')
+        parser.add_argument('--reject-file', help='Where to write rejected rows (default: <path>.rejects.jsonl)')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not os.path.exists(path):
+            raise CommandError(f'File not found: {path}')
+        fmt = options['format'] or ('jsonl' if path.endswith(('.jsonl', '.ndjson')) else 'csv')
+        chunk_size = options['chunk_size']
+        reject_path = options['reject_file'] or f'{path}.rejects.jsonl'
+
+        self.validator = BookImportSerializer()
+        self.stats = {'rows': 0, 'upserted': 0, 'rejected': 0, 'authors_created': 0}
+        started = time.perf_counter()
+
+        # bulk_create skips the signals that would normally do this
+        snapshots.invalidate()
+        with open(path, newline='', encoding='utf-8') as source, \
+                open(reject_path, 'w', encoding='utf-8') as rejects:
+            chunk = []
+            for line_number, row in self.read_rows(source, fmt):
+                chunk.append((line_number, row))
+                if len(chunk) >= chunk_size:
+                    self.import_chunk(chunk, rejects)
+                    chunk = []
+                    self.report(started)
+            if chunk:
+                self.import_chunk(chunk, rejects)
+
+        invalidate_cached_counts()
+        autocomplete_index.mark_changed()
+        self.report(started)
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {self.stats['upserted']} book(s), created {self.stats['authors_created']} author(s), "
+            f"rejected {self.stats['rejected']} row(s)."
+        ))
+        if self.stats['rejected']:
+            self.stdout.write(f'Rejected rows written to {reject_path}')
+        else:
+            os.remove(reject_path)
+
+        if getattr(settings, 'BOOKS_SNAPSHOTS', True):
+            files = snapshots.rebuild()
+            self.stdout.write(f'Rebuilt {files} catalog snapshot(s)')
+
+    def read_rows(self, source, fmt):
+        """Yield (line number, dict) pairs without loading the whole file"""
+        if fmt == 'csv':
+            for line_number, row in enumerate(csv.DictReader(source), start=2):
+                # Empty CSV cells mean "not provided" so model defaults apply
+                yield line_number, {k: v for k, v in row.items() if k and v != ''}
+            return
+        for line_number, line in enumerate(source, start=1):
+            if not line.strip():
+                continue
+            try:
+                yield line_number, json.loads(line)
+            except json.JSONDecodeError as exc:
+                yield line_number, {'_invalid_json': str(exc)}
+
+    def import_chunk(self, chunk, rejects):
+        valid = {}
+        for line_number, row in chunk:
+            self.stats['rows'] += 1
+            if '_invalid_json' in row:
+                self.reject(rejects, line_number, row, {'non_field_errors': [row['_invalid_json']]})
+                continue
+            try:
+                data = self.validator.run_validation(row)
+            except serializers.ValidationError as exc:
+                self.reject(rejects, line_number, row, exc.detail)
+                continue
+            # Last occurrence of an ISBN within a chunk wins
+            valid[data['isbn']] = data
+
+        if not valid:
+            return
+
+        with transaction.atomic():
+            authors = self.resolve_authors(valid.values())
+            # Books moving to another author change the old author's stats too
+            previous_authors = set(Book.objects.filter(isbn__in=valid).values_list('author_id', flat=True))
+            books = []
+            for data in valid.values():
+                author_email = data.pop('author_email')
+                data.pop('author_name', None)
+                books.append(Book(author=authors[author_email], **data))
+            Book.objects.bulk_create(
+                books,
+                update_conflicts=True,
+                unique_fields=['isbn'],
+                update_fields=[f for f in BOOK_FIELDS if f != 'isbn'] + ['author', 'updated_at'],
+            )
+            # bulk_create skips signals, so refresh the derived data here
+            imported = list(Book.objects.filter(isbn__in=valid).values_list('pk', 'title'))
+            fuzzy.index_books(imported)
+            # After commit, so no reader caches the old rows again meanwhile
+            book_ids = [pk for pk, _title in imported]
+            transaction.on_commit(lambda: entity_cache.books.invalidate_many(book_ids))
+            author_stats.invalidate(*previous_authors, *(author.pk for author in authors.values()))
+        self.stats['upserted'] += len(books)
+
+    def resolve_authors(self, rows):
+        """Map email to Author, creating missing authors in one batch"""
+        names = {}
+        for data in rows:
+            email = data['author_email']
+            names.setdefault(email, data.get('author_name') or email.split('@')[0])
+
+        authors = {a.email: a for a in Author.objects.filter(email__in=names)}
+        missing = [Author(name=names[email], email=email) for email in names if email not in authors]
+        if missing:
+            try:
+                with transaction.atomic():
+                    Author.objects.bulk_create(missing)
+                created = [a.email for a in missing]
+            except IntegrityError:
+                # Another import created some of them first; only count ours
+                created = [
+                    a.email for a in missing
+                    if Author.objects.get_or_create(email=a.email, defaults={'name': a.name})[1]
+                ]
+            self.stats['authors_created'] += len(created)
+            authors.update((a.email, a) for a in Author.objects.filter(email__in=[a.email for a in missing]))
+            fuzzy.index_authors((authors[email].pk, authors[email].name) for email in created)
+        return authors
+
+    def reject(self, rejects, line_number, row, errors):
+        self.stats['rejected'] += 1
+        rejects.write(json.dumps({'line': line_number, 'row': row, 'errors': errors}, default=str) + '\n')
+
+    def report(self, started):
+        elapsed = time.perf_counter() - started
+        rate = self.stats['rows'] / elapsed if elapsed else 0
+        self.stdout.write(
+            f"{self.stats['rows']} rows processed ({self.stats['upserted']} upserted, "
+            f"{self.stats['rejected']} rejected) in {elapsed:.1f}s, {rate:.0f} rows/s"
+        )
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from books.models import ReviewImportJob
+from books.review_import import run
+
+
+class Command(BaseCommand):
+    help = 'Run pending bulk review imports, e.g. jobs queued by a web process that stopped before running them'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--include-running', action='store_true',
+            help='Also restart jobs marked running (only when no web process is still working on them)',
+        )
+
+    def handle(self, *args, **options):
+        if options['include_running']:
+            ReviewImportJob.objects.filter(status=ReviewImportJob.RUNNING).update(status=ReviewImportJob.PENDING)
+        job_ids = list(
+            ReviewImportJob.objects.filter(status=ReviewImportJob.PENDING)
+            .order_by('submitted_at').values_list('pk', flat=True)
+        )
+        for job_id in job_ids:
+            if run(job_id):
+                job = ReviewImportJob.objects.defer('rows').get(pk=job_id)
+                self.stdout.write(
+                    f'{job_id}: {job.status}, {job.created} created, {job.updated} updated, '
+                    f'{job.skipped} skipped, {job.failed} failed'
+                )
+        self.stdout.write(self.style.SUCCESS(f'Processed {len(job_ids)} import job(s).'))
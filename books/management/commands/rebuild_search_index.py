@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from books import fuzzy
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the trigram index used by fuzzy author/title search'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows indexed per transaction')
+
+    def handle(self, *args, **options):
+        authors, books = fuzzy.rebuild(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Indexed {authors} author name(s) and {books} book title(s).'))
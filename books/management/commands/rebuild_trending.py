@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from books.trending import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the hourly/daily review counters behind /api/books/trending/ from the Review table'
+
+    def handle(self, *args, **options):
+        written = rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Wrote {written} review bucket(s).'))
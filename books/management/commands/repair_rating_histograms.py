@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from books.ratings import rebuild_rating_histograms
+
+
+class Command(BaseCommand):
+    help = "Rebuild every book's 1-5 star rating histogram from the Review table"
+
+    def handle(self, *args, **options):
+        updated = rebuild_rating_histograms()
+        self.stdout.write(self.style.SUCCESS(f'Repaired rating histograms on {updated} book(s).'))
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+from books.models import SlowQuery
+
+
+class Command(BaseCommand):
+    help = 'Summarize logged slow queries, worst total time first'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=10, help='Number of query shapes to show')
+        parser.add_argument('--explain', action='store_true', help='Include the captured query plans')
+        parser.add_argument('--reset', action='store_true', help='Delete all logged slow queries')
+
+    def handle(self, *args, **options):
+        if options['reset']:
+            deleted, _ = SlowQuery.objects.all().delete()
+            self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} slow query record(s).'))
+            return
+
+        queries = SlowQuery.objects.order_by('-total_ms')[:options['limit']]
+        if not queries:
+            self.stdout.write('No slow queries logged.')
+            return
+
+        for rank, query in enumerate(queries, start=1):
+            avg_ms = query.total_ms / query.calls if query.calls else 0
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f'#{rank}  total {query.total_ms:.1f} ms  calls {query.calls}  '
+                f'avg {avg_ms:.1f} ms  max {query.max_ms:.1f} ms  view {query.view or "-"}'
+            ))
+            self.stdout.write(f'    {query.sql}')
+            self.stdout.write(f'    params: {query.sample_params}')
+            if options['explain'] and query.explain:
+                for line in query.explain.splitlines():
+                    self.stdout.write(f'    | {line}')
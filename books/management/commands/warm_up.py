@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from books.warmup import warm_up
+
+
+class Command(BaseCommand):
+    help = 'Run the worker warm-up stage and report how long each part took'
+
+    def handle(self, *args, **options):
+        timings = warm_up()
+        for stage, ms in timings.items():
+            self.stdout.write(f'{stage:<14}{ms:>10.2f} ms')
+        self.stdout.write(self.style.SUCCESS('Warm-up complete.'))
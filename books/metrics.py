@@ -0,0 +1,246 @@
+import json
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+from contextlib import ExitStack, closing
+
+from django.conf import settings
+from django.db import connections
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+METRIC_HELP = {
+    'books_http_request_duration_seconds': ('histogram', 'Request latency by route'),
+    'books_http_requests_total': ('counter', 'Requests by route and status'),
+    'books_http_response_bytes_total': ('counter', 'Response body bytes by route'),
+    'books_db_queries_total': ('counter', 'SQL queries issued by route'),
+    'books_db_query_seconds_total': ('counter', 'Time spent in SQL by route'),
+    'books_cache_requests_total': ('counter', 'Cache lookups by cache and result'),
+    'books_shed_requests_total': ('counter', 'Requests rejected with 503 by the concurrency limiter'),
+}
+
+
+class MetricsRegistry:
+    """
+    In-process metric store with optional aggregation across workers.
+
+    Values are kept as flat counters keyed by (name, labels). When a
+    shared SQLite file is configured, each worker periodically adds its
+    pending deltas to it and the exporter reads the combined totals.
+    """
+
+    def __init__(self, path=None, flush_interval=5.0):
+        self.path = path
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._values = defaultdict(float)
+        self._pending = defaultdict(float)
+        self._last_flush = time.monotonic()
+
+    def inc(self, name, labels, amount=1):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._values[key] += amount
+            self._pending[key] += amount
+
+    def observe(self, name, labels, value):
+        """Record a histogram sample (buckets are stored non-cumulative)"""
+        le = next((str(b) for b in LATENCY_BUCKETS if value <= b), '+Inf')
+        self.inc(f'{name}_bucket', {**labels, 'le': le})
+        self.inc(f'{name}_sum', labels, value)
+        self.inc(f'{name}_count', labels)
+
+    def maybe_flush(self):
+        if self.path and time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        if not self.path:
+            return
+        with self._lock:
+            pending, self._pending = self._pending, defaultdict(float)
+            self._last_flush = time.monotonic()
+        if not pending:
+            return
+        rows = [(name, json.dumps(labels), value) for (name, labels), value in pending.items()]
+        try:
+            with closing(self._connect()) as db, db:
+                db.executemany(
+                    "INSERT INTO metrics (name, labels, value) VALUES (?, ?, ?) "
+                    "ON CONFLICT (name, labels) DO UPDATE SET value = value + excluded.value",
+                    rows
+                )
+        except sqlite3.Error:
+            # Keep the deltas for the next flush rather than losing them
+            with self._lock:
+                for key, value in pending.items():
+                    self._pending[key] += value
+
+    def collect(self):
+        """Return {(name, labels): value} for this process or all workers"""
+        if not self.path:
+            with self._lock:
+                return dict(self._values)
+        self.flush()
+        with closing(self._connect()) as db:
+            rows = db.execute("SELECT name, labels, value FROM metrics").fetchall()
+        return {
+            (name, tuple(tuple(pair) for pair in json.loads(labels))): value
+            for name, labels, value in rows
+        }
+
+    def _connect(self):
+        db = sqlite3.connect(self.path, timeout=2)
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS metrics ("
+            "name TEXT NOT NULL, labels TEXT NOT NULL, value REAL NOT NULL, "
+            "PRIMARY KEY (name, labels))"
+        )
+        return db
+
+
+registry = MetricsRegistry(
+    path=getattr(settings, 'BOOKS_METRICS_DB', None),
+    flush_interval=getattr(settings, 'BOOKS_METRICS_FLUSH_INTERVAL', 5.0),
+)
+
+
+def record_cache_lookup(cache_name, hit, count=1):
+    registry.inc('books_cache_requests_total', {'cache': cache_name, 'result': 'hit' if hit else 'miss'}, count)
+
+
+class QueryCounter:
+    """Database execute wrapper that tallies query count and time"""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - start
+            self.count += 1
+
+
+class MetricsMiddleware:
+    """
+    Record latency, SQL usage, response size and status per URL name.
+
+    Routes are labelled with the resolver's url_name, so DRF actions show
+    up as ``book-list``, ``book-popular``, ``review-detail`` and so on.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        counter = QueryCounter()
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(counter))
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - start
+
+        match = request.resolver_match
+        labels = {
+            'route': (match.url_name or match.view_name) if match else getattr(request, 'metrics_route', 'unmatched'),
+            'method': request.method,
+        }
+        registry.observe('books_http_request_duration_seconds', labels, elapsed)
+        registry.inc('books_http_requests_total', {**labels, 'status': str(response.status_code)})
+        if response.streaming:
+            _count_streamed_bytes(response, labels)
+        else:
+            registry.inc('books_http_response_bytes_total', labels, len(response.content))
+        registry.inc('books_db_queries_total', labels, counter.count)
+        registry.inc('books_db_query_seconds_total', labels, counter.seconds)
+        registry.maybe_flush()
+        return response
+
+
+def _count_streamed_bytes(response, labels):
+    """Record the body size of a streaming response, once it has been sent if it has no Content-Length"""
+    length = response.get('Content-Length', '')
+    if length.isdigit():
+        # e.g. FileResponse; wrapping its content would lose wsgi.file_wrapper
+        registry.inc('books_http_response_bytes_total', labels, int(length))
+        return
+    content = response.streaming_content
+
+    def counted():
+        sent = 0
+        try:
+            for chunk in content:
+                sent += len(chunk)
+                yield chunk
+        finally:
+            registry.inc('books_http_response_bytes_total', labels, sent)
+
+    async def counted_async():
+        sent = 0
+        try:
+            async for chunk in content:
+                sent += len(chunk)
+                yield chunk
+        finally:
+            registry.inc('books_http_response_bytes_total', labels, sent)
+
+    response.streaming_content = counted_async() if response.is_async else counted()
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    parts = []
+    for key, value in labels:
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        parts.append(f'{key}="{value}"')
+    return '{' + ','.join(parts) + '}'
+
+
+def _format_value(value):
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def render_prometheus(values):
+    """Render collected values in the Prometheus text exposition format"""
+    families = defaultdict(list)
+    for (name, labels), value in values.items():
+        for base in METRIC_HELP:
+            if name == base or name in (f'{base}_bucket', f'{base}_sum', f'{base}_count'):
+                families[base].append((name, labels, value))
+                break
+
+    lines = []
+    for base in sorted(families):
+        kind, help_text = METRIC_HELP[base]
+        lines.append(f'# HELP {base} {help_text}')
+        lines.append(f'# TYPE {base} {kind}')
+        samples = families[base]
+        if kind != 'histogram':
+            for name, labels, value in sorted(samples):
+                lines.append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+            continue
+
+        buckets = defaultdict(dict)
+        totals = {}
+        for name, labels, value in samples:
+            if name.endswith('_bucket'):
+                series = tuple(pair for pair in labels if pair[0] != 'le')
+                buckets[series][dict(labels)['le']] = value
+            else:
+                totals[(name, labels)] = value
+        for series in sorted(buckets):
+            cumulative = 0
+            for le in [str(b) for b in LATENCY_BUCKETS] + ['+Inf']:
+                cumulative += buckets[series].get(le, 0)
+                lines.append(f'{base}_bucket{_format_labels(series + (("le", le),))} {_format_value(cumulative)}')
+            for suffix in ('_sum', '_count'):
+                value = totals.get((f'{base}{suffix}', series), 0)
+                lines.append(f'{base}{suffix}{_format_labels(series)} {_format_value(value)}')
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.4 on 2026-10-19 14:39
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def backfill_rating_histograms(apps, schema_editor):
+    Book = apps.get_model('books', 'Book')
+    Review = apps.get_model('books', 'Review')
+    rows = Review.objects.values('book_id', 'rating').annotate(n=Count('id')).order_by()
+    for row in rows:
+        Book.objects.filter(pk=row['book_id']).update(**{f"rating_{row['rating']}": row['n']})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0005_similar_books'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='rating_1',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='rating_2',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='rating_3',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='rating_4',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='rating_5',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_rating_histograms, migrations.RunPython.noop),
+    ]
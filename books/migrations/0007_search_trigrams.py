@@ -0,0 +1,80 @@
+# Generated by Django 5.2.4 on 2026-10-19 14:44
+
+import unicodedata
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+BATCH_SIZE = 2000
+
+
+# Frozen copies of books.fuzzy.normalize/trigrams, so this migration keeps
+# producing the same trigrams if that module changes
+def normalize(text):
+    decomposed = unicodedata.normalize('NFKD', text.casefold())
+    kept = ''.join(c if c.isalnum() else ' ' for c in decomposed if not unicodedata.combining(c))
+    return ' '.join(kept.split())
+
+
+def trigrams(text):
+    grams = set()
+    for word in normalize(text).split():
+        padded = f'  {word} '
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def backfill_trigrams(apps, schema_editor):
+    for model_name, trigram_model_name, field, text_field in (
+            ('Author', 'AuthorTrigram', 'author_id', 'name'),
+            ('Book', 'BookTrigram', 'book_id', 'title')):
+        model = apps.get_model('books', model_name)
+        trigram_model = apps.get_model('books', trigram_model_name)
+        # Walk the table in pk order, one batch of rows in memory at a time
+        last_pk = 0
+        while True:
+            batch = list(
+                model.objects.filter(pk__gt=last_pk).order_by('pk').values_list('pk', text_field)[:BATCH_SIZE]
+            )
+            if not batch:
+                break
+            trigram_model.objects.bulk_create(
+                [trigram_model(**{field: pk, 'trigram': gram}) for pk, text in batch for gram in trigrams(text)],
+                batch_size=1000,
+            )
+            last_pk = batch[-1][0]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0006_book_rating_histogram'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuthorTrigram',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('trigram', models.CharField(max_length=3)),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='books.author')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['trigram', 'author'], name='books_autho_trigram_d92583_idx')],
+                'unique_together': {('author', 'trigram')},
+            },
+        ),
+        migrations.CreateModel(
+            name='BookTrigram',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('trigram', models.CharField(max_length=3)),
+                ('book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='books.book')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['trigram', 'book'], name='books_bookt_trigram_098ec6_idx')],
+                'unique_together': {('book', 'trigram')},
+            },
+        ),
+        migrations.RunPython(backfill_trigrams, migrations.RunPython.noop),
+    ]
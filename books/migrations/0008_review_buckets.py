@@ -0,0 +1,52 @@
+# Generated by Django 5.2.4 on 2026-10-19 14:46
+
+from datetime import timedelta, timezone as dt_timezone
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDay, TruncHour
+from django.utils import timezone
+
+
+def backfill_review_buckets(apps, schema_editor):
+    Review = apps.get_model('books', 'Review')
+    ReviewBucket = apps.get_model('books', 'ReviewBucket')
+    now = timezone.now()
+    for granularity, trunc, retention in (('h', TruncHour, timedelta(hours=25)), ('d', TruncDay, timedelta(days=31))):
+        counts = (
+            Review.objects.filter(created_at__gte=now - retention)
+            .annotate(start=trunc('created_at', tzinfo=dt_timezone.utc))
+            .values('book_id', 'start')
+            .annotate(reviews=Count('id'), rating_sum=Sum('rating'))
+            .order_by()
+        )
+        ReviewBucket.objects.bulk_create(
+            [ReviewBucket(granularity=granularity, **row) for row in counts], batch_size=1000
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0007_search_trigrams'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReviewBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('granularity', models.CharField(choices=[('h', 'Hour'), ('d', 'Day')], max_length=1)),
+                ('start', models.DateTimeField()),
+                ('reviews', models.PositiveIntegerField(default=0)),
+                ('rating_sum', models.PositiveIntegerField(default=0)),
+                ('book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='books.book')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['granularity', 'start'], name='books_revie_granula_9c8592_idx')],
+                'unique_together': {('book', 'granularity', 'start')},
+            },
+        ),
+        migrations.RunPython(backfill_review_buckets, migrations.RunPython.noop),
+    ]
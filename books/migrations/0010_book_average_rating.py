@@ -0,0 +1,37 @@
+# Generated by Django 5.2.4 on 2026-10-19 15:45
+
+from django.db import migrations, models
+from django.db.models import F, FloatField
+from django.db.models.functions import Cast, NullIf
+
+
+def backfill_average_ratings(apps, schema_editor):
+    Book = apps.get_model('books', 'Book')
+    fields = [f'rating_{star}' for star in range(1, 6)]
+    reviews = sum((F(field) for field in fields[1:]), F(fields[0]))
+    stars = sum((F(field) * star for star, field in enumerate(fields[1:], start=2)), F(fields[0]))
+    Book.objects.update(average_rating=Cast(stars, FloatField()) / NullIf(reviews, 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0009_review_import_jobs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='average_rating',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['genre', 'average_rating'], name='books_book_genre_61aaca_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['average_rating'], name='books_book_average_ee2613_idx'),
+        ),
+        migrations.RunPython(backfill_average_ratings, migrations.RunPython.noop),
+    ]
@@ -1,3 +1,5 @@
+import uuid
+
 from django.db import models
 from django.contrib.auth.models import User
 
@@ -39,14 +41,54 @@ class Book(models.Model):
     description = models.TextField()
     price = models.DecimalField(max_digits=10, decimal_places=2)
     is_available = models.BooleanField(default=True)
+    # Review count per star rating, kept in sync by books.ratings
+    rating_1 = models.PositiveIntegerField(default=0, editable=False)
+    rating_2 = models.PositiveIntegerField(default=0, editable=False)
+    rating_3 = models.PositiveIntegerField(default=0, editable=False)
+    rating_4 = models.PositiveIntegerField(default=0, editable=False)
+    rating_5 = models.PositiveIntegerField(default=0, editable=False)
+    # Mean of the histogram (None without reviews), kept with it by books.ratings
+    average_rating = models.FloatField(null=True, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    RATING_FIELDS = ['rating_1', 'rating_2', 'rating_3', 'rating_4', 'rating_5']
+    # Only ever written by books.ratings and the bulk review importer
+    DERIVED_RATING_FIELDS = [*RATING_FIELDS, 'average_rating']
+
     def __str__(self):
         return f"{self.title} by {self.author.name}"
 
+    def save(self, *args, **kwargs):
+        # The histogram counters and average are only changed with F()
+        # updates; writing back the values loaded with the instance would
+        # undo reviews made since then. Name them in update_fields to write
+        # them anyway.
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            deferred = self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.DERIVED_RATING_FIELDS
+                and field.attname not in deferred
+            ]
+        super().save(*args, **kwargs)
+
+    @property
+    def rating_histogram(self):
+        return {str(star): getattr(self, f'rating_{star}') for star in range(1, 6)}
+
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Range filters from BookFilter, alone and within a genre
+            models.Index(fields=['genre', 'price']),
+            models.Index(fields=['genre', 'publication_date']),
+            models.Index(fields=['price']),
+            models.Index(fields=['publication_date']),
+            models.Index(fields=['pages']),
+            models.Index(fields=['genre', 'average_rating']),
+            models.Index(fields=['average_rating']),
+        ]
 
 
 class Review(models.Model):
@@ -63,3 +105,184 @@ class Review(models.Model):
     class Meta:
         ordering = ['-created_at']
         unique_together = ['book', 'user']  # One review per user per book
+        indexes = [
+            # Covers per-book rating aggregates and ReviewFilter ranges
+            models.Index(fields=['book', 'rating']),
+            models.Index(fields=['rating', 'created_at']),
+            models.Index(fields=['created_at']),
+        ]
+
+
+class SlowQuery(models.Model):
+    """Aggregated log of slow SQL statements, one row per normalized query shape"""
+    fingerprint = models.CharField(max_length=32, unique=True)
+    sql = models.TextField()
+    sample_params = models.TextField(blank=True)
+    view = models.CharField(max_length=200, blank=True)
+    explain = models.TextField(blank=True)
+    calls = models.PositiveIntegerField(default=0)
+    total_ms = models.FloatField(default=0)
+    max_ms = models.FloatField(default=0)
+    first_seen = models.DateTimeField(auto_now_add=True)
+    last_seen = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.view or 'unknown'}: {self.sql[:60]}"
+
+    class Meta:
+        ordering = ['-total_ms']
+        verbose_name_plural = 'slow queries'
+
+
+class RevokedToken(models.Model):
+    """Signed access/refresh token ids revoked before they expire"""
+    jti = models.CharField(max_length=32, unique=True)
+    expires_at = models.DateTimeField(db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.jti
+
+
+class CoReview(models.Model):
+    """Number of users who reviewed both books, stored in both directions"""
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='+')
+    other = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='+')
+    count = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.book_id} & {self.other_id}: {self.count}"
+
+    class Meta:
+        unique_together = ['book', 'other']
+
+
+class SimilarBook(models.Model):
+    """Precomputed top-K "readers also liked" neighbours of a book"""
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='similar_books')
+    similar = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='similar_to')
+    score = models.FloatField()
+    rank = models.PositiveSmallIntegerField()
+
+    def __str__(self):
+        return f"{self.book_id} -> {self.similar_id} ({self.score:.3f})"
+
+    class Meta:
+        ordering = ['book', 'rank']
+        unique_together = ['book', 'rank']
+
+
+class SimilarityBuild(models.Model):
+    """Watermark of the reviews already folded into CoReview"""
+    last_review_id = models.BigIntegerField(default=0)
+    full_rebuild = models.BooleanField(default=False)
+    books_updated = models.PositiveIntegerField(default=0)
+    built_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Build up to review {self.last_review_id} at {self.built_at}"
+
+    class Meta:
+        ordering = ['-built_at']
+        get_latest_by = 'built_at'
+
+
+class AuthorTrigram(models.Model):
+    """Trigram of an author's normalized name, for typo-tolerant search"""
+    author = models.ForeignKey(Author, on_delete=models.CASCADE, related_name='+')
+    trigram = models.CharField(max_length=3)
+
+    def __str__(self):
+        return f"{self.author_id}: {self.trigram!r}"
+
+    class Meta:
+        unique_together = ['author', 'trigram']
+        indexes = [
+            models.Index(fields=['trigram', 'author']),
+        ]
+
+
+class BookTrigram(models.Model):
+    """Trigram of a book's normalized title, for typo-tolerant search"""
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='+')
+    trigram = models.CharField(max_length=3)
+
+    def __str__(self):
+        return f"{self.book_id}: {self.trigram!r}"
+
+    class Meta:
+        unique_together = ['book', 'trigram']
+        indexes = [
+            models.Index(fields=['trigram', 'book']),
+        ]
+
+
+class ReviewBucket(models.Model):
+    """Reviews a book received in one hour or one day, for trending rankings"""
+    HOUR = 'h'
+    DAY = 'd'
+    GRANULARITY_CHOICES = [
+        (HOUR, 'Hour'),
+        (DAY, 'Day'),
+    ]
+
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='+')
+    granularity = models.CharField(max_length=1, choices=GRANULARITY_CHOICES)
+    start = models.DateTimeField()
+    reviews = models.PositiveIntegerField(default=0)
+    rating_sum = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.book_id} {self.granularity} {self.start:%Y-%m-%d %H:00}: {self.reviews}"
+
+    class Meta:
+        unique_together = ['book', 'granularity', 'start']
+        indexes = [
+            models.Index(fields=['granularity', 'start']),
+        ]
+
+
+class ReviewImportJob(models.Model):
+    """A bulk review batch submitted to /api/reviews/import/ and its progress"""
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+    UPDATE = 'update'
+    SKIP = 'skip'
+    CONFLICT_CHOICES = [
+        (UPDATE, 'Update the existing review'),
+        (SKIP, 'Keep the existing review'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    submitted_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='+')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    on_conflict = models.CharField(max_length=10, choices=CONFLICT_CHOICES, default=UPDATE)
+    rows = models.JSONField(default=list)
+    total = models.PositiveIntegerField(default=0)
+    processed = models.PositiveIntegerField(default=0)
+    created = models.PositiveIntegerField(default=0)
+    updated = models.PositiveIntegerField(default=0)
+    skipped = models.PositiveIntegerField(default=0)
+    failed = models.PositiveIntegerField(default=0)
+    errors = models.JSONField(default=list)
+    error = models.TextField(blank=True)
+    submitted_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.id} ({self.status}, {self.processed}/{self.total})"
+
+    class Meta:
+        ordering = ['-submitted_at']
+        indexes = [
+            models.Index(fields=['status', 'submitted_at']),
+        ]
@@ -0,0 +1,220 @@
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet
+from django.core.paginator import EmptyPage, Page, PageNotAnInteger, Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+
+from .metrics import record_cache_lookup
+
+COUNT_VERSION_KEY = 'books:count_version'
+
+
+def estimate_row_count(model, using='default'):
+    """
+    Return a cheap estimate of the number of rows in a model's table.
+
+    Uses planner statistics on PostgreSQL/MySQL and MAX(rowid) on SQLite.
+    Returns None when no estimate is available.
+    """
+    connection = connections[using]
+    table = connection.ops.quote_name(model._meta.db_table)
+    vendor = connection.vendor
+
+    with connection.cursor() as cursor:
+        if vendor == 'postgresql':
+            cursor.execute(
+                "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+                [model._meta.db_table]
+            )
+        elif vendor == 'mysql':
+            cursor.execute(
+                "SELECT table_rows FROM information_schema.tables "
+                "WHERE table_schema = DATABASE() AND table_name = %s",
+                [model._meta.db_table]
+            )
+        elif vendor == 'sqlite':
+            cursor.execute(f"SELECT MAX(rowid) FROM {table}")
+        else:
+            return None
+        row = cursor.fetchone()
+
+    if not row or row[0] is None or row[0] < 0:
+        return None
+    return int(row[0])
+
+
+def estimate_query_count(queryset):
+    """
+    Return the planner's row estimate for a filtered queryset.
+
+    Only PostgreSQL exposes a usable estimate; other backends return None.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+
+    sql, params = queryset.order_by().query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+def invalidate_cached_counts():
+    """Drop every cached paginator count (called on catalog writes)"""
+    try:
+        cache.incr(COUNT_VERSION_KEY)
+    except ValueError:
+        cache.set(COUNT_VERSION_KEY, 1, None)
+
+
+def count_threshold():
+    return getattr(settings, 'BOOKS_COUNT_ESTIMATE_THRESHOLD', 10000)
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator for admin changelists on large tables.
+
+    Unfiltered querysets above the threshold report the estimated
+    table size instead of running COUNT(*).
+    """
+
+    @cached_property
+    def count(self):
+        query = getattr(self.object_list, 'query', None)
+        if query is not None and not query.where:
+            estimate = estimate_row_count(self.object_list.model, self.object_list.db)
+            if estimate is not None and estimate > count_threshold():
+                return estimate
+        return super().count
+
+
+class EstimatedPage(Page):
+    """A page whose next page is known from fetching one row past it, not from the count"""
+
+    def __init__(self, object_list, number, paginator, has_next):
+        super().__init__(object_list, number, paginator)
+        self._has_next = has_next
+
+    def has_next(self):
+        return self._has_next
+
+
+class CachedCountPaginator(Paginator):
+    """
+    Paginator that only runs an exact COUNT(*) for small result sets.
+
+    Counts are exact up to the threshold (checked with a bounded count).
+    Above it the count comes from the cache, keyed by the SQL of the
+    filtered queryset, or from table/planner statistics. ``count_is_estimated``
+    records which path was taken; a cached count keeps the flag it was
+    stored with.
+
+    An estimate can be off either way, so with an estimated count pages are
+    not checked against it: each page fetches one extra row to tell whether
+    a next page exists, and only a page past the last row is a 404.
+    """
+    count_is_estimated = False
+
+    def _cache_key(self):
+        """Cache key of the count, or None when the queryset can match no rows"""
+        try:
+            sql, params = self.object_list.order_by().query.sql_with_params()
+        except EmptyResultSet:
+            return None
+        signature = hashlib.md5(repr((sql, params)).encode()).hexdigest()
+        version = cache.get(COUNT_VERSION_KEY, 0)
+        return f'books:paginator_count:{version}:{signature}'
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not hasattr(queryset, 'query'):
+            return super().count
+
+        threshold = count_threshold()
+        key = self._cache_key()
+        if key is None:
+            return 0
+        cached = cache.get(key)
+        record_cache_lookup('paginator_count', cached is not None)
+        if cached is not None:
+            count, self.count_is_estimated = cached
+            return count
+
+        if not queryset.query.where:
+            estimate = estimate_row_count(queryset.model, queryset.db)
+            if estimate is not None and estimate > threshold:
+                self.count_is_estimated = True
+                return estimate
+
+        bounded = queryset.order_by()[:threshold + 1].count()
+        if bounded <= threshold:
+            return bounded
+
+        count = estimate_query_count(queryset)
+        self.count_is_estimated = count is not None
+        if count is None:
+            count = queryset.count()
+        cache.set(key, (count, self.count_is_estimated), getattr(settings, 'BOOKS_COUNT_CACHE_TIMEOUT', 300))
+        return count
+
+    def validate_number(self, number):
+        self.count  # sets count_is_estimated
+        if not self.count_is_estimated:
+            return super().validate_number(number)
+        try:
+            if isinstance(number, float) and not number.is_integer():
+                raise ValueError
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger(self.error_messages['invalid_page'])
+        if number < 1:
+            raise EmptyPage(self.error_messages['min_page'])
+        return number
+
+    def page(self, number):
+        number = self.validate_number(number)
+        if not self.count_is_estimated:
+            return super().page(number)
+        bottom = (number - 1) * self.per_page
+        rows = list(self.object_list[bottom:bottom + self.per_page + 1])
+        if not rows and number > 1:
+            raise EmptyPage(self.error_messages['no_results'])
+        return EstimatedPage(rows[:self.per_page], number, self, has_next=len(rows) > self.per_page)
+
+
+class EstimatedCountPagination(PageNumberPagination):
+    """
+    Page number pagination that avoids COUNT(*) over large filtered lists.
+
+    Adds ``count_is_estimated`` to the response so clients know whether
+    ``count`` is exact.
+    """
+    django_paginator_class = CachedCountPaginator
+
+    def get_paginated_response(self, data):
+        return Response({
+            'count': self.page.paginator.count,
+            'count_is_estimated': self.page.paginator.count_is_estimated,
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        response_schema = super().get_paginated_response_schema(schema)
+        response_schema['properties']['count_is_estimated'] = {
+            'type': 'boolean',
+            'example': False,
+        }
+        return response_schema
@@ -0,0 +1,177 @@
+import contextlib
+import io
+import json
+import os
+import random
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.db import connections
+from django.http import JsonResponse
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.exceptions import AuthenticationFailed
+from .authentication import SignedTokenAuthentication
+
+
+class SQLTimeline:
+    """Database execute wrapper that records every query with its timing"""
+
+    def __init__(self, started):
+        self.started = started
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            end = time.perf_counter()
+            self.queries.append({
+                'alias': context['connection'].alias,
+                'start_ms': round((start - self.started) * 1000, 3),
+                'duration_ms': round((end - start) * 1000, 3),
+                'sql': sql,
+                'many': many,
+            })
+
+
+class ProfilingMiddleware:
+    """
+    Run individual requests under cProfile and record their SQL timeline.
+
+    Staff users trigger profiling with the ``X-Profile`` header or the
+    ``?profile=`` query parameter. ``summary`` (or ``1``) replaces the
+    response with a JSON summary; ``dump`` writes the profile to
+    BOOKS_PROFILE_DIR; anything else is a 400. With
+    BOOKS_PROFILE_SAMPLE_RATE above zero a random fraction of all requests
+    is profiled and dumped as well.
+
+    Only one request per process is profiled at a time: since Python 3.12
+    a second cProfile cannot be enabled while another one runs. A request
+    asking for a profile meanwhile gets a 409; a sampled one is served
+    without profiling.
+
+    Requests that are not profiled only pay for a header and query
+    string lookup.
+    """
+    header = 'HTTP_X_PROFILE'
+    param = 'profile'
+    modes = {'summary': 'summary', '1': 'summary', 'dump': 'dump'}
+    _active = threading.Lock()
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.profile_dir = getattr(settings, 'BOOKS_PROFILE_DIR', None)
+        self.sample_rate = getattr(settings, 'BOOKS_PROFILE_SAMPLE_RATE', 0.0)
+        self.top_functions = getattr(settings, 'BOOKS_PROFILE_TOP_FUNCTIONS', 30)
+
+    def __call__(self, request):
+        mode = request.META.get(self.header) or request.GET.get(self.param)
+        if mode:
+            if not self._is_authorized(request):
+                return self.get_response(request)
+            if mode.lower() not in self.modes:
+                return JsonResponse(
+                    {'error': f"Unknown profile mode {mode!r}. Use summary or dump."},
+                    status=400,
+                )
+            response = self._profile(request, self.modes[mode.lower()])
+            if response is None:
+                return JsonResponse(
+                    {'error': 'Another request is being profiled. Try again shortly.'},
+                    status=409,
+                )
+            return response
+        if self.sample_rate and self.profile_dir and random.random() < self.sample_rate:
+            response = self._profile(request, 'dump')
+            if response is not None:
+                return response
+        return self.get_response(request)
+
+    def _is_authorized(self, request):
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated:
+            return user.is_staff
+        for authentication in (SignedTokenAuthentication, TokenAuthentication):
+            try:
+                result = authentication().authenticate(request)
+            except AuthenticationFailed:
+                return False
+            if result is not None:
+                return result[0].is_staff
+        return False
+
+    def _profile(self, request, mode):
+        """Serve the request under the profiler; None if another profile is running"""
+        # Imported here so unprofiled workers never load the profiler modules
+        import cProfile
+        import pstats
+
+        if not self._active.acquire(blocking=False):
+            return None
+        try:
+            started = time.perf_counter()
+            timeline = SQLTimeline(started)
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError:
+                # Another profiling tool (a debugger, coverage) is active
+                return None
+
+            with contextlib.ExitStack() as stack:
+                for alias in connections:
+                    stack.enter_context(connections[alias].execute_wrapper(timeline))
+                try:
+                    response = self.get_response(request)
+                finally:
+                    profiler.disable()
+        finally:
+            self._active.release()
+
+        if hasattr(response, 'render') and not response.is_rendered:
+            response.render()
+        total_ms = round((time.perf_counter() - started) * 1000, 3)
+        profile_id = uuid.uuid4().hex
+        sql_ms = round(sum(q['duration_ms'] for q in timeline.queries), 3)
+
+        if self.profile_dir and mode != 'summary':
+            self._dump(profile_id, request, profiler, timeline, total_ms)
+
+        response['X-Profile-Id'] = profile_id
+        response['X-Profile-Total-Ms'] = str(total_ms)
+        response['X-Profile-Queries'] = str(len(timeline.queries))
+        response['X-Profile-SQL-Ms'] = str(sql_ms)
+
+        if mode == 'dump':
+            return response
+
+        stream = io.StringIO()
+        stats = pstats.Stats(profiler, stream=stream)
+        stats.sort_stats('cumulative').print_stats(self.top_functions)
+        summary = JsonResponse({
+            'profile_id': profile_id,
+            'path': request.get_full_path(),
+            'status_code': response.status_code,
+            'total_ms': total_ms,
+            'sql_ms': sql_ms,
+            'query_count': len(timeline.queries),
+            'queries': timeline.queries,
+            'profile': stream.getvalue(),
+        })
+        summary['X-Profile-Id'] = profile_id
+        return summary
+
+    def _dump(self, profile_id, request, profiler, timeline, total_ms):
+        os.makedirs(self.profile_dir, exist_ok=True)
+        base = os.path.join(self.profile_dir, f'{int(time.time())}-{profile_id}')
+        profiler.dump_stats(f'{base}.prof')
+        with open(f'{base}.sql.json', 'w') as fh:
+            json.dump({
+                'path': request.get_full_path(),
+                'method': request.method,
+                'total_ms': total_ms,
+                'queries': timeline.queries,
+            }, fh, indent=2)
@@ -0,0 +1,162 @@
+"""
+Per-request database time budgets.
+
+While a view runs, every SQL statement is charged against the request's
+budget. A statement that would overrun the remaining budget is cancelled
+by the database:
+
+* SQLite: a connection progress handler interrupts the running statement
+  once the remaining budget has elapsed;
+* PostgreSQL: ``statement_timeout`` is set to the remaining budget;
+* MySQL/MariaDB: ``max_execution_time`` (SELECT statements only).
+
+The cancellation surfaces as QueryBudgetExceeded, a 503 API error, and no
+further statements run once the budget is spent.
+
+QueryBudgetMixin only budgets reads (GET, HEAD, OPTIONS): a write cut off
+halfway could already have committed some of its statements, and a 503
+would then misreport it as failed.
+"""
+import time
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import DatabaseError, OperationalError, connections
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.permissions import SAFE_METHODS
+
+# SQLite VM instructions between progress handler calls
+PROGRESS_STEPS = 1000
+
+
+class QueryBudgetExceeded(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'The request exceeded its database time budget. Try a narrower query.'
+    default_code = 'query_budget_exceeded'
+
+
+def _is_cancellation(exc):
+    cause = exc.__cause__
+    code = getattr(cause, 'pgcode', None) or (cause.args[0] if getattr(cause, 'args', None) else None)
+    # SQLite "interrupted", PostgreSQL query_canceled, MySQL max_execution_time exceeded
+    return 'interrupted' in str(exc) or code in ('57014', 3024)
+
+
+class BudgetGuard:
+    """Execute wrapper charging statement time against a shared budget"""
+
+    def __init__(self, connection, budget):
+        self.connection = connection
+        self.budget = budget
+        self.spent = 0.0
+        self._deadline = None
+        self._handler_installed = False
+        self._timeout_ms = None
+
+    def remaining(self):
+        return self.budget - self.spent
+
+    def _progress(self):
+        # Non-zero return value makes SQLite abort the statement
+        return int(time.monotonic() > self._deadline)
+
+    def _set_timeout(self, value):
+        statement = {
+            'postgresql': 'SET statement_timeout = %s',
+            'mysql': 'SET SESSION max_execution_time = %s',
+        }[self.connection.vendor]
+        # The raw cursor bypasses execute wrappers, including this one
+        with self.connection.cursor() as cursor:
+            cursor.cursor.execute(statement % value)
+
+    def _arm(self, remaining):
+        vendor = self.connection.vendor
+        if vendor == 'sqlite':
+            if not self._handler_installed:
+                self.connection.connection.set_progress_handler(self._progress, PROGRESS_STEPS)
+                self._handler_installed = True
+            self._deadline = time.monotonic() + remaining
+        elif vendor in ('postgresql', 'mysql'):
+            # Tighten the server-side timeout only when it is well above the
+            # remaining budget, so most statements need no extra round trip
+            remaining_ms = max(int(remaining * 1000), 1)
+            if self._timeout_ms is None or remaining_ms < self._timeout_ms // 2:
+                self._set_timeout(remaining_ms)
+                self._timeout_ms = remaining_ms
+
+    def _disarm(self):
+        if self.connection.connection is None:
+            return
+        if self._handler_installed:
+            self.connection.connection.set_progress_handler(None, 0)
+        elif self._timeout_ms is not None:
+            try:
+                self._set_timeout('DEFAULT')
+            except DatabaseError:
+                # e.g. the cancelled statement aborted the transaction; the
+                # setting is then reset when the connection is reused or closed
+                pass
+
+    def __call__(self, execute, sql, params, many, context):
+        remaining = self.remaining()
+        if remaining <= 0:
+            raise QueryBudgetExceeded()
+        self._arm(remaining)
+        start = time.monotonic()
+        try:
+            return execute(sql, params, many, context)
+        except OperationalError as exc:
+            if _is_cancellation(exc):
+                raise QueryBudgetExceeded() from exc
+            raise
+        finally:
+            self.spent += time.monotonic() - start
+
+    @contextmanager
+    def installed(self):
+        try:
+            with self.connection.execute_wrapper(self):
+                yield self
+        finally:
+            self._disarm()
+
+
+@contextmanager
+def query_budget(seconds):
+    """Limit the SQL time of the enclosed block to ``seconds`` on every connection"""
+    if not seconds:
+        yield
+        return
+    with ExitStack() as stack:
+        for alias in connections:
+            stack.enter_context(BudgetGuard(connections[alias], seconds).installed())
+        yield
+
+
+class QueryBudgetMixin:
+    """
+    ViewSet mixin running each request under a database time budget.
+
+    ``query_budget`` is the default for the viewset (falling back to
+    BOOKS_QUERY_BUDGET) and ``action_query_budgets`` overrides it per
+    action, e.g. ``{'list': 2.0, 'popular': 5.0}``; an action budget of
+    ``None`` disables the limit for that action. Unsafe methods (POST,
+    PUT, PATCH, DELETE) are never limited.
+    """
+    query_budget = None
+    action_query_budgets = {}
+
+    def get_query_budget(self, action):
+        if action in self.action_query_budgets:
+            return self.action_query_budgets[action]
+        if self.query_budget is not None:
+            return self.query_budget
+        return getattr(settings, 'BOOKS_QUERY_BUDGET', None)
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method not in SAFE_METHODS:
+            return super().dispatch(request, *args, **kwargs)
+        action = self.action_map.get(request.method.lower())
+        with query_budget(self.get_query_budget(action)):
+            return super().dispatch(request, *args, **kwargs)
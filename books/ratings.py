@@ -0,0 +1,59 @@
+from django.db.models import Count, F, FloatField
+from django.db.models.functions import Cast, NullIf
+from .models import Book, Review
+
+
+def average_rating_expression():
+    """The mean star rating of a book's histogram columns, NULL when it is empty"""
+    fields = Book.RATING_FIELDS
+    reviews = sum((F(field) for field in fields[1:]), F(fields[0]))
+    stars = sum((F(field) * star for star, field in enumerate(fields[1:], start=2)), F(fields[0]))
+    return Cast(stars, FloatField()) / NullIf(reviews, 0)
+
+
+def refresh_average_ratings(books):
+    """Recompute the stored average of ``books`` from their histograms in one UPDATE"""
+    # A separate statement: MySQL would see some of the new counters in the
+    # UPDATE that changes them, other backends only the old ones
+    return books.update(average_rating=average_rating_expression())
+
+
+def adjust_rating_count(book_id, rating, delta):
+    """Atomically add ``delta`` to one star bucket of a book's histogram"""
+    field = f'rating_{rating}'
+    books = Book.objects.filter(pk=book_id)
+    if delta < 0:
+        books = books.filter(**{f'{field}__gte': -delta})
+    if books.update(**{field: F(field) + delta}):
+        refresh_average_ratings(Book.objects.filter(pk=book_id))
+
+
+def rebuild_rating_histograms(batch_size=1000):
+    """
+    Recompute every book's histogram from the Review table with one
+    grouped query, then every stored average. Returns the number of
+    histograms written.
+    """
+    counts = {}
+    for book_id, rating, n in Review.objects.values('book_id', 'rating').annotate(
+            n=Count('id')).values_list('book_id', 'rating', 'n').order_by():
+        counts.setdefault(book_id, [0] * 5)[rating - 1] = n
+
+    updated = 0
+    books = Book.objects.only('pk', *Book.RATING_FIELDS).order_by('pk')
+    batch = []
+    for book in books.iterator(chunk_size=batch_size):
+        histogram = counts.get(book.pk, [0] * 5)
+        if [getattr(book, f) for f in Book.RATING_FIELDS] != histogram:
+            for field, value in zip(Book.RATING_FIELDS, histogram):
+                setattr(book, field, value)
+            batch.append(book)
+        if len(batch) >= batch_size:
+            Book.objects.bulk_update(batch, Book.RATING_FIELDS)
+            updated += len(batch)
+            batch = []
+    if batch:
+        Book.objects.bulk_update(batch, Book.RATING_FIELDS)
+        updated += len(batch)
+    refresh_average_ratings(Book.objects.all())
+    return updated
@@ -0,0 +1,62 @@
+"""
+Columnar JSON for bulk consumers of list endpoints.
+
+Selected with ``Accept: application/vnd.books.columnar+json`` or
+``?format=columnar``. A list of objects (or the ``results`` of a paginated
+page) is sent as one array per column instead of one object per row, and
+low-cardinality string columns are dictionary-encoded: the column holds
+integer codes into a list of distinct values::
+
+    {"count": 2, "next": null, "previous": null, "results": {
+        "length": 2,
+        "columns": {"id": [7, 9], "genre": [0, 0], "title": ["A", "B"]},
+        "dictionaries": {"genre": ["fiction"]}
+    }}
+
+Anything else (single objects, errors) is rendered as plain JSON.
+decode_columnar() is the reference decoder back to a list of objects.
+"""
+from rest_framework.renderers import JSONRenderer
+
+COLUMNAR_MEDIA_TYPE = 'application/vnd.books.columnar+json'
+
+
+def encode_columnar(rows, dictionary_columns=()):
+    """Turn a list of uniform dicts into the columnar ``results`` structure"""
+    names = list(rows[0]) if rows else []
+    columns, dictionaries = {}, {}
+    for name in names:
+        values = [row.get(name) for row in rows]
+        if name in dictionary_columns:
+            codes = {}
+            values = [codes.setdefault(value, len(codes)) for value in values]
+            dictionaries[name] = list(codes)
+        columns[name] = values
+    return {'length': len(rows), 'columns': columns, 'dictionaries': dictionaries}
+
+
+def decode_columnar(table):
+    """Reference decoder: the columnar ``results`` structure back to a list of dicts"""
+    columns = {}
+    for name, values in table['columns'].items():
+        dictionary = table['dictionaries'].get(name)
+        columns[name] = [dictionary[code] for code in values] if dictionary is not None else values
+    names = list(columns)
+    return [dict(zip(names, row)) for row in zip(*columns.values())] if names else [{} for _ in range(table['length'])]
+
+
+class ColumnarJSONRenderer(JSONRenderer):
+    media_type = COLUMNAR_MEDIA_TYPE
+    format = 'columnar'
+    # Columns sent as dictionary codes when present
+    dictionary_columns = frozenset({'genre', 'author_name', 'book_title', 'user_username'})
+
+    def _is_rows(self, data):
+        return isinstance(data, list) and all(isinstance(row, dict) for row in data)
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, dict) and self._is_rows(data.get('results')):
+            data = {**data, 'results': encode_columnar(data['results'], self.dictionary_columns)}
+        elif self._is_rows(data):
+            data = encode_columnar(data, self.dictionary_columns)
+        return super().render(data, accepted_media_type, renderer_context)
@@ -0,0 +1,301 @@
+"""
+Asynchronous bulk review ingestion (``POST /api/reviews/import/``).
+
+A submitted batch is stored as a ReviewImportJob and processed by a small
+thread pool in the web process (BOOKS_INGEST_WORKERS threads). The worker:
+
+1. resolves every book (``book`` id or ``isbn``) and user (``user`` id or
+   ``username``) with a few bulk queries and validates each row;
+2. writes the valid rows, sorted by book, in batches of
+   BOOKS_INGEST_BATCH_SIZE. Each batch is one transaction with a single
+   multi-row INSERT ... ON CONFLICT (book, user): it either updates the
+   existing review or leaves it alone, depending on the job's
+   ``on_conflict``. The batch's books are locked first, so concurrent
+   writers of the same reviews take turns;
+3. updates the rating histogram and trending buckets of each affected
+   book once per batch from the batch's net changes, instead of once per
+   review through the model signals, which bulk inserts do not send.
+
+write_reviews() is also the upsert behind ``PUT /api/books/{id}/my-review/``.
+
+Progress and per-row errors are saved on the job after every batch.
+Re-running an interrupted job is safe because rows that were already
+written no longer change anything. ``manage.py process_review_imports``
+runs jobs left behind by a stopped worker.
+"""
+import logging
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connection, connections, transaction
+from django.db.models import F
+from django.utils import timezone
+from . import author_stats, snapshots, trending
+from .autocomplete import index as autocomplete_index
+from .models import Book, Review, ReviewImportJob
+from .pagination import invalidate_cached_counts
+from .ratings import refresh_average_ratings
+
+logger = logging.getLogger('books.review_import')
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def submit(job_id):
+    """Queue a saved job on the worker pool once the current transaction commits"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'BOOKS_INGEST_WORKERS', 2),
+                thread_name_prefix='review-import',
+            )
+    transaction.on_commit(lambda: _executor.submit(_run_in_background, job_id))
+
+
+def _run_in_background(job_id):
+    try:
+        run(job_id)
+    finally:
+        # Pool threads keep their own connections; do not leave them open
+        connections.close_all()
+
+
+def run(job_id):
+    """Process a pending job; returns False if another worker already claimed it"""
+    claimed = ReviewImportJob.objects.filter(pk=job_id, status=ReviewImportJob.PENDING).update(
+        status=ReviewImportJob.RUNNING, started_at=timezone.now(),
+    )
+    if not claimed:
+        return False
+    job = ReviewImportJob.objects.get(pk=job_id)
+    try:
+        _process(job)
+    except Exception as exc:
+        logger.exception('Review import %s failed', job_id)
+        job.status = ReviewImportJob.FAILED
+        job.error = str(exc)
+    else:
+        job.status = ReviewImportJob.DONE
+        # The payload is no longer needed once every row is accounted for
+        job.rows = []
+    job.finished_at = timezone.now()
+    job.save()
+    return True
+
+
+def _positive_int(value):
+    # int() would truncate 3.7 to 3; only whole numbers are ids or ratings
+    if isinstance(value, bool) or (isinstance(value, float) and not value.is_integer()):
+        return None
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        return None
+    return value if value > 0 else None
+
+
+def _lookup(queryset, field, values, chunk_size=900):
+    """Map ``field`` values to primary keys, querying in chunks that fit any backend's IN limit"""
+    values = list(values)
+    found = {}
+    for start in range(0, len(values), chunk_size):
+        found.update(queryset.filter(**{f'{field}__in': values[start:start + chunk_size]}).values_list(field, 'pk'))
+    return found
+
+
+def _resolve(rows):
+    """Bulk-load the books and users the rows refer to"""
+    book_ids, isbns, user_ids, usernames = set(), set(), set(), set()
+    for row in rows:
+        if not isinstance(row, dict):
+            continue
+        if row.get('book') is not None:
+            book_ids.add(_positive_int(row['book']))
+        elif row.get('isbn'):
+            isbns.add(str(row['isbn']))
+        if row.get('user') is not None:
+            user_ids.add(_positive_int(row['user']))
+        elif row.get('username'):
+            usernames.add(str(row['username']))
+    book_ids.discard(None)
+    user_ids.discard(None)
+
+    books = {
+        'book': _lookup(Book.objects.all(), 'pk', book_ids),
+        'isbn': _lookup(Book.objects.all(), 'isbn', isbns),
+    }
+    users = {
+        'user': _lookup(User.objects.all(), 'pk', user_ids),
+        'username': _lookup(User.objects.all(), 'username', usernames),
+    }
+    return books, users
+
+
+def _validate(index, row, books, users, seen):
+    """Return ((book_id, user_id), rating, comment), or a dict of field errors"""
+    errors = {}
+    if row.get('book') is not None:
+        book_id = books['book'].get(_positive_int(row['book']))
+    elif row.get('isbn'):
+        book_id = books['isbn'].get(str(row['isbn']))
+    else:
+        book_id = None
+        errors['book'] = 'Provide "book" (id) or "isbn".'
+    if book_id is None and 'book' not in errors:
+        errors['book'] = 'Book not found.'
+
+    if row.get('user') is not None:
+        user_id = users['user'].get(_positive_int(row['user']))
+    elif row.get('username'):
+        user_id = users['username'].get(str(row['username']))
+    else:
+        user_id = None
+        errors['user'] = 'Provide "user" (id) or "username".'
+    if user_id is None and 'user' not in errors:
+        errors['user'] = 'User not found.'
+
+    rating = _positive_int(row.get('rating'))
+    if rating is None or rating > 5:
+        errors['rating'] = 'Rating must be an integer from 1 to 5.'
+    comment = row.get('comment')
+    if not isinstance(comment, str) or not comment.strip():
+        errors['comment'] = 'This field may not be blank.'
+
+    if errors:
+        return errors
+    key = (book_id, user_id)
+    if key in seen:
+        return {'non_field_errors': f'Duplicate of row {seen[key]} (same book and user).'}
+    seen[key] = index
+    return key, rating, comment
+
+
+def _process(job):
+    batch_size = getattr(settings, 'BOOKS_INGEST_BATCH_SIZE', 500)
+    max_errors = getattr(settings, 'BOOKS_INGEST_MAX_ERRORS', 1000)
+
+    books, users = _resolve(job.rows)
+    valid, seen = [], {}
+    job.failed, job.errors = 0, []
+    for index, row in enumerate(job.rows):
+        result = _validate(index, row, books, users, seen) if isinstance(row, dict) else {
+            'non_field_errors': 'Each row must be an object.'}
+        if isinstance(result, dict):
+            job.failed += 1
+            if len(job.errors) < max_errors:
+                job.errors.append({'row': index, 'errors': result})
+        else:
+            valid.append(result)
+    job.total = len(job.rows)
+    job.processed = job.failed
+    job.created = job.updated = job.skipped = 0
+    job.save(update_fields=['total', 'processed', 'created', 'updated', 'skipped', 'failed', 'errors'])
+
+    # Sorted by book, most books fall in a single batch
+    valid.sort(key=lambda item: item[0])
+    for start in range(0, len(valid), batch_size):
+        batch = valid[start:start + batch_size]
+        created, updated, skipped = write_reviews(batch, job.on_conflict)
+        job.created += created
+        job.updated += updated
+        job.skipped += skipped
+        job.processed += len(batch)
+        job.save(update_fields=['processed', 'created', 'updated', 'skipped'])
+
+
+def _lock_books(book_ids):
+    """
+    Serialize review writes to these books until the transaction ends, so
+    the existing reviews read before an upsert are still the ones it meets
+    and concurrent writers cannot both count the same review as new.
+    """
+    book_ids = sorted(book_ids)
+    if connection.features.has_select_for_update:
+        # Row locks taken in pk order, so overlapping batches cannot deadlock
+        list(Book.objects.select_for_update().filter(pk__in=book_ids).order_by('pk').values_list('pk', flat=True))
+    else:
+        # SQLite locks the whole database: writing first takes the write lock
+        # up front, where a read would fail to upgrade to it under contention
+        Book.objects.filter(pk__in=book_ids).update(rating_1=F('rating_1'))
+
+
+def write_reviews(batch, on_conflict=ReviewImportJob.UPDATE):
+    """
+    Upsert ``[((book_id, user_id), rating, comment), ...]`` with one INSERT ...
+    ON CONFLICT statement and apply the net rating changes that the Review
+    signals would have made. Returns (created, updated, skipped).
+    """
+    keys = {key for key, _rating, _comment in batch}
+    with transaction.atomic():
+        _lock_books({book_id for book_id, _ in keys})
+        existing = {
+            (book_id, user_id): (rating, created_at)
+            for book_id, user_id, rating, created_at in Review.objects.filter(
+                book_id__in={book_id for book_id, _ in keys},
+                user_id__in={user_id for _, user_id in keys},
+            ).values_list('book_id', 'user_id', 'rating', 'created_at')
+            if (book_id, user_id) in keys
+        }
+        update = on_conflict == ReviewImportJob.UPDATE
+        rows = [row for row in batch if update or row[0] not in existing]
+        reviews = [
+            Review(book_id=book_id, user_id=user_id, rating=rating, comment=comment)
+            for (book_id, user_id), rating, comment in rows
+        ]
+        if update:
+            Review.objects.bulk_create(
+                reviews,
+                update_conflicts=True,
+                unique_fields=['book', 'user'],
+                update_fields=['rating', 'comment', 'updated_at'],
+            )
+        else:
+            Review.objects.bulk_create(reviews, ignore_conflicts=True)
+
+        now = timezone.now()
+        histograms = defaultdict(lambda: [0] * 5)
+        new_reviews = defaultdict(lambda: [0, 0])       # book -> [reviews, rating sum]
+        rating_changes = defaultdict(int)               # (book, created_at hour) -> rating sum delta
+        for (book_id, user_id), rating, _comment in rows:
+            old = existing.get((book_id, user_id))
+            if old is None:
+                histograms[book_id][rating - 1] += 1
+                new_reviews[book_id][0] += 1
+                new_reviews[book_id][1] += rating
+            elif old[0] != rating:
+                histograms[book_id][old[0] - 1] -= 1
+                histograms[book_id][rating - 1] += 1
+                rating_changes[book_id, trending.bucket_start(old[1], trending.HOUR)] += rating - old[0]
+
+        changed = []
+        for book_id, deltas in histograms.items():
+            changes = {field: F(field) + delta for field, delta in zip(Book.RATING_FIELDS, deltas) if delta}
+            if changes:
+                Book.objects.filter(pk=book_id).update(**changes)
+                changed.append(book_id)
+        if changed:
+            refresh_average_ratings(Book.objects.filter(pk__in=changed))
+        for book_id, (count, rating_sum) in new_reviews.items():
+            trending.adjust(book_id, now, count, rating_sum)
+        for (book_id, hour), delta in rating_changes.items():
+            if delta:
+                trending.adjust(book_id, hour, 0, delta)
+
+    for book_id, (count, _rating_sum) in new_reviews.items():
+        autocomplete_index.add_popularity(book_id, count)
+    if new_reviews:
+        autocomplete_index.mark_changed(new_reviews)
+    invalidate_cached_counts()
+    snapshots.ratings_changed()
+    author_ids = Book.objects.filter(pk__in={book_id for book_id, _ in keys}).values_list('author_id', flat=True)
+    author_stats.invalidate(*set(author_ids))
+
+    created = sum(1 for key, _rating, _comment in rows if key not in existing)
+    if update:
+        return created, len(existing), 0
+    return created, 0, len(existing)
@@ -1,6 +1,41 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
-from .models import Author, Book, Review
+from django.db import IntegrityError, transaction
+from django.db.models.manager import BaseManager
+from . import entity_cache
+from .models import Author, Book, Review, ReviewImportJob
+
+
+class CachedRelationsListSerializer(serializers.ListSerializer):
+    """
+    Resolve the related rows named in the child's ``cached_relations``
+    for a whole page at once through books.entity_cache, instead of
+    joining them in SQL.
+    """
+
+    def to_representation(self, data):
+        items = list(data.all() if isinstance(data, BaseManager) else data)
+        self.child.cached_rows = {
+            attname: cache.get_many({getattr(item, attname) for item in items})
+            for cache, attname in self.child.cached_relations
+        }
+        return super().to_representation(items)
+
+
+class CachedRelationsMixin:
+    """Read related rows from books.entity_cache (``cached_relations``: (cache, attname) pairs)"""
+    cached_relations = []
+
+    def cached_related(self, obj, field):
+        if type(obj)._meta.get_field(field).is_cached(obj):
+            return getattr(obj, field)
+        attname = f'{field}_id'
+        pk = getattr(obj, attname)
+        rows = getattr(self, 'cached_rows', {}).get(attname)
+        if rows is not None and pk in rows:
+            return rows[pk]
+        cache = next(cache for cache, name in self.cached_relations if name == attname)
+        return cache.get(pk)
 
 
 class AuthorSerializer(serializers.ModelSerializer):
@@ -15,20 +50,27 @@ class AuthorSerializer(serializers.ModelSerializer):
         return obj.books.count()
 
 
-class BookSerializer(serializers.ModelSerializer):
-    author_name = serializers.CharField(source='author.name', read_only=True)
+class BookSerializer(CachedRelationsMixin, serializers.ModelSerializer):
+    author_name = serializers.SerializerMethodField()
     average_rating = serializers.SerializerMethodField()
     reviews_count = serializers.SerializerMethodField()
+    rating_histogram = serializers.DictField(child=serializers.IntegerField(), read_only=True)
+    cached_relations = [(entity_cache.authors, 'author_id')]
     
     class Meta:
         model = Book
+        list_serializer_class = CachedRelationsListSerializer
         fields = [
             'id', 'title', 'author', 'author_name', 'isbn', 'publication_date', 
             'pages', 'genre', 'description', 'price', 'is_available',
-            'average_rating', 'reviews_count', 'created_at', 'updated_at'
+            'average_rating', 'reviews_count', 'rating_histogram', 'created_at', 'updated_at'
         ]
         read_only_fields = ['id', 'created_at', 'updated_at']
     
+    def get_author_name(self, obj):
+        author = self.cached_related(obj, 'author')
+        return author.name if author else None
+    
     def get_average_rating(self, obj):
         reviews = obj.reviews.all()
         if reviews:
@@ -39,40 +81,72 @@ class BookSerializer(serializers.ModelSerializer):
         return obj.reviews.count()
 
 
-class BookListSerializer(serializers.ModelSerializer):
+class BookListSerializer(CachedRelationsMixin, serializers.ModelSerializer):
     """Simplified serializer for book lists"""
-    author_name = serializers.CharField(source='author.name', read_only=True)
+    author_name = serializers.SerializerMethodField()
     average_rating = serializers.SerializerMethodField()
+    cached_relations = [(entity_cache.authors, 'author_id')]
     
     class Meta:
         model = Book
+        list_serializer_class = CachedRelationsListSerializer
         fields = [
             'id', 'title', 'author_name', 'genre', 'price', 
             'is_available', 'average_rating', 'publication_date'
         ]
     
+    def get_author_name(self, obj):
+        author = self.cached_related(obj, 'author')
+        return author.name if author else None
+    
     def get_average_rating(self, obj):
-        reviews = obj.reviews.all()
-        if reviews:
-            return round(sum(review.rating for review in reviews) / len(reviews), 1)
-        return None
+        # The stored average, so lists never load reviews
+        return round(obj.average_rating, 1) if obj.average_rating is not None else None
 
 
-class ReviewSerializer(serializers.ModelSerializer):
+class ReviewSerializer(CachedRelationsMixin, serializers.ModelSerializer):
     user_username = serializers.CharField(source='user.username', read_only=True)
-    book_title = serializers.CharField(source='book.title', read_only=True)
+    book_title = serializers.SerializerMethodField()
+    cached_relations = [(entity_cache.books, 'book_id')]
     
     class Meta:
         model = Review
+        list_serializer_class = CachedRelationsListSerializer
         fields = [
             'id', 'book', 'book_title', 'user', 'user_username', 
             'rating', 'comment', 'created_at', 'updated_at'
         ]
         read_only_fields = ['id', 'user', 'created_at', 'updated_at']
     
+    def get_book_title(self, obj):
+        book = self.cached_related(obj, 'book')
+        return book.title if book else None
+    
     def create(self, validated_data):
         validated_data['user'] = self.context['request'].user
-        return super().create(validated_data)
+        try:
+            # Savepoint so a concurrent duplicate does not break an outer transaction
+            with transaction.atomic():
+                return super().create(validated_data)
+        except IntegrityError:
+            raise serializers.ValidationError({
+                'non_field_errors': [
+                    'You have already reviewed this book. '
+                    f"Use PUT /api/books/{validated_data['book'].pk}/my-review/ to change your review."
+                ]
+            })
+
+
+class ReviewImportJobSerializer(serializers.ModelSerializer):
+    """Progress of a bulk review import (the submitted rows are not echoed)"""
+
+    class Meta:
+        model = ReviewImportJob
+        fields = [
+            'id', 'status', 'on_conflict', 'total', 'processed', 'created', 'updated',
+            'skipped', 'failed', 'errors', 'error', 'submitted_at', 'started_at', 'finished_at'
+        ]
+        read_only_fields = fields
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -81,3 +155,13 @@ class UserSerializer(serializers.ModelSerializer):
         model = User
         fields = ['id', 'username', 'email', 'first_name', 'last_name', 'date_joined']
         read_only_fields = ['id', 'date_joined']
+
+
+class RefreshTokenSerializer(serializers.Serializer):
+    """Body of POST /api/auth/refresh/"""
+    refresh = serializers.CharField()
+
+
+class RevokeTokenSerializer(serializers.Serializer):
+    """Body of POST /api/auth/revoke/"""
+    token = serializers.CharField()
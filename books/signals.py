@@ -0,0 +1,157 @@
+from django.db.models.signals import post_delete, post_init, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from . import author_stats, entity_cache, fuzzy, snapshots, trending
+from .autocomplete import index as autocomplete_index
+from .models import Author, Book, Review
+from .pagination import invalidate_cached_counts
+from .ratings import adjust_rating_count
+
+
+@receiver([post_save, post_delete], sender=Author)
+@receiver([post_save, post_delete], sender=Book)
+@receiver([post_save, post_delete], sender=Review)
+def catalog_changed(sender, **kwargs):
+    """Invalidate derived catalog data whenever authors, books or reviews change"""
+    invalidate_cached_counts()
+    if sender is not Review:
+        # Reviews reach the snapshots only through average ratings; see
+        # review_saved and review_deleted
+        snapshots.catalog_changed()
+
+
+@receiver(post_init, sender=Review)
+def remember_review_rating(sender, instance, **kwargs):
+    """Keep the loaded book/rating so saves can move the histogram bucket"""
+    # Not instance.rating: reading a deferred field loads a new instance,
+    # whose post_init would read it again
+    instance._histogram_key = (instance.__dict__.get('book_id'), instance.__dict__.get('rating'))
+
+
+@receiver(pre_save, sender=Review)
+def fetch_review_rating(sender, instance, **kwargs):
+    """Look up the stored book/rating of a review that was loaded without them"""
+    if None in instance._histogram_key and not instance._state.adding:
+        stored = sender.objects.filter(pk=instance.pk).values_list('book_id', 'rating').first()
+        if stored is not None:
+            instance._histogram_key = stored
+
+
+@receiver(pre_delete, sender=Review)
+def load_deleted_review(sender, instance, **kwargs):
+    """Load the fields review_deleted needs while the row still exists"""
+    deferred = instance.get_deferred_fields() & {'book_id', 'rating', 'created_at'}
+    if deferred:
+        instance.refresh_from_db(fields=deferred)
+
+
+@receiver(post_save, sender=Review)
+def review_saved(sender, instance, created, **kwargs):
+    old_key = None if created else instance._histogram_key
+    # A field that is still deferred was not saved, so it kept its stored value
+    new_key = tuple(
+        value if value is not None else stored
+        for value, stored in zip(
+            (instance.__dict__.get('book_id'), instance.__dict__.get('rating')),
+            old_key or (None, None),
+        )
+    )
+    if old_key != new_key:
+        if old_key and old_key[0] is not None and old_key[1]:
+            adjust_rating_count(*old_key, -1)
+            trending.adjust(old_key[0], instance.created_at, -1, -old_key[1])
+        adjust_rating_count(*new_key, 1)
+        trending.adjust(new_key[0], instance.created_at, 1, new_key[1])
+        snapshots.ratings_changed()
+    instance._histogram_key = new_key
+
+
+@receiver(post_delete, sender=Review)
+def review_deleted(sender, instance, **kwargs):
+    adjust_rating_count(instance.book_id, instance.rating, -1)
+    trending.adjust(instance.book_id, instance.created_at, -1, -instance.rating)
+    snapshots.ratings_changed()
+
+
+@receiver(post_save, sender=Book)
+def book_saved(sender, instance, **kwargs):
+    if autocomplete_index.built:
+        autocomplete_index.upsert(instance.pk, instance.title, instance.author.name, instance.isbn)
+    autocomplete_index.mark_changed([instance.pk])
+
+
+@receiver(post_delete, sender=Book)
+def book_deleted(sender, instance, **kwargs):
+    autocomplete_index.remove(instance.pk)
+    autocomplete_index.mark_changed([instance.pk])
+
+
+@receiver(post_save, sender=Author)
+def author_saved(sender, instance, created, **kwargs):
+    if created:
+        return
+    book_ids = []
+    for pk, title, isbn in instance.books.values_list('pk', 'title', 'isbn'):
+        autocomplete_index.upsert(pk, title, instance.name, isbn)
+        book_ids.append(pk)
+    autocomplete_index.mark_changed(book_ids)
+
+
+@receiver([post_save, post_delete], sender=Review)
+def review_popularity_changed(sender, instance, created=True, **kwargs):
+    if created:
+        delta = -1 if kwargs['signal'] is post_delete else 1
+        autocomplete_index.add_popularity(instance.book_id, delta)
+        autocomplete_index.mark_changed([instance.book_id])
+
+
+@receiver(post_save, sender=Author)
+def index_author_name(sender, instance, **kwargs):
+    fuzzy.index_authors([(instance.pk, instance.name)])
+
+
+@receiver(post_save, sender=Book)
+def index_book_title(sender, instance, **kwargs):
+    fuzzy.index_books([(instance.pk, instance.title)])
+
+
+@receiver(post_init, sender=Book)
+def remember_book_author(sender, instance, **kwargs):
+    """Keep the loaded author so moving a book refreshes both authors' stats"""
+    # Not instance.author_id: on a .only()/.defer() load that would query
+    # the deferred field for every row
+    instance._stats_author_id = instance.__dict__.get('author_id')
+
+
+@receiver([pre_save, pre_delete], sender=Book)
+def fetch_book_author(sender, instance, **kwargs):
+    """Look up the stored author of a book that was loaded without author_id"""
+    if instance._stats_author_id is None and not instance._state.adding:
+        instance._stats_author_id = sender.objects.filter(pk=instance.pk).values_list('author_id', flat=True).first()
+
+
+@receiver([post_save, post_delete], sender=Book)
+def book_stats_changed(sender, instance, **kwargs):
+    author_id = instance.__dict__.get('author_id')
+    author_stats.invalidate(instance._stats_author_id, author_id)
+    instance._stats_author_id = author_id
+
+
+@receiver(post_delete, sender=Author)
+def author_deleted(sender, instance, **kwargs):
+    author_stats.invalidate(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=Review)
+def review_stats_changed(sender, instance, **kwargs):
+    author_stats.invalidate_for_book(instance.book_id)
+
+
+@receiver([post_save, post_delete], sender=Author)
+def author_entity_changed(sender, instance, **kwargs):
+    entity_cache.authors.invalidate(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=Book)
+def book_entity_changed(sender, instance, **kwargs):
+    entity_cache.books.invalidate(instance.pk)
@@ -0,0 +1,180 @@
+"""
+"Readers also liked" neighbours computed from co-reviews.
+
+Two books are related when the same users reviewed both. Co-review counts
+are kept in CoReview (a sparse item-item matrix stored in both
+directions) and scored with cosine similarity:
+
+    score(a, b) = co_reviews(a, b) / sqrt(reviews(a) * reviews(b))
+
+A full rebuild counts every pair with one grouped self-join of Review in
+the database and streams the counts into CoReview in batches, so no pair
+table is held in Python. Incremental runs fold in new reviews batch by
+batch. The top-K neighbours of each book are stored in SimilarBook so the
+API reads them with a single indexed query.
+"""
+import heapq
+import math
+from collections import defaultdict
+from itertools import islice
+
+from django.db import transaction
+from django.db.models import Count, F, Max
+from .models import CoReview, Review, SimilarBook, SimilarityBuild
+
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def _review_counts(book_ids, batch_size):
+    counts = {}
+    for chunk in _chunks(book_ids, batch_size):
+        counts.update(
+            Review.objects.filter(book_id__in=chunk)
+            .values('book_id')
+            .annotate(n=Count('id'))
+            .values_list('book_id', 'n')
+        )
+    return counts
+
+
+def _write_pairs(pair_counts, batch_size):
+    """Upsert absolute co-review counts for (a, b) pairs, in both directions"""
+    rows = []
+    for (a, b), count in pair_counts.items():
+        rows.append(CoReview(book_id=a, other_id=b, count=count))
+        rows.append(CoReview(book_id=b, other_id=a, count=count))
+    for chunk in _chunks(rows, batch_size):
+        CoReview.objects.bulk_create(
+            chunk, update_conflicts=True, unique_fields=['book', 'other'], update_fields=['count']
+        )
+
+
+def refresh_neighbours(book_ids, top_k=10, batch_size=500):
+    """Recompute and store the top-K neighbours of the given books"""
+    for chunk in _chunks(sorted(book_ids), batch_size):
+        partners = defaultdict(list)
+        needed = set(chunk)
+        for book_id, other_id, count in CoReview.objects.filter(book_id__in=chunk).values_list(
+                'book_id', 'other_id', 'count'):
+            partners[book_id].append((other_id, count))
+            needed.add(other_id)
+        review_counts = _review_counts(needed, batch_size)
+
+        rows = []
+        for book_id in chunk:
+            own = review_counts.get(book_id)
+            if not own:
+                continue
+            scored = (
+                (count / math.sqrt(own * review_counts[other_id]), other_id)
+                for other_id, count in partners[book_id]
+                if count and review_counts.get(other_id)
+            )
+            for rank, (score, other_id) in enumerate(heapq.nlargest(top_k, scored), start=1):
+                rows.append(SimilarBook(book_id=book_id, similar_id=other_id, score=score, rank=rank))
+
+        with transaction.atomic():
+            SimilarBook.objects.filter(book_id__in=chunk).delete()
+            SimilarBook.objects.bulk_create(rows)
+
+
+def _co_review_counts(last_review_id, max_user_reviews):
+    """(book_id, other_id, count) of every co-reviewed pair, in both directions"""
+    reviews = Review.objects.filter(id__lte=last_review_id)
+    users = (
+        reviews.values('user_id').order_by()
+        .annotate(n=Count('id')).filter(n__gt=1, n__lte=max_user_reviews)
+        .values('user_id')
+    )
+    # Each of a user's reviews joined to their other reviews
+    return (
+        reviews.filter(user_id__in=users, user__review__id__lte=last_review_id)
+        .annotate(other_id=F('user__review__book_id'))
+        .exclude(other_id=F('book_id'))
+        .values('book_id', 'other_id')
+        .annotate(count=Count('id'))
+        .values_list('book_id', 'other_id', 'count')
+        .order_by()
+    )
+
+
+def full_rebuild(top_k=10, batch_size=5000, max_user_reviews=500):
+    """Rebuild CoReview and SimilarBook from the whole Review table"""
+    last_review_id = Review.objects.aggregate(m=Max('id'))['m'] or 0
+    pairs = _co_review_counts(last_review_id, max_user_reviews).iterator(chunk_size=batch_size)
+    with transaction.atomic():
+        CoReview.objects.all().delete()
+        for chunk in _chunks(pairs, batch_size):
+            CoReview.objects.bulk_create(
+                [CoReview(book_id=book_id, other_id=other_id, count=count) for book_id, other_id, count in chunk]
+            )
+
+    book_ids = set(Review.objects.values_list('book_id', flat=True).distinct())
+    SimilarBook.objects.exclude(book_id__in=book_ids).delete()
+    refresh_neighbours(book_ids, top_k=top_k)
+    return last_review_id, len(book_ids)
+
+
+def incremental_update(since_id, top_k=10, batch_size=5000, max_user_reviews=500):
+    """
+    Fold reviews created after ``since_id`` into CoReview and refresh the
+    neighbours of every book whose co-review counts changed.
+
+    Each new review is paired only with the same user's earlier reviews,
+    so pairs of new reviews are counted once. Deleted or edited reviews
+    are not subtracted; run a full rebuild periodically to correct them.
+    """
+    last_review_id = since_id
+    affected = set()
+    new_reviews = (
+        Review.objects.filter(id__gt=since_id)
+        .order_by('id')
+        .values_list('id', 'user_id', 'book_id')
+    )
+    for batch in _chunks(new_reviews.iterator(chunk_size=batch_size), batch_size):
+        last_review_id = batch[-1][0]
+        user_ids = {user_id for _, user_id, _ in batch}
+        history = defaultdict(list)
+        for review_id, user_id, book_id in Review.objects.filter(
+                user_id__in=user_ids, id__lte=last_review_id).values_list('id', 'user_id', 'book_id'):
+            history[user_id].append((review_id, book_id))
+
+        deltas = defaultdict(int)
+        for review_id, user_id, book_id in batch:
+            if len(history[user_id]) > max_user_reviews:
+                continue
+            for other_review_id, other_book_id in history[user_id]:
+                if other_review_id < review_id and other_book_id != book_id:
+                    deltas[tuple(sorted((book_id, other_book_id)))] += 1
+        if not deltas:
+            continue
+
+        books = {book_id for pair in deltas for book_id in pair}
+        existing = {
+            (book_id, other_id): count
+            for book_id, other_id, count in CoReview.objects.filter(
+                book_id__in=books, other_id__in=books).values_list('book_id', 'other_id', 'count')
+        }
+        with transaction.atomic():
+            _write_pairs({pair: existing.get(pair, 0) + delta for pair, delta in deltas.items()}, batch_size)
+        affected |= books
+
+    refresh_neighbours(affected, top_k=top_k)
+    return last_review_id, len(affected)
+
+
+def build(full=False, **options):
+    """Run a full or incremental build and record its watermark"""
+    previous = SimilarityBuild.objects.order_by('-built_at', '-id').first()
+    if full or previous is None:
+        last_review_id, books_updated = full_rebuild(**options)
+        full = True
+    else:
+        last_review_id, books_updated = incremental_update(previous.last_review_id, **options)
+    return SimilarityBuild.objects.create(
+        last_review_id=last_review_id, full_rebuild=full, books_updated=books_updated
+    )
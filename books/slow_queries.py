@@ -0,0 +1,142 @@
+import hashlib
+import logging
+import re
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import IntegrityError, connections, transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+
+logger = logging.getLogger('books.slow_queries')
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+EXPLAIN_PREFIX = {
+    'sqlite': 'EXPLAIN QUERY PLAN ',
+    'postgresql': 'EXPLAIN ',
+    'mysql': 'EXPLAIN ',
+}
+
+
+def normalize_sql(sql):
+    """Reduce a statement to its shape: literals and IN lists become ?"""
+    shape = _STRING.sub('?', sql)
+    shape = _NUMBER.sub('?', shape)
+    shape = shape.replace('%s', '?')
+    shape = _PLACEHOLDER_LIST.sub('(...)', shape)
+    return _WHITESPACE.sub(' ', shape).strip()
+
+
+class SlowQueryLogger:
+    """
+    Database execute wrapper that collects statements slower than a threshold.
+
+    Nothing is written while the request runs: flush() stores the collected
+    statements once the response has been sent, outside the request's
+    transaction, so a rollback doesn't lose them and the request doesn't
+    hold locks on SlowQuery. Each new query shape is stored once together
+    with its EXPLAIN output; repeats only bump the call count and timings.
+    """
+
+    def __init__(self, threshold_ms, request=None):
+        self.threshold_ms = threshold_ms
+        self.request = request
+        self.pending = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        result = execute(sql, params, many, context)
+        duration_ms = (time.perf_counter() - start) * 1000
+        if duration_ms >= self.threshold_ms:
+            logger.warning('Slow query (%.1f ms) in %s: %s params=%r', duration_ms, self.view_name() or '-', sql, params)
+            self.pending.append((context['connection'].alias, sql, params, many, duration_ms))
+        return result
+
+    def view_name(self):
+        match = getattr(self.request, 'resolver_match', None)
+        return match.view_name if match else ''
+
+    def flush(self):
+        """Store the statements collected so far"""
+        pending, self.pending = self.pending, []
+        for alias, sql, params, many, duration_ms in pending:
+            try:
+                self.record(connections[alias], sql, params, many, duration_ms)
+            except Exception:
+                logger.exception('Failed to record slow query')
+
+    def record(self, connection, sql, params, many, duration_ms):
+        from .models import SlowQuery
+
+        shape = normalize_sql(sql)
+        fingerprint = hashlib.md5(shape.encode()).hexdigest()
+
+        updated = SlowQuery.objects.using(connection.alias).filter(fingerprint=fingerprint).update(
+            calls=F('calls') + 1,
+            total_ms=F('total_ms') + duration_ms,
+            max_ms=Greatest('max_ms', duration_ms),
+        )
+        if updated:
+            return
+        try:
+            with transaction.atomic(using=connection.alias):
+                SlowQuery.objects.using(connection.alias).create(
+                    fingerprint=fingerprint,
+                    sql=shape,
+                    sample_params=repr(params)[:1000],
+                    view=self.view_name(),
+                    explain='' if many else self.explain(connection, sql, params),
+                    calls=1,
+                    total_ms=duration_ms,
+                    max_ms=duration_ms,
+                )
+        except IntegrityError:
+            # Another worker stored this shape first
+            SlowQuery.objects.using(connection.alias).filter(fingerprint=fingerprint).update(
+                calls=F('calls') + 1,
+                total_ms=F('total_ms') + duration_ms,
+                max_ms=Greatest('max_ms', duration_ms),
+            )
+
+    def explain(self, connection, sql, params):
+        prefix = EXPLAIN_PREFIX.get(connection.vendor)
+        if not prefix or not sql.lstrip().upper().startswith('SELECT'):
+            return ''
+        try:
+            with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+                cursor.execute(prefix + sql, params)
+                rows = cursor.fetchall()
+        except Exception as exc:
+            return f'EXPLAIN failed: {exc}'
+        return '\n'.join(' | '.join(str(col) for col in row) for row in rows)
+
+
+class SlowQueryMiddleware:
+    """
+    Log SQL statements slower than BOOKS_SLOW_QUERY_MS for each request.
+
+    The statements are stored when the response is closed, after it has
+    been sent and before the request_finished signal recycles connections.
+    Disabled entirely (not installed on any connection) when the setting
+    is None.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.threshold_ms = getattr(settings, 'BOOKS_SLOW_QUERY_MS', None)
+
+    def __call__(self, request):
+        if self.threshold_ms is None:
+            return self.get_response(request)
+        slow_log = SlowQueryLogger(self.threshold_ms, request)
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(slow_log))
+            response = self.get_response(request)
+        response._resource_closers.append(slow_log.flush)
+        return response
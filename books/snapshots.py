@@ -0,0 +1,283 @@
+"""
+Precomputed catalog snapshots.
+
+The anonymous catalog pages (``/api/books/?page=N``,
+``/api/books/by_genre/?genre=X`` and ``/api/authors/?page=N``) are rendered
+through their normal views into gzip-compressed JSON files, and a
+manifest maps each URL to its file and ETag. SnapshotMiddleware answers
+matching requests straight from those files (through the server's
+``wsgi.file_wrapper``, i.e. sendfile, where available) without running
+URL resolution, DRF or the ORM. Any other URL, parameter combination,
+Accept type or a client without gzip support falls through to the live
+view.
+
+An author or book write removes the manifest, so every worker falls back
+to the live views at once, and schedules a rebuild in a background thread
+of the writing process after BOOKS_SNAPSHOT_DEBOUNCE seconds; writes
+within that window share one rebuild. Reviews only move the average
+ratings on the pages, so they schedule a rebuild but keep the current
+snapshots serving until it lands. With BOOKS_SNAPSHOT_DEBOUNCE = None web
+processes never rebuild, and ``manage.py build_snapshots`` is run on a
+schedule instead. import_catalog rebuilds them when it finishes, and
+``manage.py build_snapshots`` builds them on demand (e.g. after a deploy).
+
+The files live in BOOKS_SNAPSHOT_DIR (default ``<tmp>/books-snapshots-<uid>``),
+which must be private to the server's user, and the middleware only
+opens the content-addressed file names that build() writes.
+"""
+import gzip
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.exceptions import ImproperlyConfigured
+from django.http import FileResponse, HttpRequest, HttpResponseNotModified, QueryDict
+from django.urls import resolve
+
+from .tempdirs import private_dir
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+MANIFEST = 'manifest.json'
+JSON_ACCEPT = {'', '*/*', 'application/*', 'application/json'}
+# The names build() gives snapshot files: the MD5 of their content
+SNAPSHOT_FILE = re.compile(r'[0-9a-f]{32}\.json\.gz')
+
+logger = logging.getLogger('books.snapshots')
+
+
+def snapshot_dir():
+    """BOOKS_SNAPSHOT_DIR, created or checked as private; raises ImproperlyConfigured"""
+    return private_dir(getattr(settings, 'BOOKS_SNAPSHOT_DIR', None), 'books-snapshots')
+
+
+def snapshot_key(scheme, host, path, params):
+    """Canonical manifest key: parameters sorted, so their order does not matter"""
+    query = urlencode(sorted(params))
+    return f'{scheme}://{host}{path}' + (f'?{query}' if query else '')
+
+
+# Building
+
+def _render(scheme, host, path, params):
+    """Run the live view for a URL and return the rendered response"""
+    request = HttpRequest()
+    request.method = 'GET'
+    request.path = request.path_info = path
+    request.GET = QueryDict(urlencode(params))
+    request.user = AnonymousUser()
+    # Render from the database, not from a (possibly stale) coalesced result
+    request.coalesce = False
+    server_name, _, port = host.partition(':')
+    request.META.update({
+        'HTTP_HOST': host,
+        'SERVER_NAME': server_name,
+        'SERVER_PORT': port or ('443' if scheme == 'https' else '80'),
+        'HTTP_ACCEPT': 'application/json',
+        'QUERY_STRING': urlencode(params),
+        'wsgi.url_scheme': scheme,
+    })
+    if scheme == 'https':
+        request.META['HTTPS'] = 'on'
+    match = resolve(path)
+    response = match.func(request, *match.args, **match.kwargs)
+    response.render()
+    return response
+
+
+def _pages(path, max_pages):
+    for page in range(1, max_pages + 1):
+        yield path, [('page', str(page))]
+
+
+def _targets():
+    from .models import Book
+
+    max_pages = getattr(settings, 'BOOKS_SNAPSHOT_MAX_PAGES', 50)
+    yield from _pages('/api/books/', max_pages)
+    yield from _pages('/api/authors/', max_pages)
+    for genre, _label in Book.GENRE_CHOICES:
+        yield '/api/books/by_genre/', [('genre', genre)]
+
+
+def build():
+    """Render every snapshot for every configured host; returns the number of files"""
+    directory = snapshot_dir()
+    entries = {}
+    for origin in getattr(settings, 'BOOKS_SNAPSHOT_ORIGINS', ['http://127.0.0.1:8000', 'http://localhost:8000']):
+        scheme, _, host = origin.partition('://')
+        for path, params in _targets():
+            response = _render(scheme, host, path, params)
+            if response.status_code != 200:
+                # Past the last page
+                continue
+            content = response.content
+            etag = hashlib.md5(content).hexdigest()
+            filename = f'{etag}.json.gz'
+            target = os.path.join(directory, filename)
+            if not os.path.exists(target):
+                _write_atomic(target, gzip.compress(content, compresslevel=9, mtime=0))
+            entry = {'file': filename, 'etag': f'"{etag}"', 'content_type': response['Content-Type']}
+            entries[snapshot_key(scheme, host, path, params)] = entry
+            if params == [('page', '1')]:
+                # The first page is also served without ?page=1
+                entries[snapshot_key(scheme, host, path, [])] = entry
+
+    _write_atomic(
+        os.path.join(directory, MANIFEST),
+        json.dumps({'built_at': time.time(), 'entries': entries}).encode(),
+    )
+    used = {entry['file'] for entry in entries.values()} | {MANIFEST}
+    for name in os.listdir(directory):
+        if name.endswith('.json.gz') and name not in used:
+            os.remove(os.path.join(directory, name))
+    return len(used) - 1
+
+
+def _write_atomic(path, data):
+    temp = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(temp, 'wb') as f:
+        f.write(data)
+    os.replace(temp, path)
+
+
+# Invalidation and debounced rebuilds
+
+_timer_lock = threading.Lock()
+_timer = None
+
+
+def invalidate():
+    """Stop serving snapshots, in every process, until the next build"""
+    try:
+        os.remove(os.path.join(snapshot_dir(), MANIFEST))
+    except (FileNotFoundError, ImproperlyConfigured):
+        # Nothing is served from a directory that is not private
+        pass
+
+
+def catalog_changed():
+    """Stop serving snapshots now and rebuild them after the debounce delay"""
+    invalidate()
+    schedule_rebuild()
+
+
+def ratings_changed():
+    """Rebuild after the debounce delay, serving the current snapshots until then"""
+    schedule_rebuild()
+
+
+def schedule_rebuild():
+    delay = getattr(settings, 'BOOKS_SNAPSHOT_DEBOUNCE', 30)
+    if not getattr(settings, 'BOOKS_SNAPSHOTS', True) or delay is None:
+        return
+    global _timer
+    with _timer_lock:
+        if _timer is not None:
+            return
+        _timer = threading.Timer(delay, _rebuild_in_background)
+        _timer.daemon = True
+        _timer.start()
+
+
+def _rebuild_in_background():
+    from django.db import connections
+
+    global _timer
+    with _timer_lock:
+        _timer = None
+    try:
+        rebuild()
+    finally:
+        connections.close_all()
+
+
+def rebuild():
+    """Build the snapshots, one process at a time; returns the number of files"""
+    with open(os.path.join(snapshot_dir(), 'build.lock'), 'a') as lock:
+        if fcntl is not None:
+            # Writes made while another process was building are already in
+            # the database when this one reads
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        return build()
+
+
+# Serving
+
+class SnapshotMiddleware:
+    """Serve precomputed catalog snapshots; see the module docstring"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = getattr(settings, 'BOOKS_SNAPSHOTS', True)
+        self.directory = None
+        if self.enabled:
+            try:
+                self.directory = snapshot_dir()
+            except ImproperlyConfigured:
+                logger.exception('Catalog snapshots are off')
+                self.enabled = False
+        self.manifest_path = os.path.join(self.directory or '', MANIFEST)
+        self._manifest = None
+        self._manifest_mtime = None
+
+    def _entries(self):
+        try:
+            mtime = os.stat(self.manifest_path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+        if mtime != self._manifest_mtime:
+            try:
+                with open(self.manifest_path, 'rb') as f:
+                    self._manifest = json.load(f)['entries']
+            except (OSError, ValueError, KeyError):
+                return None
+            self._manifest_mtime = mtime
+        return self._manifest
+
+    def _acceptable(self, request):
+        if request.method not in ('GET', 'HEAD') or 'HTTP_AUTHORIZATION' in request.META:
+            return False
+        # Snapshots are plain JSON; browsers (text/html) and other formats
+        # such as columnar JSON go to the live view
+        accepted = {part.split(';')[0].strip() for part in request.META.get('HTTP_ACCEPT', '*/*').split(',')}
+        if not accepted <= JSON_ACCEPT:
+            return False
+        return 'gzip' in request.META.get('HTTP_ACCEPT_ENCODING', '')
+
+    def __call__(self, request):
+        if not self.enabled or not self._acceptable(request):
+            return self.get_response(request)
+        entries = self._entries()
+        if not entries:
+            return self.get_response(request)
+        key = snapshot_key(request.scheme, request.get_host(), request.path, request.GET.items())
+        entry = entries.get(key)
+        if entry is None or not SNAPSHOT_FILE.fullmatch(str(entry.get('file'))):
+            return self.get_response(request)
+
+        request.metrics_route = 'snapshot'
+        if entry['etag'] in request.META.get('HTTP_IF_NONE_MATCH', ''):
+            response = HttpResponseNotModified()
+        else:
+            try:
+                handle = open(os.path.join(self.directory, entry['file']), 'rb')
+            except FileNotFoundError:
+                # Replaced by a rebuild since the manifest was read
+                return self.get_response(request)
+            response = FileResponse(handle, content_type=entry['content_type'])
+            response['Content-Encoding'] = 'gzip'
+        response['ETag'] = entry['etag']
+        response['Vary'] = 'Accept, Accept-Encoding'
+        response['X-Snapshot'] = 'hit'
+        return response
@@ -0,0 +1,34 @@
+"""
+Private working directories shared by the worker processes of one host.
+
+Request coalescing and catalog snapshots keep files that workers read
+back and serve, so nobody else on the host may be able to write into
+their directories. private_dir() creates a directory with mode 0700 or,
+if it already exists, checks that it is a real directory owned by this
+user and closed to group and others.
+"""
+import os
+import stat
+import tempfile
+
+from django.core.exceptions import ImproperlyConfigured
+
+
+def default_path(name):
+    """``<tmp>/<name>-<uid>``, so users of one host never share a directory"""
+    suffix = f'-{os.getuid()}' if hasattr(os, 'getuid') else ''
+    return os.path.join(tempfile.gettempdir(), f'{name}{suffix}')
+
+
+def private_dir(configured, name):
+    """Return ``configured`` (or the default for ``name``), created or checked as private"""
+    path = configured or default_path(name)
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    info = os.lstat(path)
+    if not stat.S_ISDIR(info.st_mode):
+        raise ImproperlyConfigured(f'{path} must be a directory, not a link or file')
+    if hasattr(os, 'getuid') and (info.st_uid != os.getuid() or info.st_mode & 0o077):
+        raise ImproperlyConfigured(
+            f'{path} must be owned by this user and closed to others (chmod 700 {path})'
+        )
+    return str(path)
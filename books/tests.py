@@ -1,3 +1,1065 @@
-from django.test import TestCase
+import gzip
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+from datetime import date
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.db import DatabaseError, transaction
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from django.urls import resolve
+from rest_framework.test import APITestCase
+
+from . import author_stats, entity_cache, facets, metrics, review_import, similarity, snapshots, warmup
+from .autocomplete import VERSION_KEY, PrefixIndex
+from .coalescing import ResultStore
+from .concurrency import AdaptiveLimiter, ConcurrencyLimitMiddleware
+from .entity_cache import TwoTierCache
+from .models import Author, Book, CoReview, Review, SimilarityBuild, SlowQuery
+from .pagination import COUNT_VERSION_KEY, EstimatedCountPaginator, estimate_row_count
+from .profiling import ProfilingMiddleware
+from .renderers import COLUMNAR_MEDIA_TYPE, decode_columnar, encode_columnar
+from .slow_queries import SlowQueryMiddleware
+from .tempdirs import private_dir
+
+
+@override_settings(BOOKS_SNAPSHOTS=False, BOOKS_COALESCE=False)
+class BooksAPITestCase(APITestCase):
+    """Shared catalog fixture; snapshots and coalescing are off unless a test enables them"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = Author.objects.create(name='F. Scott Fitzgerald', email='fitzgerald@example.com')
+        cls.other_author = Author.objects.create(name='Harper Lee', email='lee@example.com')
+        cls.book = Book.objects.create(
+            title='The Great Gatsby', author=cls.author, isbn='9780743273565',
+            publication_date=date(1925, 4, 10), pages=180, genre='fiction',
+            description='Jazz Age novel', price='10.99',
+        )
+        cls.other_book = Book.objects.create(
+            title='To Kill a Mockingbird', author=cls.other_author, isbn='9780061120084',
+            publication_date=date(1960, 7, 11), pages=281, genre='fiction',
+            description='Southern Gothic novel', price='12.99',
+        )
+
+    def setUp(self):
+        cache.clear()
+
+
+class FuzzySearchTests(BooksAPITestCase):
+
+    def test_misspelled_title_matches(self):
+        response = self.client.get('/api/books/', {'search': 'gatsbi', 'fuzzy': 'true'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([book['id'] for book in response.data['results']], [self.book.pk])
+
+    def test_no_candidates_returns_empty_page(self):
+        for query in ('qqqqzz', 'zzzzzzzzqq'):
+            response = self.client.get('/api/books/', {'search': query, 'fuzzy': 'true'})
+            self.assertEqual(response.status_code, 200, query)
+            self.assertEqual(response.data['count'], 0)
+            self.assertEqual(response.data['results'], [])
+
+    def test_no_candidates_with_facets(self):
+        response = self.client.get('/api/books/', {'search': 'qqqqzz', 'fuzzy': 'true', 'facets': 'genre,author'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['facets']['author'], [])
+        self.assertTrue(all(entry['count'] == 0 for entry in response.data['facets']['genre']))
+
+
+class MyReviewTests(BooksAPITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.user = User.objects.create_user('reader', password='password123')
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.user)
+        self.url = f'/api/books/{self.book.pk}/my-review/'
+
+    def test_json_put_creates_then_updates(self):
+        response = self.client.put(self.url, {'rating': 4, 'comment': 'Good'}, format='json')
+        self.assertEqual(response.status_code, 201)
+        response = self.client.put(self.url, {'rating': 2, 'comment': 'Less good'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['rating'], 2)
+
+        self.book.refresh_from_db()
+        self.assertEqual([getattr(self.book, field) for field in Book.RATING_FIELDS], [0, 1, 0, 0, 0])
+        self.assertEqual(Review.objects.filter(book=self.book, user=self.user).count(), 1)
+
+    def test_form_put(self):
+        response = self.client.put(self.url, {'rating': '5', 'comment': 'Great'}, format='multipart')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['rating'], 5)
+        self.assertEqual(response.data['comment'], 'Great')
+
+    def test_invalid_bodies(self):
+        for body in ({'rating': 9, 'comment': 'x'}, {'rating': 3}, [1, 2]):
+            response = self.client.put(self.url, body, format='json')
+            self.assertEqual(response.status_code, 400, body)
+        self.assertFalse(Review.objects.filter(book=self.book, user=self.user).exists())
+
+    def test_get(self):
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+        self.client.put(self.url, {'rating': 3, 'comment': 'Fine'}, format='json')
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['rating'], 3)
+
+
+class AuthorStatsInvalidationTests(BooksAPITestCase):
+
+    def test_deferred_load_does_not_query_author(self):
+        with self.assertNumQueries(1):
+            titles = [book.title for book in Book.objects.only('title')]
+        self.assertEqual(len(titles), 2)
+
+    def test_moving_deferred_book_refreshes_both_authors(self):
+        author_stats.get_stats([self.author.pk, self.other_author.pk])
+        book = Book.objects.only('title').get(pk=self.book.pk)
+        book.author = self.other_author
+        book.save()
+        self.assertIsNone(cache.get(author_stats.cache_key(self.author.pk)))
+        self.assertIsNone(cache.get(author_stats.cache_key(self.other_author.pk)))
+        self.assertEqual(author_stats.get_stats([self.author.pk])[self.author.pk]['books_count'], 0)
+
+    def test_import_moving_book_refreshes_old_author(self):
+        author_stats.get_stats([self.author.pk])
+        row = {
+            'title': self.book.title, 'isbn': self.book.isbn, 'publication_date': '1925-04-10',
+            'pages': 180, 'genre': 'fiction', 'description': 'Jazz Age novel', 'price': '10.99',
+            'is_available': True, 'author_name': 'Harper Lee', 'author_email': self.other_author.email,
+        }
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'feed.jsonl')
+            with open(path, 'w') as feed:
+                feed.write(json.dumps(row) + '\n')
+            call_command('import_catalog', path, stdout=io.StringIO())
+        self.assertEqual(author_stats.get_stats([self.author.pk])[self.author.pk]['books_count'], 0)
+
+
+class PrefixIndexTests(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.index = PrefixIndex()
+        self.index.load([
+            (1, 'The Great Gatsby', 'F. Scott Fitzgerald', '9780743273565', 5),
+            (2, 'Great Expectations', 'Charles Dickens', '9780141439563', 3),
+        ])
+
+    def ids(self, query):
+        return [result[0] for result in self.index.search(query)]
+
+    def test_updates_are_searchable_before_and_after_merge(self):
+        with mock.patch('books.autocomplete.DELTA_SIZE', 8):
+            self.index.upsert(3, 'Great Gatsby Revisited', 'Someone Else', '9780000000001', 9)
+            self.assertEqual(self.ids('great'), [3, 1, 2])
+            self.assertTrue(self.index._delta)
+            for book_id in range(4, 8):
+                self.index.upsert(book_id, f'Filler {book_id}', 'Nobody', f'97800000000{book_id:02d}', 0)
+            self.index.upsert(1, 'The Greatest Gatsby', 'F. Scott Fitzgerald', '9780743273565')
+        self.assertEqual(self.ids('great'), [3, 1, 2])
+        self.assertEqual(self.ids('greatest'), [1])
+        self.assertEqual(self.ids('filler'), [4, 5, 6, 7])
+        self.index.remove(3)
+        self.assertEqual(self.ids('great'), [1, 2])
+
+    def test_cached_results_follow_popularity(self):
+        with mock.patch('books.autocomplete.CACHE_RANGE', 0):
+            self.assertEqual(self.ids('great'), [1, 2])
+            self.index.add_popularity(2, 10)
+            self.assertEqual(self.ids('great'), [2, 1])
+            self.index.upsert(3, 'Greatness', 'Someone Else', '9780000000001', 20)
+            self.assertEqual(self.ids('great'), [3, 2, 1])
+
+    def test_mark_changed_keeps_other_processes_changes(self):
+        self.index.version = cache.get(VERSION_KEY)
+        self.index.mark_changed()
+        self.assertEqual(self.index.version, 1)
+        # Another process changes books, then this one writes
+        cache.incr(VERSION_KEY)
+        self.index.mark_changed()
+        self.assertEqual(self.index.version, 1)
+        self.assertNotEqual(cache.get(VERSION_KEY), self.index.version)
+
+    def test_compaction_runs_in_the_background(self):
+        with mock.patch.object(self.index, '_in_background') as in_background:
+            for _ in range(3):
+                self.index.upsert(1, 'The Great Gatsby', 'F. Scott Fitzgerald', '9780743273565')
+        in_background.assert_called_with(self.index.build)
+        self.assertEqual(self.ids('gatsby'), [1])
+
+
+class AutocompleteSyncTests(BooksAPITestCase):
+
+    def test_other_processes_replay_changed_books(self):
+        other = PrefixIndex()
+        other.build()
+        user = User.objects.create_user('reader', password='password123')
+        with self.captureOnCommitCallbacks(execute=True):
+            Review.objects.create(book=self.other_book, user=user, rating=5, comment='Classic')
+            self.book.title = 'The Great Gatsby (Annotated)'
+            self.book.save()
+        # Replacing both books would also schedule a compaction here
+        with mock.patch.object(other, 'build') as build, mock.patch.object(other, '_compact_if_needed'):
+            other.catch_up()
+        build.assert_not_called()
+        self.assertEqual(other.version, cache.get(VERSION_KEY))
+        self.assertEqual(other.search('annotated')[0][0], self.book.pk)
+        self.assertEqual(other.search('mockingbird')[0][4], 1)
+
+    def test_missing_change_lists_rebuild(self):
+        other = PrefixIndex()
+        other.build()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.book.save()
+        cache.delete(f'books:autocomplete_changes:{cache.get(VERSION_KEY)}')
+        with mock.patch.object(other, 'build') as build:
+            other.catch_up()
+        build.assert_called_once()
+
+
+class EntityCacheTests(BooksAPITestCase):
+
+    def test_invalidation_does_not_adopt_other_processes_versions(self):
+        authors = TwoTierCache(Author, 'test_author')
+        authors.get(self.author.pk)
+        # Another process renames the author and bumps the stamp
+        Author.objects.filter(pk=self.author.pk).update(name='Renamed')
+        cache.delete(authors._key(self.author.pk))
+        cache.set(authors.version_key, 1)
+        # A local write to another row must not hide that change
+        authors.invalidate(self.other_author.pk)
+        self.assertEqual(authors.get(self.author.pk).name, 'Renamed')
+
+
+class SignedTokenTests(BooksAPITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.user = User.objects.create_user('reader', password='password123')
+        cls.staff = User.objects.create_user('editor', password='password123', is_staff=True)
+
+    def obtain(self, username='reader'):
+        response = self.client.post('/api/auth/access/', {'username': username, 'password': 'password123'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_refresh_rotates_the_pair(self):
+        tokens = self.obtain()
+        response = self.client.post('/api/auth/refresh/', {'refresh': tokens['refresh']}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.data['refresh'], tokens['refresh'])
+        # The old refresh token was revoked by the rotation
+        response = self.client.post('/api/auth/refresh/', {'refresh': tokens['refresh']}, format='json')
+        self.assertIn(response.status_code, (401, 403))
+
+    def test_malformed_bodies_are_rejected(self):
+        for url, field in (('/api/auth/refresh/', 'refresh'), ('/api/auth/revoke/', 'token')):
+            for body in ({}, {field: None}, {field: ['a', 'b']}, {field: {'a': 1}}, ['a'], {field: ''}):
+                response = self.client.post(url, body, format='json')
+                self.assertEqual(response.status_code, 400, (url, body))
+
+    def test_invalid_tokens(self):
+        response = self.client.post('/api/auth/refresh/', {'refresh': 'not-a-token'}, format='json')
+        self.assertEqual(response.status_code, 401)
+        response = self.client.post('/api/auth/revoke/', {'token': 12345}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_revoked_access_token_is_refused(self):
+        access = self.obtain()['access']
+        self.assertEqual(self.client.post('/api/auth/revoke/', {'token': access}, format='json').status_code, 204)
+        response = self.client.get('/api/user/profile/', HTTP_AUTHORIZATION=f'Bearer {access}')
+        self.assertIn(response.status_code, (401, 403))
+
+    def test_profiling_accepts_staff_bearer_tokens(self):
+        staff_access = self.obtain('editor')['access']
+        response = self.client.get('/api/books/', HTTP_X_PROFILE='dump', HTTP_AUTHORIZATION=f'Bearer {staff_access}')
+        self.assertIn('X-Profile-Id', response)
+        reader_access = self.obtain()['access']
+        response = self.client.get('/api/books/', HTTP_X_PROFILE='dump', HTTP_AUTHORIZATION=f'Bearer {reader_access}')
+        self.assertNotIn('X-Profile-Id', response)
+
+
+class TrendingTests(BooksAPITestCase):
+
+    def test_limit_is_clamped(self):
+        for limit in ('-1', '0', '1000', 'abc', ''):
+            response = self.client.get('/api/books/trending/', {'limit': limit})
+            self.assertEqual(response.status_code, 200, limit)
+
+
+class SimilarBooksTests(BooksAPITestCase):
+
+    def test_unknown_or_malformed_book(self):
+        self.assertEqual(self.client.get('/api/books/abc/similar/').status_code, 404)
+        self.assertEqual(self.client.get('/api/books/999999/similar/').status_code, 404)
+
+    def test_existing_book(self):
+        with self.assertNumQueries(2):
+            response = self.client.get(f'/api/books/{self.book.pk}/similar/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, [])
+
+    def test_full_rebuild_matches_incremental_updates(self):
+        third = Book.objects.create(
+            title='Tender Is the Night', author=self.author, isbn='9780684801544',
+            publication_date=date(1934, 4, 12), pages=317, description='Riviera', price='11.50',
+        )
+        SimilarityBuild.objects.create(last_review_id=0)
+        readers = [User.objects.create_user(f'reader{n}', password='password123') for n in range(3)]
+        for reader, books in zip(readers, [[self.book, self.other_book, third], [self.book, third], [self.other_book]]):
+            for book in books:
+                Review.objects.create(book=book, user=reader, rating=4, comment='Good')
+        similarity.build()
+        incremental = set(CoReview.objects.values_list('book_id', 'other_id', 'count'))
+        similarity.build(full=True)
+        self.assertEqual(set(CoReview.objects.values_list('book_id', 'other_id', 'count')), incremental)
+        self.assertIn((self.book.pk, third.pk, 2), incremental)
+        self.assertIn((third.pk, self.book.pk, 2), incremental)
+
+        response = self.client.get(f'/api/books/{self.book.pk}/similar/')
+        self.assertEqual([book['id'] for book in response.data], [third.pk, self.other_book.pk])
+
+
+@override_settings(BOOKS_COUNT_ESTIMATE_THRESHOLD=1)
+class CachedCountPaginationTests(BooksAPITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        Book.objects.bulk_create([
+            Book(title=f'Filler {n}', author=cls.author, isbn=f'97800000000{n:02d}',
+                 publication_date=date(2000, 1, 1), pages=100, genre='fiction',
+                 description='Filler', price='5.00')
+            for n in range(23)
+        ])
+
+    def page(self, number):
+        response = self.client.get('/api/books/', {'genre': 'fiction', 'page': number})
+        return response.status_code, response.data
+
+    def test_cached_exact_count_stays_exact(self):
+        for _ in range(2):
+            status_code, data = self.page(1)
+            self.assertEqual(status_code, 200)
+            self.assertEqual(data['count'], 25)
+            self.assertFalse(data['count_is_estimated'])
+
+    def test_low_estimate_still_reaches_the_last_page(self):
+        with mock.patch('books.pagination.estimate_query_count', return_value=5):
+            status_code, data = self.page(1)
+            self.assertTrue(data['count_is_estimated'])
+            self.assertIsNotNone(data['next'])
+            status_code, data = self.page(2)
+            self.assertEqual(status_code, 200)
+            self.assertEqual(len(data['results']), 5)
+            self.assertIsNone(data['next'])
+            self.assertEqual(self.page(3)[0], 404)
+
+    def test_high_estimate_has_no_next_link_past_the_rows(self):
+        with mock.patch('books.pagination.estimate_query_count', return_value=1000):
+            status_code, data = self.page(2)
+            self.assertEqual(status_code, 200)
+            self.assertTrue(data['count_is_estimated'])
+            self.assertIsNone(data['next'])
+            self.assertEqual(self.page(4)[0], 404)
+
+
+class MetricsAccessTests(BooksAPITestCase):
+
+    def test_anonymous_local_requests_are_refused(self):
+        self.assertEqual(self.client.get('/api/metrics/', REMOTE_ADDR='127.0.0.1').status_code, 403)
+
+    @override_settings(BOOKS_METRICS_TOKEN='scrape-secret')
+    def test_token(self):
+        response = self.client.get('/api/metrics/', HTTP_AUTHORIZATION='Bearer scrape-secret')
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get('/api/metrics/', HTTP_AUTHORIZATION='Bearer wrong')
+        self.assertEqual(response.status_code, 403)
+
+    def test_staff(self):
+        staff = User.objects.create_user('editor', password='password123', is_staff=True)
+        self.client.force_login(staff)
+        self.assertEqual(self.client.get('/api/metrics/').status_code, 200)
+
+
+class MetricsMiddlewareTests(SimpleTestCase):
+
+    def bytes_sent(self, route):
+        key = ('books_http_response_bytes_total', (('method', 'GET'), ('route', route)))
+        return metrics.registry.collect().get(key, 0)
+
+    def serve(self, route, response):
+        request = RequestFactory().get('/')
+        request.metrics_route = route
+        return metrics.MetricsMiddleware(lambda request: response)(request)
+
+    def test_registry_stays_in_memory(self):
+        self.assertIsNone(metrics.registry.path)
+
+    def test_streamed_bytes_are_counted_once_sent(self):
+        response = self.serve('test-stream', StreamingHttpResponse(iter([b'abc', b'defg'])))
+        self.assertEqual(self.bytes_sent('test-stream'), 0)
+        self.assertEqual(b''.join(response.streaming_content), b'abcdefg')
+        self.assertEqual(self.bytes_sent('test-stream'), 7)
+
+    def test_file_responses_use_content_length(self):
+        response = self.serve('test-file', FileResponse(io.BytesIO(b'x' * 10)))
+        self.assertEqual(self.bytes_sent('test-file'), 10)
+        self.assertIsNotNone(response.file_to_stream)
+        response.close()
+
+
+class CoalescingTests(BooksAPITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.alice = User.objects.create_user('alice', password='password123')
+        cls.bob = User.objects.create_user('bob', password='password123')
+
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        overrides = self.settings(BOOKS_COALESCE=True, BOOKS_COALESCE_DIR=directory.name)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+    def get(self, user, **extra):
+        self.client.force_authenticate(user)
+        return self.client.get(f'/api/books/{self.book.pk}/', **extra)
+
+    def test_results_are_shared_per_user_only(self):
+        self.assertEqual(self.get(self.alice)['X-Coalesce'], 'computed')
+        replayed = self.get(self.alice)
+        self.assertEqual(replayed['X-Coalesce'], 'hit')
+        self.assertEqual(replayed.json()['id'], self.book.pk)
+        self.assertIn('Allow', replayed)
+        self.assertEqual(self.get(self.bob)['X-Coalesce'], 'computed')
+
+    def test_browsable_api_is_rendered_per_request(self):
+        for user in (self.alice, self.bob, self.alice):
+            response = self.get(user, HTTP_ACCEPT='text/html')
+            self.assertNotIn('X-Coalesce', response)
+            self.assertContains(response, user.username)
+            other = self.bob if user == self.alice else self.alice
+            self.assertNotContains(response, other.username)
+
+
+class SnapshotTests(BooksAPITestCase):
+
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        overrides = self.settings(
+            BOOKS_SNAPSHOT_DIR=directory.name,
+            BOOKS_SNAPSHOT_ORIGINS=['http://testserver'],
+            BOOKS_SNAPSHOT_MAX_PAGES=2,
+            BOOKS_COALESCE=True,
+            BOOKS_COALESCE_DIR=os.path.join(directory.name, 'coalesce'),
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+    def test_repeated_builds(self):
+        first = snapshots.rebuild()
+        second = snapshots.rebuild()
+        self.assertGreater(first, 0)
+        self.assertEqual(first, second)
+
+    def test_served_from_snapshot(self):
+        snapshots.rebuild()
+        with self.settings(BOOKS_SNAPSHOTS=True):
+            middleware = snapshots.SnapshotMiddleware(lambda request: HttpResponse('live'))
+        request = RequestFactory().get('/api/books/', HTTP_ACCEPT='application/json', HTTP_ACCEPT_ENCODING='gzip')
+        response = middleware(request)
+        self.assertEqual(response['X-Snapshot'], 'hit')
+        data = json.loads(gzip.decompress(b''.join(response.streaming_content)))
+        self.assertEqual(data['count'], 2)
+        response.close()
+
+    def test_reviews_keep_snapshots_serving(self):
+        snapshots.rebuild()
+        manifest_path = os.path.join(snapshots.snapshot_dir(), snapshots.MANIFEST)
+        user = User.objects.create_user('reader', password='password123')
+        review = Review.objects.create(book=self.book, user=user, rating=4, comment='Good')
+        review.delete()
+        self.assertTrue(os.path.exists(manifest_path))
+        self.book.save()
+        self.assertFalse(os.path.exists(manifest_path))
+
+    def test_only_builder_file_names_are_served(self):
+        snapshots.rebuild()
+        manifest_path = os.path.join(snapshots.snapshot_dir(), snapshots.MANIFEST)
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        for entry in manifest['entries'].values():
+            entry['file'] = '../../etc/passwd'
+        with open(manifest_path, 'w') as f:
+            json.dump(manifest, f)
+        with self.settings(BOOKS_SNAPSHOTS=True):
+            middleware = snapshots.SnapshotMiddleware(lambda request: HttpResponse('live'))
+        request = RequestFactory().get('/api/books/', HTTP_ACCEPT='application/json', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(middleware(request).content, b'live')
+
+
+class RatingHistogramTests(BooksAPITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.user = User.objects.create_user('reader', password='password123')
+
+    def histogram(self):
+        self.book.refresh_from_db()
+        return [getattr(self.book, field) for field in Book.RATING_FIELDS]
+
+    def test_deferred_reviews_load_and_save(self):
+        Review.objects.create(book=self.book, user=self.user, rating=4, comment='Good')
+        self.assertEqual(len(list(Review.objects.only('id'))), 1)
+        review = Review.objects.defer('rating').get()
+        review.rating = 2
+        review.save()
+        self.assertEqual(self.histogram(), [0, 1, 0, 0, 0])
+        review = Review.objects.only('comment').get()
+        review.comment = 'Still fine'
+        review.save()
+        self.assertEqual(self.histogram(), [0, 1, 0, 0, 0])
+        Review.objects.only('id').get().delete()
+        self.assertEqual(self.histogram(), [0, 0, 0, 0, 0])
+
+    def test_saving_a_stale_book_keeps_the_counters(self):
+        stale = Book.objects.get(pk=self.book.pk)
+        Review.objects.create(book=self.book, user=self.user, rating=5, comment='Great')
+        stale.price = '11.99'
+        stale.save()
+        self.assertEqual(self.histogram(), [0, 0, 0, 0, 1])
+        self.assertEqual(str(self.book.price), '11.99')
+
+
+
+class CoalescingDirectoryTests(SimpleTestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.root = directory.name
+
+    def test_results_round_trip_as_json(self):
+        store = ResultStore(private_dir(os.path.join(self.root, 'results'), 'unused'))
+        store.write('a' * 32, {'stale_until': time.time() + 60, 'status': 200,
+                               'headers': [['Allow', 'GET']], 'content': b'{"x": 1}'})
+        self.assertEqual(store.read('a' * 32)['content'], b'{"x": 1}')
+        with open(os.path.join(store.directory, 'b' * 32 + '.result'), 'wb') as f:
+            f.write(b'\x80\x04not json')
+        self.assertIsNone(store.read('b' * 32))
+
+    def test_shared_directories_are_refused(self):
+        shared = os.path.join(self.root, 'shared')
+        os.mkdir(shared)
+        os.chmod(shared, 0o777)
+        with self.assertRaises(ImproperlyConfigured):
+            private_dir(shared, 'unused')
+        self.assertEqual(os.stat(private_dir(os.path.join(self.root, 'new'), 'unused')).st_mode & 0o777, 0o700)
+
+
+class BookAdminActionTests(BooksAPITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.admin = User.objects.create_superuser('admin', 'admin@example.com', 'password123')
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.admin)
+
+    def run_action(self, action, **data):
+        return self.client.post('/admin/books/book/', {
+            'action': action, '_selected_action': [self.book.pk], 'index': 0, **data,
+        })
+
+    def test_availability_actions(self):
+        self.run_action('mark_unavailable')
+        self.book.refresh_from_db()
+        self.assertFalse(self.book.is_available)
+        self.run_action('toggle_availability')
+        self.book.refresh_from_db()
+        self.assertTrue(self.book.is_available)
+        self.run_action('mark_unavailable')
+        self.run_action('mark_available')
+        self.book.refresh_from_db()
+        self.assertTrue(self.book.is_available)
+        self.other_book.refresh_from_db()
+        self.assertTrue(self.other_book.is_available)
+
+    def test_reprice(self):
+        self.run_action('reprice', percent='10')
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.price, Decimal('12.09'))
+
+    def test_reprice_rejects_bad_percentages(self):
+        for percent in ['', 'abc', '-100']:
+            response = self.run_action('reprice', percent=percent)
+            self.assertEqual(response.status_code, 302)
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.price, Decimal('10.99'))
+
+    def test_actions_invalidate_cached_data(self):
+        self.assertTrue(entity_cache.books.get(self.book.pk).is_available)
+        self.assertEqual(author_stats.get_stats([self.author.pk])[self.author.pk]['max_price'], '10.99')
+        version = cache.get(COUNT_VERSION_KEY)
+        self.run_action('reprice', percent='10')
+        self.run_action('mark_unavailable')
+        self.assertFalse(entity_cache.books.get(self.book.pk).is_available)
+        self.assertEqual(author_stats.get_stats([self.author.pk])[self.author.pk]['max_price'], '12.09')
+        self.assertNotEqual(cache.get(COUNT_VERSION_KEY), version)
+
+    def test_estimated_paginator(self):
+        self.book.delete()
+        with self.settings(BOOKS_COUNT_ESTIMATE_THRESHOLD=0):
+            unfiltered = EstimatedCountPaginator(Book.objects.all(), 10)
+            self.assertEqual(unfiltered.count, estimate_row_count(Book))
+            self.assertGreater(unfiltered.count, 1)
+            self.assertEqual(EstimatedCountPaginator(Book.objects.filter(genre='fiction'), 10).count, 1)
+        self.assertEqual(EstimatedCountPaginator(Book.objects.all(), 10).count, 1)
+
+
+@mock.patch('books.review_import.submit', side_effect=review_import.run)
+class ReviewImportTests(BooksAPITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.staff = User.objects.create_user('editor', password='password123', is_staff=True)
+        cls.reader = User.objects.create_user('reader', password='password123')
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.staff)
+
+    def import_reviews(self, data):
+        response = self.client.post('/api/reviews/import/', data, format='json')
+        self.assertEqual(response.status_code, 202)
+        status_response = self.client.get(f"/api/reviews/import/{response.data['job']}/")
+        self.assertEqual(status_response.status_code, 200)
+        return status_response.data
+
+    def test_valid_and_rejected_rows(self, submit):
+        job = self.import_reviews([
+            {'book': self.book.pk, 'user': self.reader.pk, 'rating': 5, 'comment': 'Great'},
+            {'isbn': self.other_book.isbn, 'username': 'editor', 'rating': 4.0, 'comment': 'Good'},
+            {'book': self.other_book.pk, 'user': self.reader.pk, 'rating': 3.7, 'comment': 'Fine'},
+            {'book': 999999, 'user': self.reader.pk, 'rating': 3, 'comment': 'Lost'},
+            {'book': self.other_book.pk, 'username': 'reader', 'rating': 3, 'comment': ' '},
+            {'book': self.book.pk, 'username': 'reader', 'rating': 1, 'comment': 'Again'},
+            'not a row',
+        ])
+        self.assertEqual(job['status'], 'done')
+        self.assertEqual((job['total'], job['processed']), (7, 7))
+        self.assertEqual((job['created'], job['updated'], job['skipped'], job['failed']), (2, 0, 0, 5))
+        self.assertEqual([error['row'] for error in job['errors']], [2, 3, 4, 5, 6])
+        self.assertIn('rating', job['errors'][0]['errors'])
+        self.assertEqual(Review.objects.get(book=self.book).rating, 5)
+        self.other_book.refresh_from_db()
+        self.assertEqual(self.other_book.rating_4, 1)
+
+    def test_conflicts_update_or_skip(self, submit):
+        Review.objects.create(book=self.book, user=self.reader, rating=2, comment='Meh')
+        row = {'book': self.book.pk, 'user': self.reader.pk, 'rating': 5, 'comment': 'Better on rereading'}
+        job = self.import_reviews({'reviews': [row], 'on_conflict': 'skip'})
+        self.assertEqual((job['created'], job['skipped']), (0, 1))
+        self.assertEqual(Review.objects.get().rating, 2)
+        job = self.import_reviews({'reviews': [row]})
+        self.assertEqual((job['created'], job['updated']), (0, 1))
+        self.assertEqual(Review.objects.get().rating, 5)
+        self.book.refresh_from_db()
+        self.assertEqual((self.book.rating_2, self.book.rating_5), (0, 1))
+        self.assertEqual(self.book.average_rating, 5.0)
+
+    def test_rejected_submissions(self, submit):
+        for data in [[], {'reviews': 'x'}, {'reviews': [{}], 'on_conflict': 'merge'}, 'text']:
+            response = self.client.post('/api/reviews/import/', data, format='json')
+            self.assertEqual(response.status_code, 400)
+        self.client.force_authenticate(self.reader)
+        self.assertEqual(self.client.post('/api/reviews/import/', [{}], format='json').status_code, 403)
+        submit.assert_not_called()
+
+
+class IdempotentCreateTests(BooksAPITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.user = User.objects.create_user('reader', password='password123')
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.user)
+
+    def post(self, key, **data):
+        body = {'book': self.book.pk, 'rating': 4, 'comment': 'Good', **data}
+        return self.client.post('/api/reviews/', body, format='json', HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_retry_replays_the_first_response(self):
+        first = self.post('retry-1')
+        self.assertEqual(first.status_code, 201)
+        second = self.post('retry-1')
+        self.assertEqual(second.status_code, 201)
+        self.assertEqual(second['Idempotent-Replayed'], 'true')
+        self.assertEqual(second.data['id'], first.data['id'])
+        self.assertEqual(Review.objects.count(), 1)
+
+    def test_key_reused_with_a_different_body(self):
+        self.assertEqual(self.post('retry-2').status_code, 201)
+        response = self.post('retry-2', rating=1)
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(Review.objects.get().rating, 4)
+
+    def test_failed_requests_can_be_retried(self):
+        self.assertEqual(self.post('retry-3', rating=9).status_code, 400)
+        self.assertEqual(self.post('retry-3').status_code, 201)
+
+
+class QueryBudgetTests(BooksAPITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.user = User.objects.create_user('reader', password='password123')
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.user)
+        overrides = self.settings(BOOKS_QUERY_BUDGET=1e-9)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+    def test_reads_over_budget_get_503(self):
+        response = self.client.get('/api/authors/')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.data['detail'].code, 'query_budget_exceeded')
+
+    def test_writes_are_not_budgeted(self):
+        response = self.client.post('/api/authors/', {'name': 'Toni Morrison', 'email': 'morrison@example.com'},
+                                    format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(Author.objects.filter(email='morrison@example.com').exists())
+
+
+class BookFilterTests(BooksAPITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.readers = [User.objects.create_user(f'reader{n}', password='password123') for n in range(3)]
+        for reader, rating in zip(cls.readers, [5, 4, 4]):
+            Review.objects.create(book=cls.book, user=reader, rating=rating, comment='Good')
+        Review.objects.create(book=cls.other_book, user=cls.readers[0], rating=2, comment='Slow')
+
+    def ids(self, **params):
+        response = self.client.get('/api/books/', params)
+        self.assertEqual(response.status_code, 200)
+        return {book['id'] for book in response.data['results']}
+
+    def test_rating_bounds_use_the_stored_average(self):
+        self.book.refresh_from_db()
+        self.assertAlmostEqual(self.book.average_rating, 13 / 3)
+        self.assertEqual(self.ids(min_rating=4), {self.book.pk})
+        self.assertEqual(self.ids(max_rating=3), {self.other_book.pk})
+        self.assertEqual(self.ids(min_rating=2, max_rating=4.5), {self.book.pk, self.other_book.pk})
+        self.assertNotIn('JOIN', str(Book.objects.filter(average_rating__gte=4).query))
+
+    def test_average_follows_review_changes(self):
+        review = Review.objects.get(book=self.other_book)
+        review.rating = 5
+        review.save()
+        self.assertEqual(self.ids(min_rating=4.5), {self.other_book.pk})
+        review.delete()
+        self.other_book.refresh_from_db()
+        self.assertIsNone(self.other_book.average_rating)
+        self.assertEqual(self.ids(max_rating=5), {self.book.pk})
+
+    def test_book_saves_keep_the_average(self):
+        stale = Book.objects.get(pk=self.other_book.pk)
+        Review.objects.create(book=self.other_book, user=self.readers[1], rating=4, comment='Better')
+        stale.save()
+        self.other_book.refresh_from_db()
+        self.assertEqual(self.other_book.average_rating, 3.0)
+
+    def test_repair_recomputes_the_average(self):
+        Book.objects.update(average_rating=None)
+        call_command('repair_rating_histograms', stdout=io.StringIO())
+        self.other_book.refresh_from_db()
+        self.assertEqual(self.other_book.average_rating, 2.0)
+
+    def test_other_filters(self):
+        self.assertEqual(self.ids(genre=['fiction', 'mystery']), {self.book.pk, self.other_book.pk})
+        self.assertEqual(self.ids(min_price='11'), {self.other_book.pk})
+        self.assertEqual(self.ids(max_price='11', min_rating=1), {self.book.pk})
+
+    def test_unknown_genre(self):
+        response = self.client.get('/api/books/', {'genre': 'cookbooks'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('genre', response.data)
+
+
+class WarmUpTests(BooksAPITestCase):
+
+    def test_warm_up_stages(self):
+        timings = warmup.warm_up()
+        self.assertEqual(set(timings), {'url_resolver', 'viewsets', 'autocomplete_index', 'total'})
+
+    def test_migrations_are_only_checked_when_enabled(self):
+        with mock.patch('books.warmup._pending_migrations', return_value=['books.9999_next']) as pending:
+            self.assertIsNotNone(warmup.warm_up_on_startup())
+            pending.assert_not_called()
+            with self.settings(BOOKS_WARM_UP_CHECK_MIGRATIONS=True), self.assertLogs('books.warmup', 'WARNING'):
+                self.assertIsNone(warmup.warm_up_on_startup())
+
+    def test_database_errors_are_logged(self):
+        with mock.patch('books.warmup.warm_up', side_effect=DatabaseError('no such table')), \
+                self.assertLogs('books.warmup', 'ERROR'):
+            self.assertIsNone(warmup.warm_up_on_startup())
+
+
+class FacetTests(BooksAPITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        Book.objects.create(
+            title='Go Set a Watchman', author=cls.other_author, isbn='9780062409850',
+            publication_date=date(2015, 7, 14), pages=278, genre='mystery', description='Sequel',
+            price='14.99', is_available=False,
+        )
+
+    def facets(self, **params):
+        response = self.client.get('/api/books/', {'facets': 'genre,is_available,author', **params})
+        self.assertEqual(response.status_code, 200)
+        return {
+            facet: {entry['value']: entry['count'] for entry in entries if entry['count']}
+            for facet, entries in response.data['facets'].items()
+        }
+
+    def test_counts_ignore_their_own_filter(self):
+        counts = self.facets(genre='fiction')
+        self.assertEqual(counts['genre'], {'fiction': 2, 'mystery': 1})
+        self.assertEqual(counts['is_available'], {True: 2})
+        self.assertEqual(counts['author'], {self.author.pk: 1, self.other_author.pk: 1})
+
+        counts = self.facets(author=self.other_author.pk, min_price='13')
+        self.assertEqual(counts['genre'], {'mystery': 1})
+        self.assertEqual(counts['is_available'], {False: 1})
+        self.assertEqual(counts['author'], {self.other_author.pk: 1})
+
+    def test_cached_counts_skip_the_filters(self):
+        with mock.patch('books.facets._base_queryset', wraps=facets._base_queryset) as base:
+            first = self.facets(search='mockingbird')
+            self.assertEqual(base.call_count, 1)
+            # Parameter order and pagination do not change the cache entry
+            self.assertEqual(self.facets(page=1, search='mockingbird'), first)
+            self.assertEqual(base.call_count, 1)
+        self.assertEqual(first['author'], {self.other_author.pk: 1})
+
+    def test_writes_refresh_the_counts(self):
+        self.assertEqual(self.facets()['is_available'], {True: 2, False: 1})
+        self.book.is_available = False
+        self.book.save()
+        self.assertEqual(self.facets()['is_available'], {True: 1, False: 2})
+
+
+class ConcurrencyLimitTests(SimpleTestCase):
+
+    @override_settings(BOOKS_CONCURRENCY_LIMITS={'cheap': 1}, BOOKS_CONCURRENCY_QUEUE_TIMEOUT=0)
+    def test_requests_over_the_limit_are_shed(self):
+        middleware = ConcurrencyLimitMiddleware(lambda request: HttpResponse('ok'))
+        request = RequestFactory().get('/api/books/')
+        request.resolver_match = resolve('/api/books/')
+        self.assertIsNone(middleware.process_view(request, None, (), {}))
+
+        shed = RequestFactory().get('/api/books/')
+        shed.resolver_match = request.resolver_match
+        response = middleware.process_view(shed, None, (), {})
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '1')
+
+        middleware(request)
+        self.assertIsNone(middleware.process_view(shed, None, (), {}))
+
+    def test_a_grown_limit_wakes_every_waiter_it_can_admit(self):
+        limiter = AdaptiveLimiter(2)
+        self.assertTrue(limiter.acquire(0) and limiter.acquire(0))
+        admitted = []
+        waiters = [threading.Thread(target=lambda: admitted.append(limiter.acquire(5))) for _ in range(2)]
+        for waiter in waiters:
+            waiter.start()
+        deadline = time.monotonic() + 5
+        while limiter.waiting < 2 and time.monotonic() < deadline:
+            time.sleep(0.001)
+        with limiter._condition:
+            limiter.limit = 4
+        limiter.release()
+        for waiter in waiters:
+            waiter.join(1)
+        self.assertEqual(admitted, [True, True])
+
+
+@override_settings(BOOKS_SLOW_QUERY_MS=0)
+class SlowQueryTests(BooksAPITestCase):
+
+    def serve(self, view):
+        request = RequestFactory().get('/api/books/')
+        request.resolver_match = resolve('/api/books/')
+        return SlowQueryMiddleware(view)(request)
+
+    def test_queries_are_recorded_once_the_response_is_closed(self):
+        def view(request):
+            list(Book.objects.all())
+            self.assertFalse(SlowQuery.objects.exists())
+            return HttpResponse('ok')
+
+        response = self.serve(view)
+        self.assertFalse(SlowQuery.objects.exists())
+        response.close()
+        recorded = SlowQuery.objects.get(sql__contains='"books_book"')
+        self.assertEqual(recorded.calls, 1)
+        self.assertEqual(recorded.view, 'books:book-list')
+        self.assertTrue(recorded.explain)
+
+    def test_a_rolled_back_request_keeps_its_records(self):
+        def view(request):
+            with transaction.atomic():
+                list(Book.objects.all())
+                transaction.set_rollback(True)
+            return HttpResponse('error', status=500)
+
+        self.serve(view).close()
+        self.assertTrue(SlowQuery.objects.filter(sql__contains='"books_book"').exists())
+
+
+class ProfilingTests(BooksAPITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.middleware = ProfilingMiddleware(lambda request: HttpResponse('ok'))
+
+    def profile(self, mode):
+        request = RequestFactory().get('/api/books/', {'profile': mode})
+        request.user = User(username='staff', is_staff=True)
+        return self.middleware(request)
+
+    def test_summary_replaces_the_response(self):
+        response = self.profile('summary')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content)['status_code'], 200)
+
+    def test_unknown_modes_are_rejected(self):
+        response = self.profile('sumary')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('error', json.loads(response.content))
+
+    def test_concurrent_profiles_get_a_conflict(self):
+        with ProfilingMiddleware._active:
+            self.assertEqual(self.profile('summary').status_code, 409)
+        with mock.patch('cProfile.Profile.enable', side_effect=ValueError('Another profiling tool is already active')):
+            self.assertEqual(self.profile('summary').status_code, 409)
+        self.assertEqual(self.profile('summary').status_code, 200)
+
+    @override_settings(BOOKS_PROFILE_SAMPLE_RATE=1.0, BOOKS_PROFILE_DIR='unused')
+    def test_sampled_requests_skip_profiling_while_busy(self):
+        middleware = ProfilingMiddleware(lambda request: HttpResponse('ok'))
+        with ProfilingMiddleware._active:
+            response = middleware(RequestFactory().get('/api/books/'))
+        self.assertEqual(response.content, b'ok')
+        self.assertNotIn('X-Profile-Id', response)
+
+
+class ImportCatalogTests(BooksAPITestCase):
+
+    def row(self, isbn, email, **fields):
+        return {
+            'title': 'Imported', 'isbn': isbn, 'publication_date': '2001-01-01', 'pages': 100,
+            'genre': 'fiction', 'description': 'Imported book', 'price': '9.99',
+            'author_name': email.split('@')[0].title(), 'author_email': email, **fields,
+        }
+
+    def run_import(self, *rows):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'feed.jsonl')
+            with open(path, 'w') as feed:
+                feed.writelines(json.dumps(row) + '\n' for row in rows)
+            out = io.StringIO()
+            call_command('import_catalog', path, stdout=out)
+        return out.getvalue()
+
+    def test_entity_cache_is_invalidated_on_commit(self):
+        entity_cache.books.get_many([self.book.pk])
+        row = self.row(self.book.isbn, self.author.email, title='The Great Gatsby (Revised)')
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.run_import(row)
+        self.assertEqual(entity_cache.books.get_many([self.book.pk])[self.book.pk].title, 'The Great Gatsby')
+        for callback in callbacks:
+            callback()
+        self.assertEqual(entity_cache.books.get_many([self.book.pk])[self.book.pk].title, 'The Great Gatsby (Revised)')
+
+    def test_new_authors_are_created_and_counted(self):
+        output = self.run_import(self.row('9780000000001', 'new@example.com'), self.row('9780000000002', self.author.email))
+        self.assertIn('created 1 author(s)', output)
+        self.assertEqual(Book.objects.get(isbn='9780000000001').author.name, 'New')
+
+    def test_authors_created_concurrently_are_not_counted(self):
+        lookup, raced = Author.objects.filter, []
+
+        def lose_race(*args, **kwargs):
+            # Another import commits the first author right after the lookup
+            existing = list(lookup(*args, **kwargs))
+            if not raced:
+                raced.append(Author.objects.create(name='Elsewhere', email='a@example.com'))
+            return existing
+
+        with mock.patch.object(Author.objects, 'filter', side_effect=lose_race):
+            output = self.run_import(self.row('9780000000001', 'a@example.com'), self.row('9780000000002', 'b@example.com'))
+        self.assertIn('created 1 author(s)', output)
+        self.assertEqual(Book.objects.get(isbn='9780000000001').author.name, 'Elsewhere')
+        self.assertEqual(Book.objects.filter(author__email__in=['a@example.com', 'b@example.com']).count(), 2)
+
+
+class ColumnarRendererTests(BooksAPITestCase):
+
+    def test_book_list_round_trips(self):
+        rows = json.loads(self.client.get('/api/books/').content)['results']
+        response = self.client.get('/api/books/', {'format': 'columnar'})
+        self.assertEqual(response['Content-Type'], COLUMNAR_MEDIA_TYPE)
+        table = json.loads(response.content)['results']
+        self.assertEqual(table['dictionaries']['genre'], ['fiction'])
+        self.assertEqual(decode_columnar(table), rows)
+
+    def test_encoding_round_trips(self):
+        rows = [
+            {'id': 1, 'genre': 'fiction', 'rating': None},
+            {'id': 2, 'genre': None, 'rating': 4.5},
+            {'id': 3, 'genre': 'fiction', 'rating': 3.0},
+        ]
+        table = encode_columnar(rows, {'genre'})
+        self.assertEqual(table['columns']['genre'], [0, 1, 0])
+        self.assertEqual(decode_columnar(json.loads(json.dumps(table))), rows)
+        self.assertEqual(decode_columnar(encode_columnar([], {'genre'})), [])
+        self.assertEqual(decode_columnar(encode_columnar([{}, {}])), [{}, {}])
@@ -0,0 +1,117 @@
+"""
+Trending books from time-bucketed review counters.
+
+Every review is counted in one hourly and one daily ReviewBucket of its
+book (number of reviews and sum of their ratings). The 24h window adds up
+hourly buckets and the 7d/30d windows daily buckets, so rankings never
+scan the Review table. Windows are aligned to whole buckets.
+
+Books are ranked by the sum of ratings in the window, i.e. review volume
+weighted by stars, then by review count. Buckets older than the longest
+window they serve are deleted once per bucket period by the process that
+opens the next bucket.
+"""
+from datetime import timedelta, timezone as dt_timezone
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDay, TruncHour
+from django.utils import timezone
+from .models import Review, ReviewBucket
+
+HOUR, DAY = ReviewBucket.HOUR, ReviewBucket.DAY
+WINDOWS = {
+    '24h': (HOUR, timedelta(hours=24)),
+    '7d': (DAY, timedelta(days=7)),
+    '30d': (DAY, timedelta(days=30)),
+}
+RETENTION = {
+    HOUR: timedelta(hours=25),
+    DAY: timedelta(days=31),
+}
+
+_last_pruned = {}
+
+
+def bucket_start(moment, granularity):
+    moment = moment.astimezone(dt_timezone.utc).replace(minute=0, second=0, microsecond=0)
+    if granularity == DAY:
+        moment = moment.replace(hour=0)
+    return moment
+
+
+def adjust(book_id, created_at, reviews, rating_sum):
+    """Add ``reviews``/``rating_sum`` to the buckets covering ``created_at``"""
+    now = timezone.now()
+    for granularity in (HOUR, DAY):
+        start = bucket_start(created_at, granularity)
+        if start < now - RETENTION[granularity]:
+            continue
+        buckets = ReviewBucket.objects.filter(book_id=book_id, granularity=granularity, start=start)
+        if reviews < 0:
+            buckets = buckets.filter(reviews__gte=-reviews, rating_sum__gte=-rating_sum)
+        changes = {'reviews': F('reviews') + reviews, 'rating_sum': F('rating_sum') + rating_sum}
+        if buckets.update(**changes) or reviews <= 0:
+            continue
+        try:
+            with transaction.atomic():
+                ReviewBucket.objects.create(
+                    book_id=book_id, granularity=granularity, start=start,
+                    reviews=reviews, rating_sum=rating_sum,
+                )
+        except IntegrityError:
+            # Another writer opened the bucket first
+            buckets.update(**changes)
+        else:
+            _prune_once(granularity, start)
+
+
+def _prune_once(granularity, start):
+    if _last_pruned.get(granularity) != start:
+        prune(granularity)
+        _last_pruned[granularity] = start
+
+
+def prune(granularity, now=None):
+    """Delete buckets no window needs any more"""
+    cutoff = bucket_start((now or timezone.now()) - RETENTION[granularity], granularity)
+    ReviewBucket.objects.filter(granularity=granularity, start__lt=cutoff).delete()
+
+
+def trending(window='24h', genre=None, limit=10):
+    """
+    Return [{'book_id', 'reviews', 'rating_sum'}] for the top books of a
+    window ('24h', '7d' or '30d'), optionally within one genre.
+    """
+    granularity, span = WINDOWS[window]
+    buckets = ReviewBucket.objects.filter(
+        granularity=granularity, start__gte=bucket_start(timezone.now() - span, granularity)
+    )
+    if genre:
+        buckets = buckets.filter(book__genre=genre)
+    return list(
+        buckets.values('book_id')
+        .annotate(reviews=Sum('reviews'), rating_sum=Sum('rating_sum'))
+        .filter(reviews__gt=0)
+        .order_by('-rating_sum', '-reviews', 'book_id')[:limit]
+    )
+
+
+def rebuild(batch_size=1000):
+    """Recompute every bucket from Review.created_at; returns the number of buckets written"""
+    now = timezone.now()
+    rows = []
+    for granularity, trunc in ((HOUR, TruncHour), (DAY, TruncDay)):
+        cutoff = bucket_start(now - RETENTION[granularity], granularity)
+        counts = (
+            Review.objects.filter(created_at__gte=cutoff)
+            .annotate(start=trunc('created_at', tzinfo=dt_timezone.utc))
+            .values('book_id', 'start')
+            .annotate(reviews=Count('id'), rating_sum=Sum('rating'))
+            .order_by()
+        )
+        rows.extend(ReviewBucket(granularity=granularity, **row) for row in counts)
+    with transaction.atomic():
+        ReviewBucket.objects.all().delete()
+        ReviewBucket.objects.bulk_create(rows, batch_size=batch_size)
+    return len(rows)
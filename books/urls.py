@@ -14,4 +14,5 @@ urlpatterns = [
     path('', include(router.urls)),
     path('user/profile/', views.user_profile, name='user-profile'),
     path('overview/', views.api_overview, name='api-overview'),
+    path('metrics/', views.metrics, name='metrics'),
 ]
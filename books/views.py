@@ -1,18 +1,35 @@
+import hmac
+
 from rest_framework import generics, viewsets, filters, status
 from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated, IsAuthenticatedOrReadOnly
+from rest_framework.permissions import AllowAny, IsAdminUser, IsAuthenticated, IsAuthenticatedOrReadOnly
+from rest_framework.authtoken.serializers import AuthTokenSerializer
+from rest_framework.settings import api_settings
 from django_filters.rest_framework import DjangoFilterBackend
+from django.conf import settings
+from django.core import signing
 from django.contrib.auth.models import User
-from django.db.models import Q, Avg
-from .models import Author, Book, Review
+from django.http import HttpResponse, HttpResponseForbidden
+from django.db.models import Q
+from . import author_stats, facets, review_import, trending as trending_books
+from .autocomplete import index as autocomplete_index
+from .coalescing import CoalescedReadsMixin
+from .idempotency import IdempotentCreateMixin
+from .query_budget import QueryBudgetMixin
+from .renderers import ColumnarJSONRenderer
+from .authentication import decode_token, issue_token_pair, revoke_token
+from .metrics import registry, render_prometheus
+from .filters import BookFilter, FuzzySearchFilter, ReviewFilter
+from .models import Author, Book, Review, ReviewImportJob
+from .pagination import EstimatedCountPagination
 from .serializers import (
-    AuthorSerializer, BookSerializer, BookListSerializer, 
-    ReviewSerializer, UserSerializer
+    AuthorSerializer, BookSerializer, BookListSerializer, RefreshTokenSerializer,
+    ReviewImportJobSerializer, ReviewSerializer, RevokeTokenSerializer, UserSerializer
 )
 
 
-class AuthorViewSet(viewsets.ModelViewSet):
+class AuthorViewSet(QueryBudgetMixin, viewsets.ModelViewSet):
     """
     ViewSet for managing authors.
     Supports CRUD operations for authors.
@@ -20,10 +37,38 @@ class AuthorViewSet(viewsets.ModelViewSet):
     queryset = Author.objects.all()
     serializer_class = AuthorSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
-    filter_backends = [filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [filters.OrderingFilter, FuzzySearchFilter]
     search_fields = ['name', 'email']
     ordering_fields = ['name', 'created_at']
     ordering = ['name']
+    # Seconds of SQL per request (BOOKS_QUERY_BUDGET when None)
+    query_budget = None
+    action_query_budgets = {'stats_list': 5.0}
+
+    @action(detail=True, methods=['get'])
+    def stats(self, request, pk=None):
+        """Get catalog statistics for an author (books, reviews, rating, prices)"""
+        author = self.get_object()
+        return Response({'id': author.pk, **author_stats.get_stats([author.pk])[author.pk]})
+
+    @action(detail=False, methods=['get'], url_path='stats')
+    def stats_list(self, request):
+        """Get statistics for many authors (?ids=1,2,3, or the current page of authors)"""
+        if 'ids' in request.query_params:
+            try:
+                ids = [int(i) for i in request.query_params['ids'].split(',') if i]
+            except ValueError:
+                return Response({'error': 'ids must be a comma-separated list of author ids'}, 
+                              status=status.HTTP_400_BAD_REQUEST)
+            if not ids or len(ids) > 1000:
+                return Response({'error': 'Provide between 1 and 1000 author ids'}, 
+                              status=status.HTTP_400_BAD_REQUEST)
+            stats = author_stats.get_stats(ids)
+            return Response([{'id': pk, **stats[pk]} for pk in ids if pk in stats])
+
+        page = self.paginate_queryset(self.filter_queryset(self.get_queryset()).values_list('pk', flat=True))
+        stats = author_stats.get_stats(page)
+        return self.get_paginated_response([{'id': pk, **stats[pk]} for pk in page if pk in stats])
 
     @action(detail=True, methods=['get'])
     def books(self, request, pk=None):
@@ -34,18 +79,26 @@ class AuthorViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
 
 
-class BookViewSet(viewsets.ModelViewSet):
+class BookViewSet(QueryBudgetMixin, CoalescedReadsMixin, viewsets.ModelViewSet):
     """
     ViewSet for managing books.
     Supports CRUD operations, search, filtering, and custom actions.
     """
-    queryset = Book.objects.select_related('author').prefetch_related('reviews')
+    coalesce_actions = [
+        'list', 'retrieve', 'by_genre', 'popular', 'trending',
+        'rating_histograms', 'similar', 'reviews',
+    ]
+    queryset = Book.objects.all()
     permission_classes = [IsAuthenticatedOrReadOnly]
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
-    filterset_fields = ['genre', 'author', 'is_available']
+    renderer_classes = [*api_settings.DEFAULT_RENDERER_CLASSES, ColumnarJSONRenderer]
+    pagination_class = EstimatedCountPagination
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter, FuzzySearchFilter]
+    filterset_class = BookFilter
     search_fields = ['title', 'author__name', 'description', 'isbn']
     ordering_fields = ['title', 'publication_date', 'price', 'created_at']
     ordering = ['-created_at']
+    query_budget = None
+    action_query_budgets = {'popular': 5.0, 'trending': 5.0}
 
     def get_serializer_class(self):
         """Use different serializers for list and detail views"""
@@ -53,6 +106,25 @@ class BookViewSet(viewsets.ModelViewSet):
             return BookListSerializer
         return BookSerializer
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.get_serializer_class() is BookSerializer:
+            # Its average_rating and reviews_count read the reviews
+            queryset = queryset.prefetch_related('reviews')
+        return queryset
+
+    def list(self, request, *args, **kwargs):
+        """List books; ?facets=genre,is_available,author adds counts per facet value"""
+        try:
+            facet_names = facets.parse(request.query_params.get('facets', ''))
+        except ValueError as exc:
+            return Response({'error': str(exc)}, 
+                          status=status.HTTP_400_BAD_REQUEST)
+        response = super().list(request, *args, **kwargs)
+        if facet_names:
+            response.data['facets'] = facets.facet_counts(self, request, facet_names)
+        return response
+
     @action(detail=False, methods=['get'])
     def by_genre(self, request):
         """Get books grouped by genre"""
@@ -68,13 +140,83 @@ class BookViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'])
     def popular(self, request):
         """Get popular books (highest rated)"""
-        books = self.queryset.annotate(
-            avg_rating=Avg('reviews__rating')
-        ).filter(avg_rating__gte=4).order_by('-avg_rating')[:10]
+        books = self.queryset.filter(average_rating__gte=4).order_by('-average_rating')[:10]
         
         serializer = BookListSerializer(books, many=True, context={'request': request})
         return Response(serializer.data)
 
+    @action(detail=False, methods=['get'])
+    def trending(self, request):
+        """Get books trending over a window (?window=24h|7d|30d, optional ?genre= and ?limit=1..100)"""
+        window = request.query_params.get('window', '24h')
+        if window not in trending_books.WINDOWS:
+            return Response({'error': f"window must be one of {', '.join(trending_books.WINDOWS)}"}, 
+                          status=status.HTTP_400_BAD_REQUEST)
+        genre = request.query_params.get('genre')
+        if genre and genre not in dict(Book.GENRE_CHOICES):
+            return Response({'error': f'Unknown genre: {genre}'}, 
+                          status=status.HTTP_400_BAD_REQUEST)
+        try:
+            limit = int(request.query_params.get('limit', 10))
+        except ValueError:
+            limit = 10
+        limit = max(1, min(limit, 100))
+
+        ranking = trending_books.trending(window, genre=genre, limit=limit)
+        books = Book.objects.in_bulk([row['book_id'] for row in ranking])
+        results = []
+        for row in ranking:
+            data = BookListSerializer(books[row['book_id']], context={'request': request}).data
+            data['window_reviews'] = row['reviews']
+            data['window_average_rating'] = round(row['rating_sum'] / row['reviews'], 2)
+            results.append(data)
+        return Response({'window': window, 'genre': genre, 'results': results})
+
+    @action(detail=False, methods=['get'])
+    def rating_histograms(self, request):
+        """Get the 1-5 star rating histograms of many books (?ids=1,2,3)"""
+        try:
+            ids = [int(i) for i in request.query_params.get('ids', '').split(',') if i]
+        except ValueError:
+            return Response({'error': 'ids must be a comma-separated list of book ids'}, 
+                          status=status.HTTP_400_BAD_REQUEST)
+        if not ids or len(ids) > 1000:
+            return Response({'error': 'Provide between 1 and 1000 book ids'}, 
+                          status=status.HTTP_400_BAD_REQUEST)
+
+        rows = Book.objects.filter(pk__in=ids).values_list('pk', *Book.RATING_FIELDS)
+        histograms = {
+            str(pk): {str(star): count for star, count in enumerate(counts, start=1)}
+            for pk, *counts in rows
+        }
+        return Response(histograms)
+
+    @action(detail=False, methods=['get'])
+    def autocomplete(self, request):
+        """Typeahead suggestions matching the start of any word in title, author or ISBN (?q=)"""
+        query = request.query_params.get('q', '')
+        try:
+            limit = min(int(request.query_params.get('limit', 10)), 50)
+        except ValueError:
+            return Response({'error': 'limit must be an integer'}, 
+                          status=status.HTTP_400_BAD_REQUEST)
+
+        autocomplete_index.ensure_current()
+        suggestions = [
+            {'id': pk, 'title': title, 'author_name': author_name, 'isbn': isbn, 'popularity': popularity}
+            for pk, title, author_name, isbn, popularity in autocomplete_index.search(query, max(limit, 1))
+        ]
+        return Response(suggestions)
+
+    @action(detail=True, methods=['get'])
+    def similar(self, request, pk=None):
+        """Get books that readers of this book also reviewed (precomputed)"""
+        # Only the existence check; the neighbours come from one indexed query
+        book = generics.get_object_or_404(Book.objects.only('pk'), pk=pk)
+        books = Book.objects.filter(similar_to__book=book).order_by('similar_to__rank')
+        serializer = BookListSerializer(books, many=True, context={'request': request})
+        return Response(serializer.data)
+
     @action(detail=True, methods=['get'])
     def reviews(self, request, pk=None):
         """Get all reviews for a specific book"""
@@ -83,19 +225,53 @@ class BookViewSet(viewsets.ModelViewSet):
         serializer = ReviewSerializer(reviews, many=True, context={'request': request})
         return Response(serializer.data)
 
+    @action(detail=True, methods=['get', 'put'], url_path='my-review', permission_classes=[IsAuthenticated])
+    def my_review(self, request, pk=None):
+        """
+        The current user's review of this book. PUT creates or replaces it
+        through review_import.write_reviews(): in one transaction it locks
+        the book, reads the existing review, upserts it with INSERT ... ON
+        CONFLICT and applies the rating changes; the review is then read
+        back for the response. Retries are safe.
+        """
+        book = self.get_object()
+        if request.method == 'GET':
+            review = generics.get_object_or_404(Review, book=book, user=request.user)
+            return Response(ReviewSerializer(review, context={'request': request}).data)
 
-class ReviewViewSet(viewsets.ModelViewSet):
+        if not isinstance(request.data, dict):
+            return Response({'error': 'Expected an object with "rating" and "comment"'},
+                          status=status.HTTP_400_BAD_REQUEST)
+        # copy() keeps form data (a QueryDict) one value per field
+        data = request.data.copy()
+        data['book'] = book.pk
+        serializer = ReviewSerializer(data=data, context={'request': request})
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        created, _updated, _skipped = review_import.write_reviews([
+            ((book.pk, request.user.pk), data['rating'], data['comment']),
+        ])
+        review = Review.objects.select_related('user').get(book=book, user=request.user)
+        return Response(ReviewSerializer(review, context={'request': request}).data,
+                      status=status.HTTP_201_CREATED if created else status.HTTP_200_OK)
+
+
+class ReviewViewSet(QueryBudgetMixin, IdempotentCreateMixin, viewsets.ModelViewSet):
     """
     ViewSet for managing book reviews.
     Users can only edit/delete their own reviews.
     """
-    queryset = Review.objects.select_related('book', 'user')
+    queryset = Review.objects.select_related('user')
     serializer_class = ReviewSerializer
     permission_classes = [IsAuthenticated]
+    renderer_classes = [*api_settings.DEFAULT_RENDERER_CLASSES, ColumnarJSONRenderer]
+    pagination_class = EstimatedCountPagination
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
-    filterset_fields = ['book', 'rating']
+    filterset_class = ReviewFilter
     ordering_fields = ['rating', 'created_at']
     ordering = ['-created_at']
+    query_budget = None
+    action_query_budgets = {}
 
     def get_queryset(self):
         """Filter reviews based on query parameters"""
@@ -103,7 +279,7 @@ class ReviewViewSet(viewsets.ModelViewSet):
         
         # Filter by user's own reviews if requested
         if self.request.query_params.get('my_reviews') == 'true':
-            queryset = queryset.filter(user=self.request.user)
+            queryset = queryset.filter(user_id=self.request.user.pk)
         
         return queryset
 
@@ -125,6 +301,45 @@ class ReviewViewSet(viewsets.ModelViewSet):
             raise PermissionDenied("You can only delete your own reviews.")
         instance.delete()
 
+    @action(detail=False, methods=['post'], url_path='import', permission_classes=[IsAdminUser])
+    def bulk_import(self, request):
+        """Queue a batch of reviews for background import; returns 202 with the job id"""
+        data = request.data
+        if isinstance(data, list):
+            rows, on_conflict = data, ReviewImportJob.UPDATE
+        elif isinstance(data, dict):
+            rows, on_conflict = data.get('reviews'), data.get('on_conflict', ReviewImportJob.UPDATE)
+        else:
+            rows, on_conflict = None, None
+        if not isinstance(rows, list) or not rows:
+            return Response({'error': 'Send a non-empty list of reviews, or {"reviews": [...]}'}, 
+                          status=status.HTTP_400_BAD_REQUEST)
+        max_rows = getattr(settings, 'BOOKS_INGEST_MAX_ROWS', 100000)
+        if len(rows) > max_rows:
+            return Response({'error': f'At most {max_rows} reviews per import'}, 
+                          status=status.HTTP_400_BAD_REQUEST)
+        if on_conflict not in dict(ReviewImportJob.CONFLICT_CHOICES):
+            return Response({'error': 'on_conflict must be "update" or "skip"'}, 
+                          status=status.HTTP_400_BAD_REQUEST)
+
+        job = ReviewImportJob.objects.create(
+            submitted_by=request.user, on_conflict=on_conflict, rows=rows, total=len(rows),
+        )
+        review_import.submit(job.pk)
+        return Response({
+            'job': str(job.pk),
+            'status': job.status,
+            'total': job.total,
+            'status_url': request.build_absolute_uri(f'{job.pk}/'),
+        }, status=status.HTTP_202_ACCEPTED)
+
+    @action(detail=False, methods=['get'], url_path=r'import/(?P<job_id>[0-9a-f-]{36})',
+            permission_classes=[IsAdminUser])
+    def import_status(self, request, job_id=None):
+        """Progress, counts and per-row errors of a bulk review import"""
+        job = generics.get_object_or_404(ReviewImportJob.objects.defer('rows'), pk=job_id)
+        return Response(ReviewImportJobSerializer(job).data)
+
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
@@ -134,6 +349,73 @@ def user_profile(request):
     return Response(serializer.data)
 
 
+@api_view(['POST'])
+@permission_classes([AllowAny])
+def signed_token_obtain(request):
+    """Exchange username/password for a signed access token and refresh token"""
+    serializer = AuthTokenSerializer(data=request.data, context={'request': request})
+    serializer.is_valid(raise_exception=True)
+    return Response(issue_token_pair(serializer.validated_data['user']))
+
+
+@api_view(['POST'])
+@permission_classes([AllowAny])
+def signed_token_refresh(request):
+    """Rotate a refresh token: the old one is revoked and a new pair is issued"""
+    serializer = RefreshTokenSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    try:
+        payload = decode_token(serializer.validated_data['refresh'], refresh=True)
+    except signing.BadSignature:
+        return Response({'error': 'Invalid or expired refresh token'},
+                      status=status.HTTP_401_UNAUTHORIZED)
+
+    user = User.objects.filter(pk=payload['u'], is_active=True).first()
+    if user is None:
+        return Response({'error': 'User is inactive or no longer exists'},
+                      status=status.HTTP_401_UNAUTHORIZED)
+    revoke_token(payload)
+    return Response(issue_token_pair(user))
+
+
+@api_view(['POST'])
+@permission_classes([AllowAny])
+def signed_token_revoke(request):
+    """Revoke an access or refresh token before it expires (logout)"""
+    serializer = RevokeTokenSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    token = serializer.validated_data['token']
+    for refresh in (False, True):
+        try:
+            payload = decode_token(token, refresh=refresh)
+        except signing.BadSignature:
+            continue
+        revoke_token(payload)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+    return Response({'error': 'Invalid or expired token'},
+                  status=status.HTTP_400_BAD_REQUEST)
+
+
+def _metrics_authorized(request):
+    if request.user.is_staff:
+        return True
+    token = getattr(settings, 'BOOKS_METRICS_TOKEN', None)
+    if token and hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return True
+    # REMOTE_ADDR is the proxy's address behind a reverse proxy; see README
+    return request.META.get('REMOTE_ADDR') in getattr(settings, 'BOOKS_METRICS_ALLOWED_IPS', [])
+
+
+def metrics(request):
+    """Prometheus text endpoint for per-route request and query metrics"""
+    if not _metrics_authorized(request):
+        return HttpResponseForbidden()
+    return HttpResponse(
+        render_prometheus(registry.collect()),
+        content_type='text/plain; version=0.0.4; charset=utf-8'
+    )
+
+
 @api_view(['GET'])
 def api_overview(request):
     """
@@ -145,26 +427,39 @@ def api_overview(request):
             'List/Create': '/api/authors/',
             'Detail/Update/Delete': '/api/authors/{id}/',
             'Author Books': '/api/authors/{id}/books/',
+            'Author Stats': '/api/authors/{id}/stats/',
+            'Many Authors Stats': '/api/authors/stats/?ids={id},{id}',
         },
         'Books': {
             'List/Create': '/api/books/',
             'Detail/Update/Delete': '/api/books/{id}/',
             'By Genre': '/api/books/by_genre/?genre={genre}',
             'Popular Books': '/api/books/popular/',
+            'Trending Books': '/api/books/trending/?window={24h|7d|30d}&genre={genre}',
             'Book Reviews': '/api/books/{id}/reviews/',
+            'My Review': '/api/books/{id}/my-review/',
+            'Similar Books': '/api/books/{id}/similar/',
+            'Rating Histograms': '/api/books/rating_histograms/?ids={id},{id}',
+            'Autocomplete': '/api/books/autocomplete/?q={prefix}',
         },
         'Reviews': {
             'List/Create': '/api/reviews/',
             'Detail/Update/Delete': '/api/reviews/{id}/',
             'My Reviews': '/api/reviews/?my_reviews=true',
+            'Bulk Import (staff)': '/api/reviews/import/',
+            'Import Status (staff)': '/api/reviews/import/{job_id}/',
         },
         'User': {
             'Profile': '/api/user/profile/',
         },
+        'Metrics': '/api/metrics/',
         'Authentication': {
             'Login': '/api/auth/login/',
             'Logout': '/api/auth/logout/',
             'Token': '/api/auth/token/',
+            'Signed Access Token': '/api/auth/access/',
+            'Refresh Signed Token': '/api/auth/refresh/',
+            'Revoke Signed Token': '/api/auth/revoke/',
             'Browsable API': '/api-auth/login/',
         },
         'Browsable API Access': {
@@ -0,0 +1,117 @@
+import logging
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DatabaseError, connections
+from django.db.migrations.executor import MigrationExecutor
+from django.http import HttpRequest
+from django.urls import get_resolver
+
+from .autocomplete import index as autocomplete_index
+from .urls import router
+
+logger = logging.getLogger('books.warmup')
+
+
+@contextmanager
+def _timed(timings, stage):
+    start = time.perf_counter()
+    yield
+    timings[stage] = round((time.perf_counter() - start) * 1000, 2)
+
+
+def _make_view(viewset, action):
+    """Instantiate a viewset for an action the way the router's view would"""
+    request = HttpRequest()
+    request.method = 'GET'
+    request.path = request.path_info = '/'
+    view = viewset(action_map={'get': action}, format_kwarg=None, args=(), kwargs={})
+    view.request = view.initialize_request(request)
+    return view
+
+
+def _warm_viewset(viewset):
+    """Build serializer fields and filter sets for every action of a viewset"""
+    actions = ['list', 'retrieve'] + [action.__name__ for action in viewset.get_extra_actions()]
+    for action in actions:
+        view = _make_view(viewset, action)
+        serializer_class = view.get_serializer_class()
+        serializer_class(context=view.get_serializer_context()).fields
+
+    # Runs the filter backends (django-filter builds its FilterSet class here)
+    # and one cheap query so the ORM compiles the list query path
+    view = _make_view(viewset, 'list')
+    list(view.filter_queryset(view.get_queryset())[:1])
+
+
+def warm_up():
+    """
+    Pay first-request costs up front: compile the URL resolver, build DRF
+    serializers and django-filter filter sets for every viewset in
+    books.views, and load the autocomplete index.
+
+    Database connections belong to the thread that opens them, and request
+    threads (threaded WSGI servers, ASGI) are not this one, so connections
+    opened here are closed again rather than kept for requests.
+
+    Call it once per worker process after the application is loaded (the
+    wsgi/asgi modules do this through warm_up_on_startup() when
+    BOOKS_WARM_UP is set). When a server
+    preloads the app before forking, warm up in a post-fork hook instead so
+    workers do not share the parent's database connection.
+
+    Returns the time spent per stage in milliseconds.
+    """
+    timings = {}
+    closed = [alias for alias in connections if connections[alias].connection is None]
+
+    with _timed(timings, 'url_resolver'):
+        resolver = get_resolver()
+        resolver.reverse_dict
+        resolver.resolve('/api/books/')
+
+    with _timed(timings, 'viewsets'):
+        for _prefix, viewset, _basename in router.registry:
+            _warm_viewset(viewset)
+
+    with _timed(timings, 'autocomplete_index'):
+        autocomplete_index.ensure_current()
+
+    for alias in closed:
+        connections[alias].close()
+    timings['total'] = round(sum(timings.values()), 2)
+    return timings
+
+
+def _pending_migrations():
+    """Names of the migrations not yet applied to any database"""
+    pending = []
+    for alias in connections:
+        executor = MigrationExecutor(connections[alias])
+        plan = executor.migration_plan(executor.loader.graph.leaf_nodes())
+        pending.extend(f'{migration.app_label}.{migration.name}' for migration, _backwards in plan)
+    return pending
+
+
+def warm_up_on_startup():
+    """
+    warm_up() for application startup: database errors (e.g. new code
+    deployed before ``migrate`` ran) are logged instead of raised, so
+    warming up never stops a worker from serving. Loading the migration
+    graph to skip warm-up while migrations are pending costs more than most
+    warm-ups save, so it only happens with BOOKS_WARM_UP_CHECK_MIGRATIONS.
+    Returns the timings, or None when it did not run.
+    """
+    try:
+        if getattr(settings, 'BOOKS_WARM_UP_CHECK_MIGRATIONS', False):
+            pending = _pending_migrations()
+            if pending:
+                logger.warning('Skipping warm-up: %d unapplied migration(s), e.g. %s', len(pending), pending[0])
+                return None
+        timings = warm_up()
+    except DatabaseError:
+        logger.exception('Warm-up failed; the first requests will pay its cost')
+        return None
+    logger.info('Warmed up in %.2f ms', timings['total'])
+    return timings